@@ -0,0 +1,107 @@
+# times the compilation (at -O0) of a generated corpus by this tree, or by a given revision, against an earlier
+# revision (by default the first one), and checks that both compile it into the same VM code. With --parse-only,
+# only the compilation engine is timed, on tokenizers that are built beforehand (for revisions that have
+# OutputBuffer, the in-memory output of the compiler)
+import gc
+import sys
+import json
+import time
+import pathlib
+import hashlib
+import argparse
+import tempfile
+import harness
+import generate_corpus
+
+
+def measure_parsing(arguments):
+    import JackTokenizer
+    import OutputBuffer
+    import CompilationEngine
+
+    paths = sorted(pathlib.Path(arguments.corpus).glob('*.jack'))
+    seconds = None
+    for _ in range(arguments.repeat):
+        tokenizers = [JackTokenizer.JackTokenizer(path) for path in paths]
+        buffers = [OutputBuffer.OutputBuffer() for _ in paths]
+        gc.collect()
+        start = time.perf_counter()
+        for tokenizer, buffer in zip(tokenizers, buffers):
+            CompilationEngine.CompilationEngine(tokenizer, buffer).compile_class()
+        elapsed = time.perf_counter() - start
+        if seconds is None or elapsed < seconds:
+            seconds = elapsed
+
+    digest = hashlib.sha256()
+    for buffer in buffers:
+        digest.update(buffer.getvalue().encode())
+    return {'seconds': seconds, 'digest': digest.hexdigest()}
+
+
+def measure(arguments):
+    if arguments.parse_only:
+        return measure_parsing(arguments)
+
+    import JackCompiler
+
+    paths = sorted(pathlib.Path(arguments.corpus).glob('*.jack'))
+
+    def compile_corpus():
+        for path in paths:
+            JackCompiler.compile_file(path)
+
+    seconds = harness.best_time(compile_corpus, arguments.repeat)
+    digest = hashlib.sha256()
+    for path in paths:
+        digest.update(path.with_suffix('.vm').read_bytes())
+    return {'seconds': seconds, 'digest': digest.hexdigest()}
+
+
+def main():
+    argument_parser = argparse.ArgumentParser(description='times the compiler against that of an earlier revision')
+    argument_parser.add_argument('--against', help='git revision to compare against (default: the first commit)')
+    argument_parser.add_argument('--revision', help='git revision to measure (default: this tree)')
+    argument_parser.add_argument('--classes', type=int, default=4)
+    argument_parser.add_argument('--subroutines', type=int, default=500,
+                                 help='the number of functions of each class (about 18 lines each)')
+    argument_parser.add_argument('--repeat', type=int, default=5)
+    argument_parser.add_argument('--parse-only', action='store_true',
+                                 help='time only the compilation engine, without tokenizing or writing files')
+    argument_parser.add_argument('--corpus', help=argparse.SUPPRESS)
+    argument_parser.add_argument('--measure', help=argparse.SUPPRESS)
+    arguments = argument_parser.parse_args(sys.argv[1:])
+
+    if arguments.measure:
+        harness.use_sources(arguments.measure)
+        print(json.dumps(measure(arguments)))
+        return
+
+    against = arguments.against or harness.root_revision()
+    with tempfile.TemporaryDirectory() as directory:
+        directory = pathlib.Path(directory)
+        corpus = directory / 'corpus'
+        paths = generate_corpus.write_corpus(corpus, arguments.classes, arguments.subroutines)
+        lines = sum(len(path.read_text().splitlines()) for path in paths)
+
+        results = []
+        for name, revision in ((against[:7], against), (arguments.revision or 'this tree', arguments.revision)):
+            if revision is None:
+                src_dir = harness.src
+            else:
+                src_dir = harness.sources_at(revision, directory / revision)
+            options = ['--corpus', str(corpus), '--repeat', str(arguments.repeat)]
+            if arguments.parse_only:
+                options.append('--parse-only')
+            results.append((name, harness.measure_in(__file__, src_dir, options)))
+            for path in corpus.glob('*.vm'):
+                path.unlink()
+
+    print(f'{len(paths)} classes, {lines} lines')
+    (before_name, before), (after_name, after) = results
+    print(f'{before_name:>10}: {before["seconds"] * 1000:8.1f} ms')
+    print(f'{after_name:>10}: {after["seconds"] * 1000:8.1f} ms  ({after["seconds"] / before["seconds"] - 1:+.1%})')
+    print('vm code identical' if before['digest'] == after['digest'] else 'VM CODE DIFFERS')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,72 @@
+# stress test of deeply nested and very long expressions: compiles a generated class whose expressions are nested
+# 'depth' deep (in parentheses, unary operators, array indexes, call arguments and right-nested operations), plus one
+# chain of 'chain' operations, with this tree at each optimization level, and with an earlier revision (by default
+# the first one) at -O0
+import sys
+import json
+import time
+import pathlib
+import argparse
+import tempfile
+import harness
+import generate_corpus
+
+
+def measure(arguments):
+    import JackCompiler
+
+    path = pathlib.Path(arguments.corpus) / 'Main.jack'
+    pass_manager = None
+    if arguments.level:
+        import PassManager
+        pass_manager = PassManager.PassManager(arguments.level)
+
+    start = time.perf_counter()
+    try:
+        if pass_manager is None:
+            JackCompiler.compile_file(path)
+        else:
+            JackCompiler.compile_file(path, pass_manager=pass_manager)
+    except RecursionError as error:
+        return {'error': f'{type(error).__name__}: {error}'}
+    seconds = time.perf_counter() - start
+    return {'seconds': seconds, 'lines': len(path.with_suffix('.vm').read_text().splitlines())}
+
+
+def main():
+    argument_parser = argparse.ArgumentParser(description='compiles deeply nested and very long expressions')
+    argument_parser.add_argument('--against', help='git revision to compare against (default: the first commit)')
+    argument_parser.add_argument('--depth', type=int, default=10000)
+    argument_parser.add_argument('--chain', type=int, default=100000)
+    argument_parser.add_argument('--levels', type=int, nargs='+', default=[0, 2],
+                                 help='the optimization levels to compile with')
+    argument_parser.add_argument('--level', type=int, default=0, help=argparse.SUPPRESS)
+    argument_parser.add_argument('--corpus', help=argparse.SUPPRESS)
+    argument_parser.add_argument('--measure', help=argparse.SUPPRESS)
+    arguments = argument_parser.parse_args(sys.argv[1:])
+
+    if arguments.measure:
+        harness.use_sources(arguments.measure)
+        print(json.dumps(measure(arguments)))
+        return
+
+    against = arguments.against or harness.root_revision()
+    with tempfile.TemporaryDirectory() as directory:
+        directory = pathlib.Path(directory)
+        corpus = directory / 'corpus'
+        corpus.mkdir()
+        (corpus / 'Main.jack').write_text(generate_corpus.generate_nested_class(arguments.depth, arguments.chain))
+
+        runs = [(f'{against[:7]} -O0', harness.sources_at(against, directory), 0)]
+        runs += [(f'this tree -O{level}', harness.src, level) for level in arguments.levels]
+        print(f'depth {arguments.depth}, chain of {arguments.chain} operations')
+        for name, src_dir, level in runs:
+            result = harness.measure_in(__file__, src_dir, ['--corpus', str(corpus), '--level', str(level)])
+            if 'error' in result:
+                print(f'{name:>16}: {result["error"]}')
+            else:
+                print(f'{name:>16}: {result["seconds"]:6.2f} s, {result["lines"]} VM lines')
+
+
+if __name__ == '__main__':
+    main()
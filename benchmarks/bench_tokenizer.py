@@ -0,0 +1,63 @@
+# times JackTokenizer on a generated class against the tokenizer of an earlier revision (by default the first one),
+# and checks that both produce the same tokens
+import sys
+import json
+import pathlib
+import hashlib
+import argparse
+import tempfile
+import harness
+import generate_corpus
+
+
+def measure(arguments):
+    import JackTokenizer
+
+    path = pathlib.Path(arguments.corpus) / 'Big0.jack'
+
+    def tokenize():
+        tokenizer = JackTokenizer.JackTokenizer(path)
+        while tokenizer.has_more_tokens():
+            tokenizer.advance()
+
+    digest = hashlib.sha256()
+    count = 0
+    tokenizer = JackTokenizer.JackTokenizer(path)
+    while tokenizer.has_more_tokens():
+        tokenizer.advance()
+        digest.update(repr(tuple(tokenizer.current_token[:2])).encode())
+        count += 1
+    return {'seconds': harness.best_time(tokenize, arguments.repeat), 'tokens': count, 'digest': digest.hexdigest()}
+
+
+def main():
+    argument_parser = argparse.ArgumentParser(description='times the tokenizer against that of an earlier revision')
+    argument_parser.add_argument('--against', help='git revision to compare against (default: the first commit)')
+    argument_parser.add_argument('--subroutines', type=int, default=2000)
+    argument_parser.add_argument('--repeat', type=int, default=5)
+    argument_parser.add_argument('--corpus', help=argparse.SUPPRESS)
+    argument_parser.add_argument('--measure', help=argparse.SUPPRESS)
+    arguments = argument_parser.parse_args(sys.argv[1:])
+
+    if arguments.measure:
+        harness.use_sources(arguments.measure)
+        print(json.dumps(measure(arguments)))
+        return
+
+    revision = arguments.against or harness.root_revision()
+    with tempfile.TemporaryDirectory() as directory:
+        corpus = pathlib.Path(directory) / 'corpus'
+        generate_corpus.write_corpus(corpus, 1, arguments.subroutines)
+        lines = len((corpus / 'Big0.jack').read_text().splitlines())
+        options = ['--corpus', str(corpus), '--repeat', str(arguments.repeat)]
+        before = harness.measure_in(__file__, harness.sources_at(revision, directory), options)
+        after = harness.measure_in(__file__, harness.src, options)
+
+    print(f'{lines} lines, {after["tokens"]} tokens')
+    print(f'{revision[:7]}: {before["seconds"] * 1000:8.1f} ms')
+    print(f'this tree: {after["seconds"] * 1000:8.1f} ms  ({before["seconds"] / after["seconds"]:.1f}x)')
+    print('tokens identical' if before['digest'] == after['digest'] else 'TOKENS DIFFER')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,78 @@
+# measures the peak memory that tokenizing generated classes of growing size takes: the list-based tokenizer of an
+# earlier revision (by default the first one), and JackTokenizer and StreamingJackTokenizer of this tree.
+# Memory is what the Python allocator holds (tracemalloc), which leaves out the pages of a memory mapped file
+import sys
+import json
+import time
+import pathlib
+import argparse
+import tempfile
+import tracemalloc
+import harness
+import generate_corpus
+
+
+def measure(arguments):
+    import JackTokenizer
+
+    tokenizers = ['JackTokenizer']
+    if hasattr(JackTokenizer, 'StreamingJackTokenizer'):
+        tokenizers.append('StreamingJackTokenizer')
+
+    results = {}
+    for path in sorted(pathlib.Path(arguments.corpus).glob('*.jack')):
+        for name in tokenizers:
+            tracemalloc.start()
+            start = time.perf_counter()
+            tokenizer = getattr(JackTokenizer, name)(path)
+            # the parser looks one token ahead after identifiers
+            while tokenizer.has_more_tokens():
+                tokenizer.advance()
+                if tokenizer.token_type() == 'identifier':
+                    tokenizer.next_token_type()
+            elapsed = time.perf_counter() - start
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+            if hasattr(tokenizer, 'close'):
+                tokenizer.close()
+            results.setdefault(path.stem, {})[name] = {'peak': peak, 'seconds': elapsed}
+    return results
+
+
+def main():
+    argument_parser = argparse.ArgumentParser(description='measures the peak memory of the tokenizers')
+    argument_parser.add_argument('--against', help='git revision to compare against (default: the first commit)')
+    argument_parser.add_argument('--sizes', type=int, nargs='+', default=[500, 2000, 8000],
+                                 help='the number of functions of each generated class (about 18 lines each)')
+    argument_parser.add_argument('--corpus', help=argparse.SUPPRESS)
+    argument_parser.add_argument('--measure', help=argparse.SUPPRESS)
+    arguments = argument_parser.parse_args(sys.argv[1:])
+
+    if arguments.measure:
+        harness.use_sources(arguments.measure)
+        print(json.dumps(measure(arguments)))
+        return
+
+    revision = arguments.against or harness.root_revision()
+    with tempfile.TemporaryDirectory() as directory:
+        corpus = pathlib.Path(directory) / 'corpus'
+        corpus.mkdir()
+        lines = {}
+        for size in arguments.sizes:
+            source = generate_corpus.generate_class(f'Big{size}', size)
+            (corpus / f'Big{size}.jack').write_text(source)
+            lines[f'Big{size}'] = len(source.splitlines())
+        options = ['--corpus', str(corpus)]
+        before = harness.measure_in(__file__, harness.sources_at(revision, directory), options)
+        after = harness.measure_in(__file__, harness.src, options)
+
+    for class_name in sorted(lines, key=lines.get):
+        rows = [(f'{revision[:7]} JackTokenizer', before[class_name]['JackTokenizer'])]
+        rows += [(name, result) for name, result in after[class_name].items()]
+        for name, result in rows:
+            print(f'{lines[class_name]:7d} lines  {name:24s} peak {result["peak"] / 1e6:8.2f} MB  '
+                  f'{result["seconds"] * 1000:6.0f} ms')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,192 @@
+# regression check of the conditions of ifs and whiles: compiles a class whose conditions aren't only true (-1) or
+# false (0) at each optimization level, runs each of its functions on a small VM interpreter, and checks that every
+# level returns what -O0 returns. The unoptimized code takes a branch only on -1, so that 'if (x & 1)' with x = 1
+# takes the else clause, and 'while (flag)' with flag = 1 doesn't run
+import sys
+import pathlib
+import argparse
+import tempfile
+import harness
+
+# each function returns a number that tells which branches it took
+source = '''class Main {
+    function int ifElseOnBits(int x) {
+        if (x & 1) { return 1; } else { return 2; }
+    }
+    function int ifOnBits(int x) {
+        var int taken;
+        if (x & 1) { let taken = 1; }
+        return taken;
+    }
+    function int ifElseOnNot(int x) {
+        if (~x) { return 1; } else { return 2; }
+    }
+    function int ifElseOnConstant() {
+        if (1) { return 1; } else { return 2; }
+    }
+    function int ifElseOnComparison(int x) {
+        if ((x < 3) | (x = 7)) { return 1; } else { return 2; }
+    }
+    function int whileOnFlag(int flag) {
+        var int n;
+        while (flag) { let n = n + 1; let flag = flag - 1; }
+        return n;
+    }
+    function int whileOnConstant() {
+        var int n;
+        while (2) { let n = n + 1; if (n > 5) { return n; } }
+        return n;
+    }
+    function int whileOnComparison(int x) {
+        var int n;
+        while ((n < x) & ~(n = 4)) { let n = n + 1; }
+        return n;
+    }
+    function void main() {
+        return;
+    }
+}
+'''
+
+# (function, arguments) to run
+cases = [
+    ('Main.ifElseOnBits', [1]), ('Main.ifElseOnBits', [5]), ('Main.ifElseOnBits', [-1]), ('Main.ifElseOnBits', [0]),
+    ('Main.ifOnBits', [1]), ('Main.ifOnBits', [-1]), ('Main.ifOnBits', [2]),
+    ('Main.ifElseOnNot', [1]), ('Main.ifElseOnNot', [0]), ('Main.ifElseOnNot', [-1]),
+    ('Main.ifElseOnConstant', []),
+    ('Main.ifElseOnComparison', [1]), ('Main.ifElseOnComparison', [5]), ('Main.ifElseOnComparison', [7]),
+    ('Main.whileOnFlag', [1]), ('Main.whileOnFlag', [-1]), ('Main.whileOnFlag', [0]),
+    ('Main.whileOnConstant', []),
+    ('Main.whileOnComparison', [2]), ('Main.whileOnComparison', [9]),
+]
+
+
+def to_word(value):
+    """
+    :param value: int
+    :return: the value as a 16-bit two's complement number, the way the Hack platform holds it
+    """
+    value &= 0xffff
+    return value - 0x10000 if value & 0x8000 else value
+
+
+class Interpreter:
+    """
+    runs VM code that doesn't use the operating system, other than Math.multiply and Math.divide
+    """
+
+    def __init__(self, vm_code):
+        # function name -> (number of locals, list of instructions, label -> index)
+        self.functions = {}
+        self.statics = {}
+        instructions = labels = None
+        for line in vm_code.splitlines():
+            words = line.split('//')[0].split()
+            if not words:
+                continue
+            if words[0] == 'function':
+                instructions, labels = [], {}
+                self.functions[words[1]] = (int(words[2]), instructions, labels)
+                continue
+            if words[0] == 'label':
+                labels[words[1]] = len(instructions)
+            instructions.append(words)
+
+    def call(self, name, arguments):
+        """
+        :param name: the name of the function
+        :param arguments: list of int
+        :return: the value that the function returns
+        """
+        if name == 'Math.multiply':
+            return to_word(arguments[0] * arguments[1])
+        if name == 'Math.divide':
+            quotient = abs(arguments[0]) // abs(arguments[1])
+            return quotient if (arguments[0] < 0) == (arguments[1] < 0) else -quotient
+
+        number_of_locals, instructions, labels = self.functions[name]
+        segments = {'argument': list(arguments), 'local': [0] * number_of_locals, 'temp': [0] * 8,
+                    'static': self.statics.setdefault(name.split('.')[0], {})}
+        stack = []
+        index = 0
+        while True:
+            words = instructions[index]
+            index += 1
+            command = words[0]
+            if command == 'push':
+                segment, offset = words[1], int(words[2])
+                if segment == 'constant':
+                    stack.append(offset)
+                elif segment == 'static':
+                    stack.append(segments['static'].get(offset, 0))
+                else:
+                    stack.append(segments[segment][offset])
+            elif command == 'pop':
+                segments[words[1]][int(words[2])] = stack.pop()
+            elif command in ('add', 'sub', 'and', 'or', 'eq', 'gt', 'lt'):
+                right = stack.pop()
+                left = stack.pop()
+                stack.append(to_word({'add': left + right, 'sub': left - right, 'and': left & right,
+                                      'or': left | right, 'eq': -(left == right), 'gt': -(left > right),
+                                      'lt': -(left < right)}[command]))
+            elif command == 'neg':
+                stack.append(to_word(-stack.pop()))
+            elif command == 'not':
+                stack.append(to_word(~stack.pop()))
+            elif command == 'goto':
+                index = labels[words[1]]
+            elif command == 'if-goto':
+                if stack.pop() != 0:
+                    index = labels[words[1]]
+            elif command == 'call':
+                count = int(words[2])
+                values = stack[len(stack) - count:]
+                del stack[len(stack) - count:]
+                stack.append(self.call(words[1], values))
+            elif command == 'return':
+                return stack.pop()
+            elif command != 'label':
+                raise ValueError(f'unsupported VM command: {" ".join(words)}')
+
+
+def compile_source(level, directory):
+    """
+    :param level: the optimization level
+    :param directory: the directory to compile in
+    :return: the VM code of the class
+    """
+    import JackCompiler
+    import PassManager
+
+    path = pathlib.Path(directory) / f'O{level}' / 'Main.jack'
+    path.parent.mkdir()
+    path.write_text(source)
+    JackCompiler.compile_file(path, pass_manager=PassManager.PassManager(level))
+    return path.with_suffix('.vm').read_text()
+
+
+def main():
+    argument_parser = argparse.ArgumentParser(description='checks that each optimization level takes the branches '
+                                                          'that -O0 takes on conditions that aren\'t booleans')
+    argument_parser.add_argument('--levels', type=int, nargs='+', default=[1, 2],
+                                 help='the optimization levels to compare with -O0')
+    arguments = argument_parser.parse_args(sys.argv[1:])
+
+    harness.use_sources(harness.src)
+    with tempfile.TemporaryDirectory() as directory:
+        interpreters = {level: Interpreter(compile_source(level, directory)) for level in [0] + arguments.levels}
+
+    failures = 0
+    for name, values in cases:
+        expected = interpreters[0].call(name, values)
+        for level in arguments.levels:
+            result = interpreters[level].call(name, values)
+            if result != expected:
+                failures += 1
+                print(f'{name}{tuple(values)}: -O0 returns {expected}, -O{level} returns {result}')
+    print(f'{len(cases)} cases, {failures} differences')
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == '__main__':
+    main()
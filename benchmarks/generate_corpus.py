@@ -0,0 +1,109 @@
+# generates large, machine-made Jack programs for the benchmarks
+import sys
+import pathlib
+import argparse
+
+
+def generate_class(class_name, number_of_subroutines):
+    """
+    generates a class of many similar functions, with comments, strings, loops, ifs, arrays and calls in each, about 18
+    lines per function
+    :param class_name: the name of the class
+    :param number_of_subroutines: the number of functions of the class
+    :return: the source code of the class
+    """
+    code = [f'/** generated */\nclass {class_name} {{\n    static int s0, s1;\n    field int f0, f1;\n']
+    for number in range(number_of_subroutines):
+        code.append(f'''    // subroutine {number}
+    function int sub{number}(int a, int b) {{
+        var int i, j, t;
+        var Array arr;
+        var String str;
+        let arr = Array.new(16);
+        let i = 0;
+        /* loop */
+        while (i < (a * 4)) {{
+            let arr[i] = arr[i] + (b * 2) - (i / 1);
+            if ((i & 1) = 0) {{ let t = t + arr[i]; }} else {{ let t = t - 1; }}
+            let i = i + 1;
+        }}
+        let str = "hello {number}";
+        do Output.printString(str);
+        let j = -(((a + b) * (a - b)) | ~t);
+        return {class_name}.sub{max(number - 1, 0)}(j, t) + s0;
+    }}
+''')
+    code.append('}\n')
+    return ''.join(code)
+
+
+def generate_nested_class(depth, chain):
+    """
+    generates a Main class whose expressions are nested 'depth' deep, in each way that a Jack expression can nest:
+    parentheses, unary operators, array indexes, call arguments and right-nested operations. One more expression is a
+    single chain of 'chain' operations
+    :param depth: how deep the expressions are nested
+    :param chain: the number of operations in the long expression
+    :return: the source code of the class
+    """
+    statements = [
+        'let x = ' + '(' * depth + '1' + ')' * depth + ';',
+        'let x = ' + '- ' * depth + '1;',
+        'let x = ' + 'a[' * depth + '0' + ']' * depth + ';',
+        'let x = ' + 'Main.id(' * depth + '1' + ')' * depth + ';',
+        'let x = 1' + ''.join(f' + (x * {number % 7})' for number in range(chain)) + ';',
+        'let x = ' + '(x + ' * depth + '1' + ')' * depth + ';',
+    ]
+    return ('class Main {\n'
+            '    function int id(int v) { return v; }\n'
+            '    function void main() {\n'
+            '        var int x;\n'
+            '        var Array a;\n'
+            '        let a = Array.new(1);\n'
+            '        let a[0] = 0;\n'
+            + ''.join(f'        {statement}\n' for statement in statements) +
+            '        do Output.printInt(x);\n'
+            '        return;\n'
+            '    }\n'
+            '}\n')
+
+
+def write_corpus(directory, number_of_classes, number_of_subroutines):
+    """
+    writes a project of generated classes
+    :param directory: the directory to write the .jack files into
+    :param number_of_classes: the number of classes
+    :param number_of_subroutines: the number of functions of each class
+    :return: list of the paths of the .jack files
+    """
+    directory = pathlib.Path(directory)
+    directory.mkdir(parents=True, exist_ok=True)
+    paths = []
+    for number in range(number_of_classes):
+        class_name = f'Big{number}'
+        path = directory / f'{class_name}.jack'
+        path.write_text(generate_class(class_name, number_of_subroutines))
+        paths.append(path)
+    return paths
+
+
+def main():
+    argument_parser = argparse.ArgumentParser(description='writes a directory of generated Jack classes')
+    argument_parser.add_argument('directory')
+    argument_parser.add_argument('--classes', type=int, default=1)
+    argument_parser.add_argument('--subroutines', type=int, default=2000,
+                                 help='the number of functions of each class (about 18 lines each)')
+    argument_parser.add_argument('--nested', type=int, metavar='DEPTH',
+                                 help='write a single Main class with expressions nested this deep instead')
+    arguments = argument_parser.parse_args(sys.argv[1:])
+
+    if arguments.nested is not None:
+        directory = pathlib.Path(arguments.directory)
+        directory.mkdir(parents=True, exist_ok=True)
+        (directory / 'Main.jack').write_text(generate_nested_class(arguments.nested, arguments.nested))
+    else:
+        write_corpus(arguments.directory, arguments.classes, arguments.subroutines)
+
+
+if __name__ == '__main__':
+    main()
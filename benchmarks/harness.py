@@ -0,0 +1,72 @@
+# shared helpers of the benchmarks. A benchmark measures the compiler of this tree, or of an earlier revision of it,
+# each in a process of its own, so that the modules of two revisions never mix
+import io
+import sys
+import json
+import time
+import pathlib
+import tarfile
+import subprocess
+
+root = pathlib.Path(__file__).resolve().parent.parent
+src = root / 'src'
+
+
+def root_revision():
+    """
+    :return: the first commit of the repository, whose compiler is the baseline that the benchmarks compare against
+    """
+    return subprocess.run(['git', 'rev-list', '--max-parents=0', 'HEAD'], cwd=root, check=True, capture_output=True,
+                          text=True).stdout.split()[0]
+
+
+def sources_at(revision, directory):
+    """
+    extracts the src directory of a git revision
+    :param revision: git revision
+    :param directory: the directory to extract it into
+    :return: the path of the extracted src directory
+    """
+    archive = subprocess.run(['git', 'archive', revision, 'src'], cwd=root, check=True, capture_output=True).stdout
+    with tarfile.open(fileobj=io.BytesIO(archive)) as tar:
+        tar.extractall(directory)
+    return pathlib.Path(directory) / 'src'
+
+
+def measure_in(script, src_dir, arguments):
+    """
+    runs the measurement of a benchmark script in a new process, which imports the compiler from 'src_dir'.
+    The script is run with '--measure src_dir' and prints its results as json
+    :param script: path of the benchmark script
+    :param src_dir: the src directory of the compiler to measure
+    :param arguments: list of the other command line arguments of the script
+    :return: the results that the script printed
+    """
+    output = subprocess.run([sys.executable, str(script), '--measure', str(src_dir)] + arguments, check=True,
+                            capture_output=True, text=True).stdout
+    return json.loads(output)
+
+
+def use_sources(src_dir):
+    """
+    makes the modules of 'src_dir' the ones that are imported
+    :param src_dir: the src directory of a compiler
+    :return: void
+    """
+    sys.path.insert(0, str(src_dir))
+
+
+def best_time(function, repeat):
+    """
+    :param function: function with no arguments
+    :param repeat: how many times to call it
+    :return: the shortest time, in seconds, that a call of the function took
+    """
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        elapsed = time.perf_counter() - start
+        if best is None or elapsed < best:
+            best = elapsed
+    return best
@@ -0,0 +1,887 @@
+# optimization passes over the syntax trees of subroutines. Each pass takes a JackAST.Subroutine and returns a
+# subroutine that computes the same thing
+import JackAST
+
+
+def to_word(value):
+    """
+    wraps an integer to a 16-bit two's complement word, as the Hack computer does
+    :param value: int
+    :return: int between -32768 and 32767
+    """
+    return (value + 0x8000) % 0x10000 - 0x8000
+
+
+def rewrite_expressions(statements, rewrite):
+    """
+    replaces every expression of a list of statements (the whole expression of a let, a condition, etc., not their
+    subexpressions) with the expression that 'rewrite' returns for it. The statements are changed in place
+    :param statements: list of statements
+    :param rewrite: function from an expression to the expression to replace it with
+    :return: void
+    """
+    for statement in statements:
+        if isinstance(statement, JackAST.Let):
+            if statement.index is not None:
+                statement.index = rewrite(statement.index)
+            statement.value = rewrite(statement.value)
+        elif isinstance(statement, JackAST.If):
+            statement.condition = rewrite(statement.condition)
+            rewrite_expressions(statement.statements, rewrite)
+            if statement.else_statements is not None:
+                rewrite_expressions(statement.else_statements, rewrite)
+        elif isinstance(statement, JackAST.While):
+            statement.condition = rewrite(statement.condition)
+            rewrite_expressions(statement.statements, rewrite)
+        elif isinstance(statement, JackAST.Do):
+            statement.call = rewrite(statement.call)
+        elif statement.value is not None:
+            statement.value = rewrite(statement.value)
+
+
+def transform_statements(statements, transform):
+    """
+    applies 'transform' to every expression in a list of statements, bottom up: the operands of an expression are
+    transformed before the expression itself. The statements are changed in place
+    :param statements: list of statements
+    :param transform: function from an expression to the expression to replace it with
+    :return: void
+    """
+    rewrite_expressions(statements, lambda expression: transform_expression(expression, transform))
+
+
+def children_of(expression):
+    """
+    :param expression: expression
+    :return: list of the subexpressions of the expression, in the order that they're evaluated
+    """
+    if isinstance(expression, JackAST.BinaryOperation):
+        return [expression.left, expression.right]
+    if isinstance(expression, JackAST.UnaryOperation):
+        return [expression.operand]
+    if isinstance(expression, JackAST.ArrayReference):
+        return [expression.index]
+    if isinstance(expression, JackAST.SavedValue):
+        return [expression.expression]
+    if isinstance(expression, JackAST.Call):
+        if expression.receiver is not None:
+            return [expression.receiver] + expression.arguments
+        return list(expression.arguments)
+    return []
+
+
+def set_children(expression, children):
+    """
+    replaces the subexpressions of an expression, in the order of children_of()
+    """
+    if isinstance(expression, JackAST.BinaryOperation):
+        expression.left, expression.right = children
+    elif isinstance(expression, JackAST.UnaryOperation):
+        expression.operand, = children
+    elif isinstance(expression, JackAST.ArrayReference):
+        expression.index, = children
+    elif isinstance(expression, JackAST.SavedValue):
+        expression.expression, = children
+    elif isinstance(expression, JackAST.Call):
+        if expression.receiver is not None:
+            expression.receiver = children[0]
+            children = children[1:]
+        expression.arguments = children
+
+
+def transform_expression(expression, transform):
+    """
+    applies 'transform' to an expression and all of its subexpressions, bottom up and in the order of evaluation. The
+    tree is walked with an explicit stack instead of recursion, so that deeply nested expressions don't reach
+    Python's recursion limit
+    :param expression: expression
+    :param transform: function from an expression to the expression to replace it with
+    :return: the transformed expression
+    """
+    transformed = []  # the transformed expressions whose parents aren't transformed yet
+    stack = [(expression, None)]  # (expression, its children or None if they aren't pushed yet)
+    while stack:
+        expression, children = stack.pop()
+        if children is None:
+            children = children_of(expression)
+            stack.append((expression, children))
+            stack.extend((child, None) for child in reversed(children))
+        else:
+            if children:
+                set_children(expression, transformed[-len(children):])
+                del transformed[-len(children):]
+            transformed.append(transform(expression))
+    return transformed[0]
+
+
+def constant_value(expression):
+    """
+    returns the value of an expression that is a constant, or None if it isn't one
+    :param expression: expression
+    :return: int or None
+    """
+    if isinstance(expression, JackAST.IntegerConstant):
+        return expression.value
+    if isinstance(expression, JackAST.KeywordConstant):
+        if expression.keyword == 'true':
+            return -1
+        if expression.keyword == 'false' or expression.keyword == 'null':
+            return 0
+    return None
+
+
+def fold_binary_operation(operator, left, right):
+    """
+    returns the value of a binary operation on two constants, as the Hack platform computes it, or None if it can't be
+    computed at compile time
+    :param operator: one of '+', '-', '*', '/', '&', '|', '<', '>', '='
+    :param left: int
+    :param right: int
+    :return: int or None
+    """
+    if operator == '+':
+        return to_word(left + right)
+    if operator == '-':
+        return to_word(left - right)
+    if operator == '*':
+        # Math.multiply keeps the low 16 bits of the product
+        return to_word(left * right)
+    if operator == '/':
+        # division by 0 is a runtime error of Math.divide, and the sign of -32768 / -1 depends on the OS
+        if right == 0 or left == -32768:
+            return None
+        quotient = abs(left) // abs(right)
+        if (left < 0) != (right < 0):
+            quotient = -quotient
+        return quotient
+    if operator == '&':
+        return to_word(left & right)
+    if operator == '|':
+        return to_word(left | right)
+    if operator == '=':
+        return -1 if left == right else 0
+
+    # the VM compares by subtracting, so a comparison whose difference overflows is left for the runtime
+    difference = left - right
+    if difference != to_word(difference):
+        return None
+    if operator == '<':
+        return -1 if difference < 0 else 0
+    return -1 if difference > 0 else 0
+
+
+def fold_expression(expression):
+    if isinstance(expression, JackAST.BinaryOperation):
+        left = constant_value(expression.left)
+        right = constant_value(expression.right)
+        if left is not None and right is not None:
+            value = fold_binary_operation(expression.operator, left, right)
+            if value is not None:
+                return JackAST.IntegerConstant(value)
+    elif isinstance(expression, JackAST.UnaryOperation):
+        operand = constant_value(expression.operand)
+        if operand is not None:
+            if expression.operator == '-':
+                return JackAST.IntegerConstant(to_word(-operand))
+            return JackAST.IntegerConstant(to_word(~operand))
+    return expression
+
+
+def fold_constants(subroutine):
+    """
+    replaces every expression whose operands are all constants with its value. Jack evaluates left to right without
+    precedence, so only operations whose own operands are constant are folded: in 'x + 4 * 8' nothing is constant,
+    but 'x + (4 * 8)' becomes 'x + 32'
+    :param subroutine: JackAST.Subroutine
+    :return: JackAST.Subroutine
+    """
+    transform_statements(subroutine.statements, fold_expression)
+    return subroutine
+
+
+# the kinds of variables whose constant values are propagated. Only a let can change a local or an argument, while
+# statics and fields can be changed by any call
+propagated_kinds = ('var', 'arg')
+
+
+def variable_key(variable):
+    return variable.kind, variable.index
+
+
+def substitute_constants(expression, constants):
+    """
+    replaces the references to variables whose values are known with the values, and folds the result
+    :param expression: expression
+    :param constants: dictionary of (kind, index) of a variable -> its value
+    :return: the transformed expression
+    """
+    def substitute(expression_):
+        if isinstance(expression_, JackAST.VariableReference):
+            value = constants.get(variable_key(expression_.variable))
+            if value is not None:
+                return JackAST.IntegerConstant(value)
+            return expression_
+        return fold_expression(expression_)
+
+    return transform_expression(expression, substitute)
+
+
+def assigned_variables(statements):
+    """
+    :param statements: list of statements
+    :return: set of (kind, index) of the variables that a let in the statements (at any depth) assigns to
+    """
+    assigned = set()
+    for statement in statements:
+        if isinstance(statement, JackAST.Let):
+            if statement.index is None:
+                assigned.add(variable_key(statement.variable))
+        elif isinstance(statement, JackAST.If):
+            assigned |= assigned_variables(statement.statements)
+            if statement.else_statements is not None:
+                assigned |= assigned_variables(statement.else_statements)
+        elif isinstance(statement, JackAST.While):
+            assigned |= assigned_variables(statement.statements)
+    return assigned
+
+
+def merge_constants(constants, other_constants):
+    """
+    :return: the constants that are known after either of two paths, or None if neither of them can be taken
+    """
+    if constants is None:
+        return other_constants
+    if other_constants is None:
+        return constants
+    return {key: value for key, value in constants.items() if other_constants.get(key) == value}
+
+
+def propagate_statements(statements, constants):
+    """
+    propagates constants through a list of statements in order, and changes it in place: conditions that become
+    constant select their branch, loops that are never entered are removed, and so are the statements that can't be
+    reached after a return or an endless loop
+    :param statements: list of statements
+    :param constants: dictionary of (kind, index) of a variable -> its value, before the statements. Changed in place
+    :return: the constants after the statements, or None if the end of the statements can't be reached
+    """
+    result = []
+    for statement in statements:
+        if isinstance(statement, JackAST.Let):
+            if statement.index is not None:
+                statement.index = substitute_constants(statement.index, constants)
+            statement.value = substitute_constants(statement.value, constants)
+            if statement.index is None and statement.variable.kind in propagated_kinds:
+                value = constant_value(statement.value)
+                if value is None:
+                    constants.pop(variable_key(statement.variable), None)
+                else:
+                    constants[variable_key(statement.variable)] = value
+
+        elif isinstance(statement, JackAST.If):
+            statement.condition = substitute_constants(statement.condition, constants)
+            condition = constant_value(statement.condition)
+            if condition is not None:
+                # the code of an if jumps to the else clause unless the condition is true (-1)
+                if condition == -1:
+                    branch = statement.statements
+                else:
+                    branch = statement.else_statements or []
+                constants = propagate_statements(branch, constants)
+                result.extend(branch)
+                if constants is None:
+                    break
+                continue
+
+            then_constants = propagate_statements(statement.statements, dict(constants))
+            else_constants = dict(constants)
+            if statement.else_statements is not None:
+                else_constants = propagate_statements(statement.else_statements, else_constants)
+            constants = merge_constants(then_constants, else_constants)
+            if constants is None:
+                result.append(statement)
+                break
+
+        elif isinstance(statement, JackAST.While):
+            # the condition is tested after each iteration as well, when the variables that the body assigns to
+            # may have any value
+            for key in assigned_variables(statement.statements):
+                constants.pop(key, None)
+            statement.condition = substitute_constants(statement.condition, constants)
+            condition = constant_value(statement.condition)
+            if condition is not None and condition != -1:
+                # never entered
+                continue
+            propagate_statements(statement.statements, dict(constants))
+            if condition == -1:
+                # Jack has no break, so only a return leaves an endless loop
+                statement.condition = JackAST.IntegerConstant(-1)
+                result.append(statement)
+                constants = None
+                break
+
+        elif isinstance(statement, JackAST.Do):
+            statement.call = substitute_constants(statement.call, constants)
+
+        else:
+            if statement.value is not None:
+                statement.value = substitute_constants(statement.value, constants)
+            result.append(statement)
+            constants = None
+            break
+
+        result.append(statement)
+
+    statements[:] = result
+    return constants
+
+
+def propagate_constants(subroutine):
+    """
+    propagates the constants that are assigned to locals and arguments into the expressions that use them, until the
+    variables are assigned again, and removes the branches and loops that the resulting constant conditions never take
+    :param subroutine: JackAST.Subroutine
+    :return: JackAST.Subroutine
+    """
+    propagate_statements(subroutine.statements, {})
+    return subroutine
+
+
+def is_pure(expression):
+    """
+    :param expression: expression
+    :return: whether evaluating the expression has no side effects: it calls no subroutine, other than Math.multiply
+    and divisions by nonzero constants, which can't fail
+    """
+    stack = [expression]
+    while stack:
+        expression = stack.pop()
+        # a string constant calls String.new
+        if isinstance(expression, (JackAST.Call, JackAST.StringConstant)):
+            return False
+        # a division by 0 is a runtime error of Math.divide, which removing the division would hide
+        if isinstance(expression, JackAST.BinaryOperation) and expression.operator == '/' and \
+                not constant_value(expression.right):
+            return False
+        stack.extend(children_of(expression))
+    return True
+
+
+def reduce_expression(expression):
+    if not isinstance(expression, JackAST.BinaryOperation) or expression.operator not in ('*', '/'):
+        return expression
+
+    left = constant_value(expression.left)
+    right = constant_value(expression.right)
+    if expression.operator == '*' and left is not None and right is None:
+        # a constant has no side effects, so the operands can be evaluated in either order. With the constant on the
+        # right, the vm pass 'multiply-by-shifts' can replace the call
+        expression.left, expression.right = expression.right, expression.left
+        left, right = right, left
+
+    if right == 1:
+        return expression.left
+    if expression.operator == '*':
+        if right == -1:
+            return JackAST.UnaryOperation('-', expression.left)
+        if right == 0 and is_pure(expression.left):
+            return JackAST.IntegerConstant(0)
+    return expression
+
+
+def reduce_strength(subroutine):
+    """
+    removes multiplications and divisions by 1, multiplications by 0 of expressions without side effects, and
+    multiplications by -1, and moves constant operands of multiplications to the right
+    :param subroutine: JackAST.Subroutine
+    :return: JackAST.Subroutine
+    """
+    transform_statements(subroutine.statements, reduce_expression)
+    return subroutine
+
+
+def all_statements(statements):
+    """
+    :param statements: list of statements
+    :return: generator of the statements and of all of the statements nested in them
+    """
+    for statement in statements:
+        yield statement
+        if isinstance(statement, JackAST.If):
+            yield from all_statements(statement.statements)
+            if statement.else_statements is not None:
+                yield from all_statements(statement.else_statements)
+        elif isinstance(statement, JackAST.While):
+            yield from all_statements(statement.statements)
+
+
+def variables_read(expression):
+    """
+    :param expression: expression
+    :return: set of (kind, index) of the locals and arguments that the expression reads
+    """
+    read = set()
+    stack = [expression]
+    while stack:
+        expression = stack.pop()
+        if isinstance(expression, (JackAST.VariableReference, JackAST.ArrayReference)) and \
+                expression.variable.kind in propagated_kinds:
+            read.add(variable_key(expression.variable))
+        stack.extend(children_of(expression))
+    return read
+
+
+def live_variables(statements, live, remove):
+    """
+    returns the locals and arguments that are live before a list of statements: those whose values the statements,
+    or the code after them, may still read. A let to a variable that isn't live after it is a dead store, and counts
+    as removed: its value is still evaluated if it has side effects, but a value without side effects isn't
+    :param statements: list of statements
+    :param live: set of (kind, index) of the variables that are live after the statements
+    :param remove: whether to remove the dead stores from the statements, in place
+    :return: set of (kind, index)
+    """
+    result = []
+    for statement in reversed(statements):
+        if isinstance(statement, JackAST.Let):
+            if statement.index is None and statement.variable.kind in propagated_kinds:
+                key = variable_key(statement.variable)
+                if key not in live:
+                    if is_pure(statement.value):
+                        continue
+                    # the value is still computed for its side effects, and thrown away like the value of a do
+                    statement = JackAST.Do(statement.value)
+                    live = live | variables_read(statement.call)
+                else:
+                    live = (live - {key}) | variables_read(statement.value)
+            else:
+                live = live | variables_read(statement.value)
+                if statement.index is not None:
+                    live |= variables_read(statement.index)
+                    if statement.variable.kind in propagated_kinds:
+                        live.add(variable_key(statement.variable))
+
+        elif isinstance(statement, JackAST.If):
+            then_live = live_variables(statement.statements, live, remove)
+            else_live = live
+            if statement.else_statements is not None:
+                else_live = live_variables(statement.else_statements, live, remove)
+            live = then_live | else_live | variables_read(statement.condition)
+
+        elif isinstance(statement, JackAST.While):
+            # the variables that are live at the test of the condition, which is reached from before the loop and
+            # from the end of the body. They are found by iterating until they don't change
+            condition_read = variables_read(statement.condition)
+            loop_live = live | condition_read
+            while True:
+                new_loop_live = live | condition_read | live_variables(statement.statements, loop_live, False)
+                if new_loop_live == loop_live:
+                    break
+                loop_live = new_loop_live
+            if remove:
+                live_variables(statement.statements, loop_live, True)
+            live = loop_live
+
+        elif isinstance(statement, JackAST.Do):
+            live = live | variables_read(statement.call)
+
+        else:
+            live = set()
+            if statement.value is not None:
+                live = variables_read(statement.value)
+
+        result.append(statement)
+
+    if remove:
+        statements[:] = reversed(result)
+    return live
+
+
+def renumber_locals(subroutine):
+    """
+    removes the locals that the statements of a subroutine never refer to, and renumbers the rest from 0 in their
+    order, so that the function reserves space only for those
+    :param subroutine: JackAST.Subroutine
+    :return: void
+    """
+    used = {}  # index -> JackAST.Variable of each local that is used
+
+    def find(expression):
+        if isinstance(expression, (JackAST.VariableReference, JackAST.ArrayReference)) and \
+                expression.variable.kind == 'var':
+            used[expression.variable.index] = expression.variable
+        return expression
+
+    transform_statements(subroutine.statements, find)
+    for statement in all_statements(subroutine.statements):
+        if isinstance(statement, JackAST.Let) and statement.variable.kind == 'var':
+            used[statement.variable.index] = statement.variable
+    if len(used) == subroutine.local_count:
+        return
+
+    renumbered = {}  # old index -> the renumbered JackAST.Variable
+    for new_index, index in enumerate(sorted(used)):
+        variable = used[index]
+        renumbered[index] = JackAST.Variable(variable.name, variable.type_, variable.kind, variable.segment, new_index)
+
+    def renumber(expression):
+        if isinstance(expression, (JackAST.VariableReference, JackAST.ArrayReference)) and \
+                expression.variable.kind == 'var':
+            expression.variable = renumbered[expression.variable.index]
+        return expression
+
+    transform_statements(subroutine.statements, renumber)
+    for statement in all_statements(subroutine.statements):
+        if isinstance(statement, JackAST.Let) and statement.variable.kind == 'var':
+            statement.variable = renumbered[statement.variable.index]
+    subroutine.local_count = len(renumbered)
+
+
+def remove_dead_stores(subroutine):
+    """
+    removes the lets to locals and arguments whose values are never read (keeping the values that have side effects,
+    as do statements), and then the locals that are no longer used at all
+    :param subroutine: JackAST.Subroutine
+    :return: JackAST.Subroutine
+    """
+    live_variables(subroutine.statements, set(), True)
+    renumber_locals(subroutine)
+    return subroutine
+
+
+# the temp slots that saved values are kept in. temp 0 is used by the code of do statements and array stores, and
+# temp 1 and temp 2 by the multiplication sequences of VMPasses
+saved_value_slots = (3, 4, 5, 6, 7)
+
+# the Hack instructions that CodeWriter translates the parts of a pure expression into, to estimate what evaluating
+# it again costs. Pushing a saved value costs 10, and saving it in the first place 23 more
+push_costs = {'static': 7, 'constant': 7}
+push_cost = 10
+operator_costs = {'+': 7, '-': 7, '&': 7, '|': 7, '<': 27, '>': 27, '=': 27, 'neg': 3, 'not': 3}
+array_read_cost = 40  # add, pop pointer 1, push that 0, and pushing the array variable
+save_cost = 23
+saved_push_cost = 10
+
+
+def value_keys(expression, keys, costs):
+    """
+    finds the value key and the cost of every pure subexpression of an expression that doesn't call a subroutine
+    (including Math.multiply and Math.divide): two such expressions with the same key always have the same value,
+    as long as no subroutine is called between them, since only a subroutine can change memory
+    :param expression: expression
+    :param keys: dictionary of id(expression) -> key, which the keys are added to
+    :param costs: dictionary of id(expression) -> the estimated Hack cost of evaluating the expression
+    :return: the keys of the subexpressions that can be reused: array reads and operations
+    """
+    reusable_keys = []
+    stack = [(expression, False)]
+    while stack:
+        expression, visited = stack.pop()
+        if not visited:
+            stack.append((expression, True))
+            stack.extend((child, False) for child in children_of(expression))
+            continue
+
+        key = None
+        if isinstance(expression, JackAST.IntegerConstant):
+            key = ('integer', expression.value)
+            cost = push_costs['constant']
+        elif isinstance(expression, JackAST.KeywordConstant):
+            key = ('keyword', expression.keyword)
+            cost = push_cost
+        elif isinstance(expression, JackAST.VariableReference):
+            variable = expression.variable
+            key = ('variable', variable.segment, variable.index)
+            cost = push_costs.get(variable.segment, push_cost)
+        elif isinstance(expression, JackAST.ArrayReference):
+            index_key = keys.get(id(expression.index))
+            if index_key is not None:
+                variable = expression.variable
+                key = ('array', variable.segment, variable.index, index_key)
+                cost = costs[id(expression.index)] + array_read_cost
+        elif isinstance(expression, JackAST.UnaryOperation):
+            operand_key = keys.get(id(expression.operand))
+            if operand_key is not None:
+                key = ('unary', expression.operator, operand_key)
+                cost = costs[id(expression.operand)] + operator_costs['neg']
+        elif isinstance(expression, JackAST.BinaryOperation) and expression.operator in operator_costs:
+            left_key = keys.get(id(expression.left))
+            right_key = keys.get(id(expression.right))
+            if left_key is not None and right_key is not None:
+                key = ('binary', expression.operator, left_key, right_key)
+                cost = costs[id(expression.left)] + costs[id(expression.right)] + operator_costs[expression.operator]
+        if key is not None:
+            keys[id(expression)] = key
+            costs[id(expression)] = cost
+            if key[0] in ('array', 'unary', 'binary'):
+                reusable_keys.append(key)
+    return reusable_keys
+
+
+def calls_subroutine(expression):
+    """
+    :param expression: expression
+    :return: whether the code of the expression itself (not of its operands) calls a subroutine
+    """
+    return isinstance(expression, (JackAST.Call, JackAST.StringConstant)) or \
+        isinstance(expression, JackAST.BinaryOperation) and expression.operator in ('*', '/')
+
+
+def number_values(expressions):
+    """
+    finds the repeated pure subexpressions of a list of expressions that are evaluated one after the other, whose
+    values can be kept in a temp slot the first time, and pushed from it again instead of being evaluated again. A
+    value is reused only up to the next call of a subroutine, which can change memory and the temp segment, and only
+    if that saves Hack instructions
+    :param expressions: list of expressions, in the order that they're evaluated
+    :return: list of the expressions with SavedValue and SavedValueReference nodes
+    """
+    keys = {}
+    costs = {}
+    reusable_keys = []
+    for expression in expressions:
+        reusable_keys += value_keys(expression, keys, costs)
+    if len(set(reusable_keys)) == len(reusable_keys):
+        # no value repeats
+        return expressions
+
+    # walk the expressions in the order of evaluation. 'available' has the first occurrence of each key that was
+    # evaluated since the last call
+    available = {}
+    first_occurrences = {}  # id(expression) -> the expression
+    reuses = {}  # id(expression) -> id of the first occurrence of its value
+    reuse_counts = {}  # id of a first occurrence -> the number of times that it is reused
+    stack = [(expression, False) for expression in reversed(expressions)]
+    while stack:
+        expression, evaluated = stack.pop()
+        key = keys.get(id(expression))
+        if evaluated:
+            if calls_subroutine(expression):
+                available.clear()
+            elif key is not None and key not in available and not isinstance(expression, JackAST.VariableReference):
+                available[key] = expression
+                first_occurrences[id(expression)] = expression
+            continue
+        if key is not None and key in available:
+            first = id(available[key])
+            reuses[id(expression)] = first
+            reuse_counts[first] = reuse_counts.get(first, 0) + 1
+            continue
+        stack.append((expression, True))
+        stack.extend((child, False) for child in reversed(children_of(expression)))
+
+    # the first occurrences that are worth saving get slots, in the order that they are first reused
+    slots = {}  # id of a first occurrence -> its slot
+    for first, count in reuse_counts.items():
+        if len(slots) == len(saved_value_slots):
+            break
+        if (costs[first] - saved_push_cost) * count > save_cost:
+            slots[first] = saved_value_slots[len(slots)]
+    if not slots:
+        return expressions
+
+    def replace(expression):
+        first = reuses.get(id(expression))
+        if first is not None and first in slots:
+            return JackAST.SavedValueReference(slots[first])
+        if id(expression) in slots:
+            return JackAST.SavedValue(expression, slots[id(expression)])
+        return expression
+
+    return [transform_expression(expression, replace) for expression in expressions]
+
+
+def number_statement_values(statements):
+    for statement in statements:
+        if isinstance(statement, JackAST.Let):
+            if statement.index is None:
+                statement.value, = number_values([statement.value])
+            else:
+                # the index is evaluated before the value, and nothing between them changes memory
+                statement.index, statement.value = number_values([statement.index, statement.value])
+        elif isinstance(statement, JackAST.If):
+            statement.condition, = number_values([statement.condition])
+            number_statement_values(statement.statements)
+            if statement.else_statements is not None:
+                number_statement_values(statement.else_statements)
+        elif isinstance(statement, JackAST.While):
+            statement.condition, = number_values([statement.condition])
+            number_statement_values(statement.statements)
+        elif isinstance(statement, JackAST.Do):
+            statement.call, = number_values([statement.call])
+        elif statement.value is not None:
+            statement.value, = number_values([statement.value])
+
+
+def number_subroutine_values(subroutine):
+    """
+    local value numbering: within each statement, a repeated pure expression (e.g. the 'a[i]' of
+    'let x = a[i] + (a[i] * a[i])') is evaluated once, kept in a temp slot, and pushed from the slot where it repeats.
+    The code of an array store only uses pointer 1 and that 0 after its value is evaluated, so reusing the values of
+    array reads in its value is safe
+    :param subroutine: JackAST.Subroutine
+    :return: JackAST.Subroutine
+    """
+    number_statement_values(subroutine.statements)
+    return subroutine
+
+
+def invariant_keys(expression, assigned, keys):
+    """
+    finds the subexpressions of an expression whose values can't change while a loop runs: those built only of
+    constants, of locals and arguments that the loop doesn't assign to, and of operators. Array entries, fields and
+    statics can be changed by the calls and array stores of the loop, so they are never invariant
+    :param expression: expression
+    :param assigned: set of (kind, index) of the variables that the loop assigns to
+    :param keys: dictionary of id(expression) -> structural key of each invariant subexpression, which the keys are
+    added to
+    :return: void
+    """
+    stack = [(expression, False)]
+    while stack:
+        expression, visited = stack.pop()
+        if not visited:
+            stack.append((expression, True))
+            stack.extend((child, False) for child in children_of(expression))
+            continue
+
+        key = None
+        if isinstance(expression, JackAST.IntegerConstant):
+            key = ('integer', expression.value)
+        elif isinstance(expression, JackAST.KeywordConstant):
+            key = ('keyword', expression.keyword)
+        elif isinstance(expression, JackAST.VariableReference):
+            variable = expression.variable
+            if variable.kind in propagated_kinds and variable_key(variable) not in assigned:
+                key = ('variable', variable.segment, variable.index)
+        elif isinstance(expression, JackAST.UnaryOperation):
+            operand_key = keys.get(id(expression.operand))
+            if operand_key is not None:
+                key = ('unary', expression.operator, operand_key)
+        elif isinstance(expression, JackAST.BinaryOperation):
+            left_key = keys.get(id(expression.left))
+            right_key = keys.get(id(expression.right))
+            if left_key is not None and right_key is not None:
+                key = ('binary', expression.operator, left_key, right_key)
+        if key is not None:
+            keys[id(expression)] = key
+
+
+def worth_hoisting(expression):
+    """
+    :param expression: an invariant expression
+    :return: whether keeping the value of the expression in a local is cheaper than evaluating it on each iteration
+    """
+    while isinstance(expression, JackAST.UnaryOperation):
+        expression = expression.operand
+    return isinstance(expression, JackAST.BinaryOperation)
+
+
+def divides(expression):
+    """
+    :param expression: expression
+    :return: whether the expression has a division, which fails when it divides by 0
+    """
+    stack = [expression]
+    while stack:
+        expression = stack.pop()
+        if isinstance(expression, JackAST.BinaryOperation) and expression.operator == '/':
+            return True
+        stack.extend(children_of(expression))
+    return False
+
+
+class LoopHoister:
+    """
+    hoists the invariant expressions of the loops of one subroutine into fresh locals, which are assigned before the
+    loops
+    """
+
+    def __init__(self, subroutine):
+        self.subroutine = subroutine
+        self.hoisted_count = 0
+
+    def hoist_statements(self, statements):
+        """
+        hoists the invariant expressions of every loop in a list of statements (at any depth), innermost loops first
+        :param statements: list of statements. Changed in place
+        :return: void
+        """
+        result = []
+        for statement in statements:
+            if isinstance(statement, JackAST.If):
+                self.hoist_statements(statement.statements)
+                if statement.else_statements is not None:
+                    self.hoist_statements(statement.else_statements)
+            elif isinstance(statement, JackAST.While):
+                self.hoist_statements(statement.statements)
+                result += self.hoist_loop(statement)
+            result.append(statement)
+        statements[:] = result
+
+    def hoist_loop(self, while_):
+        """
+        replaces the invariant expressions of a loop with the locals that they are hoisted into
+        :param while_: JackAST.While
+        :return: list of the lets that assign the hoisted values, to run before the loop
+        """
+        assigned = assigned_variables(while_.statements)
+        locals_ = {}  # key of a hoisted expression -> the local that it is hoisted into
+        lets = []
+
+        def hoist(expression, conditional):
+            keys = {}
+            invariant_keys(expression, assigned, keys)
+            if not keys:
+                return expression
+
+            def replacement(expression_):
+                key = keys.get(id(expression_))
+                # a division that the loop may never reach mustn't fail before the loop
+                if key is None or not worth_hoisting(expression_) or conditional and divides(expression_):
+                    return None
+                if key not in locals_:
+                    variable = JackAST.Variable(f'hoisted${self.hoisted_count}', 'int', 'var', 'local',
+                                                self.subroutine.local_count)
+                    self.hoisted_count += 1
+                    self.subroutine.local_count += 1
+                    locals_[key] = variable
+                    lets.append(JackAST.Let(variable, None, expression_))
+                return JackAST.VariableReference(locals_[key])
+
+            # the largest invariant expressions are replaced, top down
+            root = replacement(expression)
+            if root is not None:
+                return root
+            stack = [expression]
+            while stack:
+                expression_ = stack.pop()
+                children = children_of(expression_)
+                replaced = False
+                for number, child in enumerate(children):
+                    new_child = replacement(child)
+                    if new_child is None:
+                        stack.append(child)
+                    else:
+                        children[number] = new_child
+                        replaced = True
+                if replaced:
+                    set_children(expression_, children)
+            return expression
+
+        # the condition is evaluated at least once, but the body may not be
+        while_.condition = hoist(while_.condition, False)
+        rewrite_expressions(while_.statements, lambda expression: hoist(expression, True))
+        return lets
+
+
+def hoist_invariants(subroutine):
+    """
+    loop-invariant code motion: the expressions of a while loop that are computed only from constants and from the
+    locals and arguments that the loop doesn't assign to (e.g. the 'n * width' of 'while (i < (n * width))') are
+    computed once before the loop, into fresh locals
+    :param subroutine: JackAST.Subroutine
+    :return: JackAST.Subroutine
+    """
+    LoopHoister(subroutine).hoist_statements(subroutine.statements)
+    return subroutine
@@ -0,0 +1,215 @@
+import os
+import sys
+import json
+import time
+import signal
+import pathlib
+import argparse
+import resource
+import multiprocessing
+import concurrent.futures
+import concurrent.futures.process
+import JackCompiler
+import VMtranslator
+
+
+class TimeLimitExceeded(Exception):
+    pass
+
+
+def raise_time_limit_exceeded(signal_number, frame):
+    raise TimeLimitExceeded('the project took longer than the time limit')
+
+
+# the states of the projects of a batch, in 'project_states'
+NOT_STARTED = 0
+BUILDING = 1
+BUILT = 2
+
+# the state of each project of the batch, in the order of the manifest. It is shared by all of the worker processes,
+# so that when a worker dies, the batch can tell which projects were building in it
+project_states = None
+
+
+def start_worker(memory_limit, states):
+    """
+    sets up a worker process of the batch: limits its memory, and gets it ready to limit the time of each project.
+    The compiler modules are already imported, so every project after the first one starts warm.
+    The memory limit is on the whole worker process, not on each project: the memory that the worker holds on to
+    after a project counts towards the limit of the projects after it
+    :param memory_limit: the most memory (in megabytes) that the worker may use, or None for no limit
+    :param states: the shared array of the states of the projects
+    :return: void
+    """
+    global project_states
+    project_states = states
+    if memory_limit is not None:
+        limit = memory_limit * 1024 * 1024
+        resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+    signal.signal(signal.SIGALRM, raise_time_limit_exceeded)
+
+
+def build_project_number(number, directory, time_limit):
+    """
+    builds project number 'number' of the batch in a worker process, and keeps its state up to date
+    :return: the result of build_project()
+    """
+    project_states[number] = BUILDING
+    result = build_project(directory, time_limit)
+    project_states[number] = BUILT
+    return result
+
+
+def build_project(directory, time_limit):
+    """
+    runs the whole pipeline for one project: compiles each of its .jack files into a .vm file, and translates all of
+    its .vm files into <directory>/<directory name>.asm
+    :param directory: pathlib.Path of the project directory
+    :param time_limit: the most time (in seconds) that the project may take, or None for no limit
+    :return: dictionary with the status and timings of the project
+    """
+    result = {'project': str(directory), 'status': 'ok', 'error': None}
+    start = time.perf_counter()
+    compiled = start
+    if time_limit is not None:
+        signal.setitimer(signal.ITIMER_REAL, time_limit)
+    try:
+        paths = sorted(path for path in directory.iterdir() if str(path).endswith('.jack'))
+        result['files'] = len(paths)
+        # file by file, so that a timeout or a MemoryError isn't collected as the error of the file it interrupted
+        for path in paths:
+            JackCompiler.compile_file(path)
+        compiled = time.perf_counter()
+        VMtranslator.translate(directory, directory / f'{directory.name}.asm')
+    except TimeLimitExceeded as error:
+        result['status'] = 'timeout'
+        result['error'] = str(error)
+    except MemoryError:
+        result['status'] = 'out of memory'
+        result['error'] = 'the project needed more memory than the memory limit'
+    except Exception as error:
+        result['status'] = 'error'
+        result['error'] = f'{type(error).__name__}: {error}'
+    finally:
+        signal.setitimer(signal.ITIMER_REAL, 0)
+    end = time.perf_counter()
+
+    result['compile_seconds'] = compiled - start
+    result['translate_seconds'] = end - compiled if compiled > start else 0.0
+    result['seconds'] = end - start
+    return result
+
+
+def read_manifest(path):
+    """
+    reads a manifest of project directories: one directory per line. Blank lines and lines that start with '#' are
+    skipped, and relative directories are relative to the manifest
+    :param path: pathlib.Path
+    :return: list of pathlib.Path
+    """
+    directories = []
+    for line in path.read_text().splitlines():
+        line = line.strip()
+        if not line or line.startswith('#'):
+            continue
+        directories.append((path.parent / line).absolute())
+    return directories
+
+
+def run_batch(directories, results_path, jobs, time_limit=None, memory_limit=None):
+    """
+    builds every project in 'directories' in a pool of 'jobs' worker processes, and writes the result of each project
+    to 'results_path' as one line of json, in the order of 'directories', as soon as it is known.
+    A worker that dies (e.g. by a signal, or the OOM killer) breaks its pool. The projects that hadn't started yet
+    are then built in a new pool, and those that were building when the pool broke are built again one at a time,
+    each in a pool of its own. A project that breaks even a pool of its own is recorded as 'crashed', and the rest of
+    the batch goes on
+    :return: the number of projects that didn't build
+    """
+    states = multiprocessing.Array('b', len(directories), lock=False)
+    results = [None] * len(directories)
+    waiting = list(range(len(directories)))
+    suspects = []  # the projects that were building in a pool that broke
+    written = 0
+    failures = 0
+
+    with results_path.open('w') as results_file:
+
+        def write_known_results():
+            # writes the results that are known, up to the first one that isn't
+            nonlocal written, failures
+            while written < len(results) and results[written] is not None:
+                if results[written]['status'] != 'ok':
+                    failures += 1
+                results_file.write(json.dumps(results[written]) + '\n')
+                results_file.flush()
+                written += 1
+
+        while waiting or suspects:
+            if suspects:
+                numbers = [suspects.pop(0)]
+                workers = 1
+            else:
+                numbers = waiting
+                workers = jobs
+                waiting = []
+
+            broken = []
+            with concurrent.futures.ProcessPoolExecutor(workers, initializer=start_worker,
+                                                        initargs=(memory_limit, states)) as pool:
+                futures = [pool.submit(build_project_number, number, directories[number], time_limit)
+                           for number in numbers]
+                for number, future in zip(numbers, futures):
+                    try:
+                        results[number] = future.result()
+                    except concurrent.futures.process.BrokenProcessPool:
+                        broken.append(number)
+                    write_known_results()
+
+            if not broken:
+                continue
+            if len(numbers) == 1:
+                # the project broke a pool of its own
+                results[broken[0]] = {'project': str(directories[broken[0]]), 'status': 'crashed',
+                                      'error': 'the worker process died while building the project'}
+                write_known_results()
+            else:
+                building = [number for number in broken if states[number] == BUILDING]
+                if building:
+                    suspects += building
+                    waiting = [number for number in broken if states[number] != BUILDING]
+                else:
+                    # a worker that died between projects leaves every project of its pool under suspicion
+                    suspects += broken
+            for number in broken:
+                states[number] = NOT_STARTED
+    return failures
+
+
+def main():
+    argument_parser = argparse.ArgumentParser(description='runs the whole jack -> vm -> asm pipeline for each of the '
+                                                          'project directories in a manifest')
+    argument_parser.add_argument('manifest', help='file with one project directory per line')
+    argument_parser.add_argument('results', help='file to write the result of each project to, as json lines')
+    argument_parser.add_argument('--jobs', '-j', type=int, default=0,
+                                 help='the number of worker processes (0, the default, for one per cpu)')
+    argument_parser.add_argument('--time-limit', type=float,
+                                 help='the most time (in seconds) that one project may take')
+    argument_parser.add_argument('--memory-limit', type=int,
+                                 help='the most memory (in megabytes) that a worker process may use. The limit is '
+                                      'per worker, not per project: a worker builds many projects in turn')
+    arguments = argument_parser.parse_args(sys.argv[1:])
+
+    jobs = arguments.jobs
+    if jobs == 0:
+        jobs = os.cpu_count()
+
+    directories = read_manifest(pathlib.Path(arguments.manifest))
+    failures = run_batch(directories, pathlib.Path(arguments.results), jobs, arguments.time_limit,
+                         arguments.memory_limit)
+    if failures:
+        sys.exit(f'{failures} of {len(directories)} projects failed to build')
+
+
+if __name__ == '__main__':
+    main()
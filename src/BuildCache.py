@@ -0,0 +1,243 @@
+import json
+import hashlib
+import pathlib
+import ClassInterface
+
+
+def file_hash(path):
+    """
+    returns the sha256 hash of the contents of the file at 'path'
+    :param path: pathlib.Path
+    :return: string
+    """
+    return hashlib.sha256(path.read_bytes()).hexdigest()
+
+
+def compiler_version():
+    """
+    returns a fingerprint of the compiler itself (the hash of all of its modules), so that any change to the compiler
+    invalidates everything that it compiled before
+    :return: string
+    """
+    hash_ = hashlib.sha256()
+    for path in sorted(pathlib.Path(__file__).parent.glob('*.py')):
+        hash_.update(path.name.encode())
+        hash_.update(path.read_bytes())
+    return hash_.hexdigest()
+
+
+class BuildCache:
+    """
+    persistent build cache for a directory of .jack files. A manifest next to the sources records, for each .jack file,
+    the hash of its contents, the hash of the .vm file that was compiled from it, and the fingerprints of the
+    interfaces of the classes that it uses. A file whose contents, output and compiler version all still match the
+    manifest doesn't need to be compiled again, unless the interface of a class that it uses has changed since
+    """
+
+    manifest_name = '.jackcache.json'
+
+    def __init__(self, directory, version):
+        """
+        loads the manifest of 'directory', if there is one
+        :param directory: the directory of the .jack files
+        :param version: the compiler version (and options) that the cached outputs must have been compiled with
+        """
+        self.manifest_path = directory / self.manifest_name
+        self.version = version
+        self.entries = {}
+        self.changed = False
+
+        # the subroutine cache of each .jack file, loaded the first time it's needed
+        self.subroutine_caches = {}
+
+        if self.manifest_path.is_file():
+            try:
+                manifest = json.loads(self.manifest_path.read_text())
+            except ValueError:  # a corrupt manifest is the same as no manifest
+                manifest = {}
+            if manifest.get('version') == self.version:
+                self.entries = manifest.get('files', {})
+
+    def subroutine_cache(self, input_path):
+        """
+        returns the SubroutineCache of 'input_path'. It is kept in memory for as long as this build cache is
+        :param input_path: pathlib.Path of a .jack file
+        :return: SubroutineCache
+        """
+        if input_path.name not in self.subroutine_caches:
+            self.subroutine_caches[input_path.name] = SubroutineCache(input_path, self.version)
+        return self.subroutine_caches[input_path.name]
+
+    def is_fresh(self, input_path, output_path):
+        """
+        returns True if 'output_path' (and the interface file next to it) was compiled from the current contents of
+        'input_path', by this compiler version
+        :param input_path: pathlib.Path of a .jack file
+        :param output_path: pathlib.Path of its .vm file
+        :return: boolean
+        """
+        entry = self.entries.get(input_path.name)
+        if entry is None or not output_path.is_file() or \
+                not output_path.with_suffix(ClassInterface.ClassInterface.suffix).is_file():
+            return False
+        return entry['source'] == file_hash(input_path) and entry['output'] == file_hash(output_path)
+
+    def dependencies_changed(self, input_path, interfaces):
+        """
+        returns True if the interface of any class that 'input_path' uses is different from when it was compiled
+        :param input_path: pathlib.Path of a .jack file
+        :param interfaces: dictionary of class name -> the current ClassInterface of that class
+        :return: boolean
+        """
+        for class_name, fingerprint in self.entries[input_path.name]['dependencies'].items():
+            if fingerprint != self.fingerprint_of(class_name, interfaces):
+                return True
+        return False
+
+    def record(self, input_path, output_path, class_interface, used_classes):
+        """
+        records that 'output_path' was just compiled from 'input_path', and writes the interface of its class next to it
+        :param input_path: pathlib.Path of a .jack file
+        :param output_path: pathlib.Path of its .vm file
+        :param class_interface: ClassInterface of the compiled class
+        :param used_classes: the names of the classes whose subroutines 'input_path' calls
+        :return: void
+        """
+        class_interface.save(output_path.with_suffix(ClassInterface.ClassInterface.suffix))
+
+        # the fingerprints of the interfaces are filled in by save(), once every class has been compiled
+        self.entries[input_path.name] = {'source': file_hash(input_path), 'output': file_hash(output_path),
+                                         'dependencies': dict.fromkeys(sorted(used_classes))}
+        self.changed = True
+
+    def forget(self, input_path):
+        """
+        removes the entry of 'input_path', so that it is compiled again by the next build
+        :param input_path: pathlib.Path of a .jack file
+        :return: void
+        """
+        if self.entries.pop(input_path.name, None) is not None:
+            self.changed = True
+
+    @staticmethod
+    def fingerprint_of(class_name, interfaces):
+        """
+        returns the fingerprint of the interface of 'class_name', or None for a class that wasn't compiled here (e.g.
+        a class of the OS)
+        """
+        if class_name in interfaces:
+            return interfaces[class_name].fingerprint()
+        return None
+
+    def save(self, interfaces):
+        """
+        writes the manifest back to disk, if anything was recorded
+        :param interfaces: dictionary of class name -> the current ClassInterface of that class
+        :return: void
+        """
+        if not self.changed:
+            return
+        for entry in self.entries.values():
+            for class_name in entry['dependencies']:
+                entry['dependencies'][class_name] = self.fingerprint_of(class_name, interfaces)
+        temp_path = self.manifest_path.with_suffix('.tmp')
+        temp_path.write_text(json.dumps({'version': self.version, 'files': self.entries}, indent=1, sort_keys=True))
+        temp_path.replace(self.manifest_path)
+        self.changed = False
+
+    def clean(self):
+        """
+        invalidates the cache: deletes the manifest, and every .vm file (and interface and subroutine cache) that it
+        recorded
+        :return: void
+        """
+        if not self.manifest_path.is_file():
+            return
+
+        # the outputs of every recorded file are deleted, whichever compiler version compiled them
+        try:
+            recorded_files = json.loads(self.manifest_path.read_text()).get('files', {})
+        except ValueError:
+            recorded_files = {}
+        for name in recorded_files:
+            for suffix in ('.vm', ClassInterface.ClassInterface.suffix):
+                output_path = (self.manifest_path.parent / name).with_suffix(suffix)
+                if output_path.is_file():
+                    output_path.unlink()
+            SubroutineCache(self.manifest_path.parent / name, self.version).clean()
+
+        self.manifest_path.unlink()
+        self.entries = {}
+        self.changed = False
+
+
+class SubroutineCache:
+    """
+    persistent cache of the compiled VM code of each subroutine of one class. Each entry is keyed by a fingerprint of
+    the tokens of the subroutine together with the class level state that its code depends on (the class name and the
+    layout of the static and field variables), so a subroutine whose fingerprint is unchanged can reuse its VM code
+    """
+
+    def __init__(self, input_path, version):
+        """
+        loads the subroutine cache of the .jack file 'input_path', if there is one
+        :param input_path: pathlib.Path of a .jack file
+        :param version: the compiler version (and options) that the cached code must have been compiled with
+        """
+        self.path = input_path.with_name(f'.{input_path.stem}.subroutines.json')
+        self.version = version
+        self.entries = {}
+        self.used_entries = {}
+
+        if self.path.is_file():
+            try:
+                cache = json.loads(self.path.read_text())
+            except ValueError:  # a corrupt cache is the same as no cache
+                cache = {}
+            if cache.get('version') == self.version:
+                self.entries = cache.get('subroutines', {})
+
+    def lookup(self, fingerprint):
+        """
+        returns the cached entry for 'fingerprint', or None if there isn't one
+        :param fingerprint: string
+        :return: dictionary with the 'vm' code, the 'signature' and the 'used_classes' of the subroutine
+        """
+        entry = self.entries.get(fingerprint)
+        if entry is not None:
+            self.used_entries[fingerprint] = entry
+        return entry
+
+    def record(self, fingerprint, vm_code, signature, used_classes):
+        """
+        records the VM code that a subroutine was just compiled into
+        :param fingerprint: string
+        :param vm_code: string
+        :param signature: (name, kind, arity, return type) of the subroutine
+        :param used_classes: the names of the classes whose subroutines the subroutine calls
+        :return: void
+        """
+        self.used_entries[fingerprint] = {'vm': vm_code, 'signature': list(signature),
+                                          'used_classes': sorted(used_classes)}
+
+    def save(self):
+        """
+        writes the cache back to disk. Only the subroutines of the last compilation are kept
+        :return: void
+        """
+        temp_path = self.path.with_suffix('.tmp')
+        temp_path.write_text(json.dumps({'version': self.version, 'subroutines': self.used_entries}))
+        temp_path.replace(self.path)
+
+        self.entries = self.used_entries
+        self.used_entries = {}
+
+    def clean(self):
+        """
+        deletes the cache
+        :return: void
+        """
+        if self.path.is_file():
+            self.path.unlink()
+        self.entries = {}
+        self.used_entries = {}
@@ -0,0 +1,256 @@
+import sys
+import json
+import time
+import socket
+import asyncio
+import pathlib
+import argparse
+import BuildCache
+import OutputBuffer
+import CodeWriter
+import JackCompiler
+import VMtranslator
+import PassManager
+
+
+class BuildDaemon:
+    """
+    long running build of one project directory. Watches the .jack files of the directory and, whenever any of them
+    changes, compiles the changed classes and translates the .vm files that changed into the .asm output file. The
+    build cache, the subroutine caches and the translated assembly of every .vm file are all kept in memory between
+    builds, so a build only does the work that an edit actually requires.
+    Clients can ask for a build (and get its timing) through a unix socket in the directory. Builds run in a worker
+    thread, one at a time, so the daemon keeps answering clients while it builds
+    """
+
+    socket_name = '.jackd.sock'
+
+    def __init__(self, directory, output_path, poll_interval=0.1, pass_manager=None):
+        """
+        :param directory: pathlib.Path of the project directory
+        :param output_path: pathlib.Path of the .asm file to write
+        :param poll_interval: how often (in seconds) to check the .jack files for changes
+        :param pass_manager: PassManager.PassManager with the optimization passes to run, or None for none. Both the
+        compilation and the translation run its passes, as JackCompiler and VMtranslator do with the same options
+        """
+        self.directory = directory
+        self.output_path = output_path
+        self.poll_interval = poll_interval
+        self.pass_manager = pass_manager
+
+        # code compiled with other passes is out of date
+        version = BuildCache.compiler_version()
+        if pass_manager is not None:
+            version += pass_manager.fingerprint()
+        self.build_cache = BuildCache.BuildCache(directory, version)
+
+        # (modification time, size) of each .jack file that is built and each .vm file, as of the last build
+        self.jack_files = {}
+        self.vm_files = {}
+
+        # (modification time, size) of every .jack file as of the last build, including the ones that failed to
+        # compile. The watcher builds again only once one of them changes, while a build request also tries the
+        # files that failed again
+        self.seen_jack_files = {}
+
+        # the translated assembly of each .vm file
+        self.asm_code = {}
+
+        self.last_report = None
+        self.server = None
+        self.stopped = None
+        self.build_lock = None
+
+    def stamps(self, suffix):
+        """
+        returns the (modification time, size) of each file in the directory that ends with 'suffix'
+        :param suffix: string
+        :return: dictionary of file name -> (modification time, size)
+        """
+        stamps = {}
+        for path in self.directory.glob('*' + suffix):
+            stat = path.stat()
+            stamps[path.name] = (stat.st_mtime_ns, stat.st_size)
+        return stamps
+
+    def translate(self, path):
+        """
+        translates one .vm file into assembly. The labels that the code writer makes up are prefixed with the name of
+        the file, so that files can be translated separately and put together in any order
+        :param path: pathlib.Path of a .vm file
+        :return: string
+        """
+        output_file = OutputBuffer.OutputBuffer()
+        code_writer = CodeWriter.CodeWriter(self.output_path, output_file, f'{path.stem}$')
+        VMtranslator.translate_file(path, code_writer, self.pass_manager)
+        return output_file.getvalue()
+
+    def write_asm(self):
+        """
+        writes the bootstrap code and the assembly of all of the .vm files to the output file
+        :return: void
+        """
+        output_file = OutputBuffer.OutputBuffer(self.output_path)
+        CodeWriter.CodeWriter(self.output_path, output_file).write_init()
+        for name in sorted(self.asm_code):
+            output_file.write(self.asm_code[name])
+        output_file.close()
+
+    def build(self):
+        """
+        compiles the .jack files that changed (and the ones that depend on them), translates the .vm files that
+        changed, and writes the .asm output file
+        :return: a report of the build: what was compiled and translated, how long it took, and the error, if any
+        """
+        start = time.perf_counter()
+        report = {'compiled': [], 'translated': [], 'error': None}
+
+        jack_files = self.stamps('.jack')
+        if jack_files != self.jack_files:
+            paths = [self.directory / name for name in sorted(jack_files)]
+            try:
+                compiled_paths, errors = JackCompiler.build(self.directory, paths, self.build_cache,
+                                                            pass_manager=self.pass_manager)
+            except Exception as error:
+                # nothing new is known to be built
+                report['error'] = f'{type(error).__name__}: {error}'
+            else:
+                # the other classes are built even if some failed, and only they are up to date
+                report['compiled'] = [path.name for path in compiled_paths]
+                if errors:
+                    report['error'] = '\n'.join(f'{path.name}: {error}' for path, error in errors)
+                failed_names = {path.name for path, error in errors}
+                self.jack_files = {name: stamp for name, stamp in jack_files.items() if name not in failed_names}
+        self.seen_jack_files = jack_files
+        compiled = time.perf_counter()
+
+        vm_files = self.stamps('.vm')
+        for name, stamp in sorted(vm_files.items()):
+            if self.vm_files.get(name) != stamp:
+                self.asm_code[name] = self.translate(self.directory / name)
+                report['translated'].append(name)
+        for name in set(self.asm_code) - set(vm_files):
+            del self.asm_code[name]
+        if vm_files != self.vm_files:
+            self.write_asm()
+        self.vm_files = vm_files
+        end = time.perf_counter()
+
+        report['compile_seconds'] = compiled - start
+        report['translate_seconds'] = end - compiled
+        report['seconds'] = end - start
+        self.last_report = report
+        return report
+
+    async def run_build(self):
+        """
+        runs build() in a thread of the event loop's executor, after any build that is already running
+        :return: the report of the build
+        """
+        async with self.build_lock:
+            return await asyncio.get_running_loop().run_in_executor(None, self.build)
+
+    async def watch(self):
+        """
+        builds, and then builds again whenever a .jack file changes
+        :return: void
+        """
+        await self.run_build()
+        while True:
+            await asyncio.sleep(self.poll_interval)
+            if self.stamps('.jack') != self.seen_jack_files:
+                await self.run_build()
+
+    async def handle_client(self, reader, writer):
+        """
+        answers one request from a client. The request is one line: 'build', 'status' or 'stop', and the answer is
+        one line of json
+        """
+        command = (await reader.readline()).decode().strip()
+        if command == 'build':
+            answer = await self.run_build()
+        elif command == 'status':
+            answer = {'directory': str(self.directory), 'output': str(self.output_path),
+                      'building': self.build_lock.locked(), 'last_build': self.last_report}
+            if self.pass_manager is not None and self.pass_manager.collect_statistics:
+                answer['pass_statistics'] = self.pass_manager.report()
+        elif command == 'stop':
+            answer = {'stopped': True}
+            self.stopped.set()
+        else:
+            answer = {'error': f'unknown request \'{command}\''}
+        writer.write(json.dumps(answer).encode() + b'\n')
+        await writer.drain()
+        writer.close()
+
+    async def serve(self):
+        """
+        answers clients, and builds and watches the directory, until a client asks to stop
+        :return: void
+        """
+        self.stopped = asyncio.Event()
+        self.build_lock = asyncio.Lock()
+        socket_path = self.directory / self.socket_name
+        if socket_path.exists():
+            socket_path.unlink()
+
+        self.server = await asyncio.start_unix_server(self.handle_client, path=str(socket_path))
+        watch_task = asyncio.create_task(self.watch())
+        try:
+            await self.stopped.wait()
+        finally:
+            watch_task.cancel()
+            self.server.close()
+            await self.server.wait_closed()
+            if socket_path.exists():
+                socket_path.unlink()
+
+
+def request(directory, command):
+    """
+    sends a request to the daemon that is building 'directory' and returns its answer
+    :param directory: pathlib.Path of the project directory
+    :param command: 'build', 'status' or 'stop'
+    :return: dictionary
+    """
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as client:
+        client.connect(str(directory / BuildDaemon.socket_name))
+        client.sendall(command.encode() + b'\n')
+        return json.loads(client.makefile().readline())
+
+
+def main():
+    argument_parser = argparse.ArgumentParser(description='watches a directory of .jack files and keeps its .vm files '
+                                                          'and .asm file up to date')
+    argument_parser.add_argument('directory')
+    argument_parser.add_argument('output_file', nargs='?',
+                                 help='the .asm file to write (by default <directory>/<directory name>.asm)')
+    argument_parser.add_argument('--interval', type=float, default=0.1,
+                                 help='how often (in seconds) to check for changes')
+    argument_parser.add_argument('--request', choices=['build', 'status', 'stop'],
+                                 help='send a request to the daemon that is already watching the directory')
+    PassManager.add_arguments(argument_parser)
+    arguments = argument_parser.parse_args(sys.argv[1:])
+
+    directory = pathlib.Path(arguments.directory).absolute()
+
+    if arguments.request is not None:
+        try:
+            answer = request(directory, arguments.request)
+        except (FileNotFoundError, ConnectionRefusedError):
+            # no socket, or one that a daemon left behind when it was killed
+            sys.exit(f'no build daemon is watching {directory}')
+        print(json.dumps(answer, indent=1))
+        return
+
+    if arguments.output_file is None:
+        output_path = directory / f'{directory.name}.asm'
+    else:
+        output_path = pathlib.Path(arguments.output_file).absolute()
+
+    pass_manager = PassManager.from_arguments(arguments)
+    asyncio.run(BuildDaemon(directory, output_path, arguments.interval, pass_manager).serve())
+
+
+if __name__ == '__main__':
+    main()
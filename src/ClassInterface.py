@@ -0,0 +1,86 @@
+import json
+import hashlib
+
+
+class ClassInterface:
+    """
+    the interface (signature) of a compiled class: its name, the number of its fields, and for each of its subroutines
+    the kind (constructor, function or method), arity and return type. It is written next to the .vm file of the
+    class, so that other classes can use it without re-lexing the source of the class
+    """
+
+    suffix = '.jacki'
+
+    def __init__(self, class_name=''):
+        """
+        creates a new empty interface
+        :param class_name: string
+        """
+        self.class_name = class_name
+        self.field_count = 0
+        self.subroutines = {}  # name -> (kind, arity, return type)
+
+    def add_subroutine(self, name, kind, arity, return_type):
+        """
+        adds a subroutine to the interface
+        :param name: string
+        :param kind: 'constructor', 'function' or 'method'
+        :param arity: the number of declared parameters (not including 'this' of a method)
+        :param return_type: 'void' or a type
+        :return: void
+        """
+        self.subroutines[name] = (kind, arity, return_type)
+
+    def to_json(self):
+        return json.dumps({'class': self.class_name, 'fields': self.field_count,
+                           'subroutines': {name: list(signature) for name, signature in self.subroutines.items()}},
+                          separators=(',', ':'), sort_keys=True)
+
+    @staticmethod
+    def from_json(text):
+        contents = json.loads(text)
+        interface = ClassInterface(contents['class'])
+        interface.field_count = contents['fields']
+        for name, (kind, arity, return_type) in contents['subroutines'].items():
+            interface.add_subroutine(name, kind, arity, return_type)
+        return interface
+
+    def fingerprint(self):
+        """
+        returns a hash of the interface, which changes only when the interface changes
+        :return: string
+        """
+        return hashlib.sha256(self.to_json().encode()).hexdigest()
+
+    def save(self, path):
+        """
+        writes the interface to 'path'
+        :param path: pathlib.Path
+        :return: void
+        """
+        path.write_text(self.to_json())
+
+    @staticmethod
+    def load(path):
+        """
+        reads an interface that was written by save()
+        :param path: pathlib.Path
+        :return: ClassInterface
+        """
+        return ClassInterface.from_json(path.read_text())
+
+
+def load_interfaces(directory):
+    """
+    loads the interfaces of all of the classes that were compiled in 'directory'
+    :param directory: pathlib.Path
+    :return: dictionary of class name -> ClassInterface
+    """
+    interfaces = {}
+    for path in directory.glob('*' + ClassInterface.suffix):
+        try:
+            interface = ClassInterface.load(path)
+        except (ValueError, KeyError):  # a corrupt interface is the same as no interface
+            continue
+        interfaces[interface.class_name] = interface
+    return interfaces
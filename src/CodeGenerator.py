@@ -0,0 +1,392 @@
+import JackAST
+import ASTPasses
+import VMInstruction
+
+
+class CodeGenerator:
+    """
+    lowers the syntax tree of a subroutine to a list of VM instructions. Each expression leaves its value at the top of
+    the VM stack
+    """
+
+    # the VM code of each binary operator
+    binary_operators = {
+        '+': VMInstruction.arithmetic('add'),
+        '-': VMInstruction.arithmetic('sub'),
+        '=': VMInstruction.arithmetic('eq'),
+        '>': VMInstruction.arithmetic('gt'),
+        '<': VMInstruction.arithmetic('lt'),
+        '&': VMInstruction.arithmetic('and'),
+        '|': VMInstruction.arithmetic('or'),
+        '*': VMInstruction.call('Math.multiply', 2),
+        '/': VMInstruction.call('Math.divide', 2)
+    }
+
+    unary_operators = {'-': VMInstruction.arithmetic('neg'), '~': VMInstruction.arithmetic('not')}
+
+    def __init__(self):
+        self.instructions = []
+        self.if_counter = 0
+        self.while_counter = 0
+        self.string_counter = 0
+
+        # StringPool of the class, or None to build the string of a string constant every time that it's evaluated
+        self.string_pool = None
+
+        # whether a void subroutine returns without pushing a value. Only safe when no call site uses the value of a
+        # void subroutine, which the whole-program mode checks (see ProgramIndex)
+        self.elide_void_returns = False
+        self.pushes_void_value = True  # whether the subroutine being generated pushes 0 on a plain 'return'
+
+        # whether to rotate loops and lay out ifs so that they take fewer jumps and 'not's (see generate_while and
+        # generate_if_with_layout)
+        self.layout_branches = False
+
+        # whether an array store whose value can't change pointer 1 sets pointer 1 first and pops its value right
+        # into that 0, instead of going through temp 0
+        self.direct_array_stores = False
+
+    def generate_subroutine(self, subroutine):
+        """
+        returns the VM instructions of a subroutine
+        :param subroutine: JackAST.Subroutine
+        :return: list of VMInstruction
+        """
+        self.instructions = []
+        self.if_counter = 0
+        self.while_counter = 0
+        self.string_counter = 0
+        self.pushes_void_value = not (self.elide_void_returns and subroutine.return_type == 'void')
+        emit = self.instructions.append
+
+        emit(VMInstruction.function(subroutine.name, subroutine.local_count))
+        if subroutine.kind == 'method':
+            # push self and pop it to pointer 0 - this.
+            emit(VMInstruction.push('argument', 0))
+            emit(VMInstruction.pop('pointer', 0))
+        elif subroutine.kind == 'constructor':
+            emit(VMInstruction.push('constant', subroutine.field_count))
+            emit(VMInstruction.call('Memory.alloc', 1))
+            emit(VMInstruction.pop('pointer', 0))
+
+        self.generate_statements(subroutine.statements)
+
+        return self.instructions
+
+    def generate_statements(self, statements):
+        for statement in statements:
+            if isinstance(statement, JackAST.Let):
+                self.generate_let(statement)
+            elif isinstance(statement, JackAST.If):
+                self.generate_if(statement)
+            elif isinstance(statement, JackAST.While):
+                self.generate_while(statement)
+            elif isinstance(statement, JackAST.Do):
+                self.generate_do(statement)
+            else:
+                self.generate_return(statement)
+
+    def generate_let(self, let):
+        emit = self.instructions.append
+        variable = let.variable
+
+        if let.index is not None and self.direct_array_stores and not self.changes_that(let.value):
+            # the value can't change pointer 1, so the address is set before the value is computed, and the value is
+            # popped right into that 0 (or that k, for a constant index k)
+            index = let.index
+            if isinstance(index, JackAST.IntegerConstant) and index.value >= 0:
+                emit(VMInstruction.push(variable.segment, variable.index))
+                emit(VMInstruction.pop('pointer', 1))
+                self.generate_expression(let.value)
+                emit(VMInstruction.pop('that', index.value))
+            else:
+                self.generate_expression(index)
+                emit(VMInstruction.push(variable.segment, variable.index))
+                emit(VMInstruction.arithmetic('add'))
+                emit(VMInstruction.pop('pointer', 1))
+                self.generate_expression(let.value)
+                emit(VMInstruction.pop('that', 0))
+        elif let.index is not None:
+            # push address of array onto the stack: arr + index
+            self.generate_expression(let.index)
+            emit(VMInstruction.push(variable.segment, variable.index))
+            emit(VMInstruction.arithmetic('add'))
+
+            self.generate_expression(let.value)
+
+            emit(VMInstruction.pop('temp', 0))
+            emit(VMInstruction.pop('pointer', 1))
+            emit(VMInstruction.push('temp', 0))
+            emit(VMInstruction.pop('that', 0))
+        else:
+            self.generate_expression(let.value)
+            emit(VMInstruction.pop(variable.segment, variable.index))
+
+    @staticmethod
+    def changes_that(expression):
+        """
+        :param expression: expression
+        :return: whether the code of the expression may change pointer 1: it reads an array entry, or calls a
+        subroutine (including Math.multiply and Math.divide, and String.new for a string constant)
+        """
+        stack = [expression]
+        while stack:
+            expression = stack.pop()
+            if isinstance(expression, (JackAST.ArrayReference, JackAST.Call, JackAST.StringConstant)):
+                return True
+            if isinstance(expression, JackAST.BinaryOperation) and expression.operator in ('*', '/'):
+                return True
+            stack.extend(ASTPasses.children_of(expression))
+        return False
+
+    @staticmethod
+    def is_boolean(expression):
+        """
+        :param expression: expression
+        :return: whether the value of the expression is always true (-1) or false (0): a comparison, a boolean
+        constant, or '~', '&' and '|' of such expressions
+        """
+        stack = [expression]
+        while stack:
+            expression = stack.pop()
+            if isinstance(expression, JackAST.BinaryOperation) and expression.operator in ('<', '>', '='):
+                continue
+            if isinstance(expression, JackAST.BinaryOperation) and expression.operator in ('&', '|'):
+                stack.append(expression.left)
+                stack.append(expression.right)
+            elif isinstance(expression, JackAST.UnaryOperation) and expression.operator == '~':
+                stack.append(expression.operand)
+            elif ASTPasses.constant_value(expression) not in (0, -1):
+                return False
+        return True
+
+    def generate_if(self, if_):
+        emit = self.instructions.append
+        number = self.if_counter
+        self.if_counter += 1
+
+        if self.layout_branches:
+            self.generate_if_with_layout(if_, number)
+            return
+
+        self.generate_expression(if_.condition)
+        emit(VMInstruction.arithmetic('not'))
+        emit(VMInstruction.if_goto(f'ELSE{number}'))
+
+        self.generate_statements(if_.statements)
+
+        emit(VMInstruction.goto(f'END{number}'))
+        emit(VMInstruction.label(f'ELSE{number}'))
+
+        if if_.else_statements is not None:
+            self.generate_statements(if_.else_statements)
+
+        emit(VMInstruction.label(f'END{number}'))
+
+    def generate_if_with_layout(self, if_, number):
+        """
+        an if with an else clause and a boolean condition branches to its then clause when the condition is true, so
+        that the condition needs no 'not'. Any other condition takes the then clause only when it's -1, as in the
+        unoptimized code, and is negated. An if without an else clause branches over its then clause, and has no
+        empty else path
+        """
+        emit = self.instructions.append
+
+        if if_.else_statements is not None and self.is_boolean(if_.condition):
+            self.generate_expression(if_.condition)
+            emit(VMInstruction.if_goto(f'IF_TRUE{number}'))
+            self.generate_statements(if_.else_statements)
+            emit(VMInstruction.goto(f'END{number}'))
+            emit(VMInstruction.label(f'IF_TRUE{number}'))
+            self.generate_statements(if_.statements)
+            emit(VMInstruction.label(f'END{number}'))
+            return
+
+        condition = if_.condition
+        if isinstance(condition, JackAST.UnaryOperation) and condition.operator == '~':
+            # the condition is already negated
+            self.generate_expression(condition.operand)
+        else:
+            self.generate_expression(condition)
+            emit(VMInstruction.arithmetic('not'))
+
+        if if_.else_statements is None:
+            emit(VMInstruction.if_goto(f'END{number}'))
+            self.generate_statements(if_.statements)
+            emit(VMInstruction.label(f'END{number}'))
+            return
+
+        emit(VMInstruction.if_goto(f'ELSE{number}'))
+        self.generate_statements(if_.statements)
+        emit(VMInstruction.goto(f'END{number}'))
+        emit(VMInstruction.label(f'ELSE{number}'))
+        self.generate_statements(if_.else_statements)
+        emit(VMInstruction.label(f'END{number}'))
+
+    def generate_while(self, while_):
+        emit = self.instructions.append
+        number = self.while_counter
+        self.while_counter += 1
+
+        # an optimized endless loop has the condition -1 (true), which needs no test
+        condition = while_.condition
+        endless = isinstance(condition, JackAST.IntegerConstant) and condition.value == -1
+
+        if self.layout_branches and not endless and self.is_boolean(condition):
+            # the loop is rotated: the condition is tested at the bottom, and branches back to the top while it's
+            # true, which takes one jump and no 'not' on each iteration. The if-goto branches on any value other
+            # than 0, while the unoptimized loop only runs on -1, so other conditions keep the loop below
+            emit(VMInstruction.goto(f'WHILE_TEST{number}'))
+            emit(VMInstruction.label(f'WHILE_LOOP{number}'))
+            self.generate_statements(while_.statements)
+            emit(VMInstruction.label(f'WHILE_TEST{number}'))
+            self.generate_expression(condition)
+            emit(VMInstruction.if_goto(f'WHILE_LOOP{number}'))
+            return
+
+        emit(VMInstruction.label(f'WHILE_LOOP{number}'))
+
+        if not endless:
+            self.generate_expression(condition)
+
+            # negate the expression
+            emit(VMInstruction.arithmetic('not'))
+            emit(VMInstruction.if_goto(f'FINISH_WHILE{number}'))
+
+        self.generate_statements(while_.statements)
+
+        emit(VMInstruction.goto(f'WHILE_LOOP{number}'))
+        emit(VMInstruction.label(f'FINISH_WHILE{number}'))
+
+    def generate_do(self, do):
+        self.generate_call(do.call)
+
+        # pop off the return value bc we don't need it
+        self.instructions.append(VMInstruction.pop('temp', 0))
+
+    def generate_return(self, return_):
+        if return_.value is not None:
+            self.generate_expression(return_.value)
+        elif self.pushes_void_value:
+            self.instructions.append(VMInstruction.push('constant', 0))
+        self.instructions.append(VMInstruction.return_())
+
+    def generate_expression(self, expression):
+        """
+        generates the code of an expression with an explicit stack instead of recursion, so that deeply nested
+        expressions don't reach Python's recursion limit. The stack holds the nodes still to generate and the
+        instructions to emit after their operands, in reverse order
+        """
+        emit = self.instructions.append
+        stack = [expression]
+
+        while stack:
+            expression = stack.pop()
+
+            if isinstance(expression, VMInstruction.VMInstruction):
+                emit(expression)
+            elif isinstance(expression, JackAST.BinaryOperation):
+                stack.append(self.binary_operators[expression.operator])
+                stack.append(expression.right)
+                stack.append(expression.left)
+            elif isinstance(expression, JackAST.VariableReference):
+                variable = expression.variable
+                emit(VMInstruction.push(variable.segment, variable.index))
+            elif isinstance(expression, JackAST.IntegerConstant):
+                self.generate_integer(expression.value)
+            elif isinstance(expression, JackAST.Call):
+                n_args = len(expression.arguments)
+                if expression.receiver is not None:
+                    n_args += 1
+                stack.append(VMInstruction.call(expression.name, n_args))
+                stack.extend(reversed(expression.arguments))
+                if expression.receiver is not None:
+                    # the object that the method is called on is passed as the first argument
+                    stack.append(expression.receiver)
+            elif isinstance(expression, JackAST.ArrayReference):
+                variable = expression.variable
+                stack.append(VMInstruction.push('that', 0))
+                stack.append(VMInstruction.pop('pointer', 1))
+                # arr + index
+                stack.append(VMInstruction.arithmetic('add'))
+                stack.append(VMInstruction.push(variable.segment, variable.index))
+                stack.append(expression.index)
+            elif isinstance(expression, JackAST.UnaryOperation):
+                stack.append(self.unary_operators[expression.operator])
+                stack.append(expression.operand)
+            elif isinstance(expression, JackAST.SavedValue):
+                stack.append(VMInstruction.push('temp', expression.slot))
+                stack.append(VMInstruction.pop('temp', expression.slot))
+                stack.append(expression.expression)
+            elif isinstance(expression, JackAST.SavedValueReference):
+                emit(VMInstruction.push('temp', expression.slot))
+            elif isinstance(expression, JackAST.StringConstant):
+                if self.string_pool is None:
+                    self.generate_string(expression.value)
+                elif self.string_pool.routines:
+                    emit(VMInstruction.call(self.string_pool.routine_of(expression.value), 0))
+                else:
+                    self.generate_pooled_string(expression.value, f'STRING{self.string_counter}')
+                    self.string_counter += 1
+            else:  # keywordConstant
+                keyword = expression.keyword
+                if keyword == 'this':
+                    emit(VMInstruction.push('pointer', 0))
+                elif keyword == 'true':
+                    emit(VMInstruction.push('constant', 1))
+                    emit(VMInstruction.arithmetic('neg'))
+                else:  # false/null
+                    emit(VMInstruction.push('constant', 0))
+
+    def generate_string(self, value):
+        emit = self.instructions.append
+        emit(VMInstruction.push('constant', len(value)))
+        emit(VMInstruction.call('String.new', 1))
+        for letter in value:
+            emit(VMInstruction.push('constant', ord(letter)))
+            emit(VMInstruction.call('String.appendChar', 2))
+
+    def generate_pooled_string(self, value, label):
+        """
+        pushes the string of a pooled string constant, and builds it first if it isn't built yet
+        """
+        emit = self.instructions.append
+        static = self.string_pool.static_of(value)
+
+        emit(VMInstruction.push('static', static))
+        emit(VMInstruction.if_goto(label))
+        self.generate_string(value)
+        emit(VMInstruction.pop('static', static))
+        emit(VMInstruction.label(label))
+        emit(VMInstruction.push('static', static))
+
+    def generate_string_routines(self):
+        """
+        returns the functions that return the strings of the constants of the string pool, when it has routines
+        :return: list of VMInstruction
+        """
+        self.instructions = []
+        for value in self.string_pool.statics:
+            self.instructions.append(VMInstruction.function(self.string_pool.routine_of(value), 0))
+            self.generate_pooled_string(value, 'STRING')
+            self.instructions.append(VMInstruction.return_())
+        return self.instructions
+
+    def generate_integer(self, value):
+        """
+        pushes an integer between -32768 and 32767. 'push constant' only takes values that aren't negative, so a
+        negative value is pushed as its negation or its complement
+        """
+        emit = self.instructions.append
+        if value >= 0:
+            emit(VMInstruction.push('constant', value))
+        elif value == -32768:
+            # 32768 isn't a constant
+            emit(VMInstruction.push('constant', 32767))
+            emit(VMInstruction.arithmetic('not'))
+        else:
+            emit(VMInstruction.push('constant', -value))
+            emit(VMInstruction.arithmetic('neg'))
+
+    def generate_call(self, call):
+        self.generate_expression(call)
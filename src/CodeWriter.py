@@ -1,18 +1,27 @@
+import OutputBuffer
+
 # reads in and translates vm commands into assembly commands and writes them to the output file
 
 
 class CodeWriter:
 
-    # constructor - opens output file and gives attributes values
-    def __init__(self, path):
+    # constructor - prepares the output file and gives attributes values. The code is collected in a buffer and written
+    # to 'path' all at once when the code writer is closed
+    # 'output_file' is an already open stream (or buffer) to write to instead of 'path', and 'label_prefix' is put
+    # before every label that the code writer makes up itself, so that code that is written separately (e.g. a file
+    # at a time) can be put together without the labels clashing
+    def __init__(self, path, output_file=None, label_prefix=''):
 
-        file = path.open('w')
+        if output_file is None:
+            output_file = OutputBuffer.OutputBuffer(path)
 
-        self.output_file_name = path.stem
-        self.output_file_path = file
+        self.output_file_name = path.stem if path is not None else ''
+        self.output_file_path = output_file
         self.label_counter = 0
         self.current_input_file_name = ''
         self.function_call_number = 0
+        self.label_prefix = label_prefix
+        self.current_function = ''  # the function whose code is being written, which its labels are scoped to
 
     # informs codeWriter that translation of new vm file is started
     def set_file_name(self, file_name):
@@ -53,21 +62,29 @@ class CodeWriter:
         asm_command = self.translate_init(self)
         self.output_file_path.write(asm_command)
 
+    # returns the assembly label of a VM label. VM labels are scoped to the function that they're in, so the label is
+    # functionName$label (or the label with the label prefix, outside of any function). Every label, goto and if-goto
+    # of a function must translate the same label the same way, wherever they are in the function
+    def scoped_label(self, label):
+        if self.current_function:
+            return f'{self.current_function}${label}'
+        return f'{self.label_prefix}{label}'
+
     # writes the assembly code that effects the label command
     def write_label(self, label):
-        asm_command = f'({label}{self.label_counter})\n'
+        asm_command = f'({self.scoped_label(label)})\n'
         self.output_file_path.write(asm_command)
 
     # writes the assembly code that effects the goto command
     def write_goto(self, label):
-        asm_command = f'@{label}{self.label_counter}\n' \
+        asm_command = f'@{self.scoped_label(label)}\n' \
                       '0;JMP\n'
         self.output_file_path.write(asm_command)
 
     # writes the assembly code that effects the if-goto command
     def write_if(self, label):
         asm_command = self.pop_to_d()
-        asm_command += f'@{label}{self.label_counter}\n' \
+        asm_command += f'@{self.scoped_label(label)}\n' \
                        'D;JNE\n'
         self.output_file_path.write(asm_command)
 
@@ -149,6 +166,7 @@ class CodeWriter:
     def write_function(self, function_name, num_locals):
 
         asm_command = '//write_function\n'
+        self.current_function = function_name
 
         # (function_name)
         asm_command += f'({function_name})\n'
@@ -203,16 +221,17 @@ class CodeWriter:
 
         asm_code += self.translate_binary_command('sub')
         asm_code += self.pop_to_d()
-        asm_code += f'@TRUE{self.label_counter}\n' \
+        label_number = f'{self.label_prefix}{self.label_counter}'
+        asm_code += f'@TRUE{label_number}\n' \
                     'D;' + dictionary[vm_op] + '\n' \
                                                '@0\n' \
                                                'D=A\n' \
-                                               f'@PUSH_RESULT{self.label_counter}\n' \
+                                               f'@PUSH_RESULT{label_number}\n' \
                                                '0;JMP\n' \
-                                               f'(TRUE{self.label_counter})\n' \
+                                               f'(TRUE{label_number})\n' \
                                                '@1\n' \
                                                'D=A\n' \
-                                               f'(PUSH_RESULT{self.label_counter})\n'
+                                               f'(PUSH_RESULT{label_number})\n'
         asm_code += self.push_d_to_stack()
         asm_code += self.translate_unary_command('neg')
 
@@ -368,7 +387,7 @@ class CodeWriter:
 
     def translate_call(self, function_name, num_args):
         # push return address
-        return_address = f'FUNCTION{self.function_call_number}'
+        return_address = f'{self.label_prefix}FUNCTION{self.function_call_number}'
         asm_command = f'@{return_address}\n' \
                       'D=A\n'
         asm_command += self.push_d_to_stack()
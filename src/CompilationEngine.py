@@ -1,26 +1,105 @@
+import hashlib
 import symbolTable
 import VMWriter
+import JackAST
+import CodeGenerator
+import ClassInterface
+import OutputBuffer
+import PassManager
+import StringPool
+import ProgramIndex
 
 
 class CompilationEngine:
     """
-    recursive top-down compilation engine. Reads its input from a jackTokenizer and writes its output into a vm writer.
-    If xxx is a part of an expression and thus has a value, the emitted code should compute this value and leave it at
+    recursive top-down compilation engine. Reads its input from a jackTokenizer and builds a syntax tree (JackAST) of
+    each subroutine, which the code generator lowers to VM instructions, and which are then written into a vm writer.
+    If xxx is a part of an expression and thus has a value, the generated code computes this value and leaves it at
     the top of the VM stack
     """
 
-    def __init__(self, tokenizer_, path_):
+    # the dispatch tables of the engine are keyed on the (type, value) pair of the current token, which is fetched
+    # once per decision. Tokens whose value doesn't matter are under (type, None)
+
+    # the binary operators of Jack, which all have the same precedence
+    binary_operators = frozenset(('symbol', op) for op in ['+', '-', '*', '/', '&', '|', '<', '>', '='])
+
+    # 'int'|'char'|'boolean', the types that aren't class names
+    primitive_types = frozenset([('keyword', 'int'), ('keyword', 'char'), ('keyword', 'boolean')])
+
+    class_var_kinds = frozenset([('keyword', 'static'), ('keyword', 'field')])
+
+    subroutine_kinds = frozenset([('keyword', 'constructor'), ('keyword', 'function'), ('keyword', 'method')])
+
+    # the name of the method that compiles each statement, by its first token
+    statement_methods = {
+        ('keyword', 'let'): 'compile_let',
+        ('keyword', 'if'): 'compile_if',
+        ('keyword', 'while'): 'compile_while',
+        ('keyword', 'do'): 'compile_do',
+        ('keyword', 'return'): 'compile_return'
+    }
+
+    # the name of the method that compiles the start of each term, by its first token
+    term_methods = {
+        ('symbol', '-'): 'compile_unary_operation',
+        ('symbol', '~'): 'compile_unary_operation',
+        ('symbol', '('): 'compile_parenthesized_expression',
+        ('integerConstant', None): 'compile_integer_constant',
+        ('stringConstant', None): 'compile_string_constant',
+        ('keyword', 'true'): 'compile_keyword_constant',
+        ('keyword', 'false'): 'compile_keyword_constant',
+        ('keyword', 'null'): 'compile_keyword_constant',
+        ('keyword', 'this'): 'compile_keyword_constant',
+        ('identifier', None): 'compile_identifier_term'
+    }
+
+    def __init__(self, tokenizer_, path_, subroutine_cache=None, pass_manager=None, whole_program=False):
         """
         returns a new compilation engine with the given input and output. Next routine called must be compile_class()
         :param tokenizer_: tokenizer with a list of all the tokens needed to compile a file
         :param path_: the path to the output file that should be written to
+        :param subroutine_cache: optional BuildCache.SubroutineCache, for reusing the code of unchanged subroutines.
+        needs a tokenizer that holds all of the tokens (not a streaming one)
+        :param pass_manager: optional PassManager.PassManager with the optimization passes to run on each subroutine.
+        by default no passes run
+        :param whole_program: whether the class is compiled as part of a whole program, whose calls are checked
+        against the other classes once they are all compiled. The call sites of the class are collected in
+        'call_sites' for that. The pass 'elide-void-returns' only runs in this mode
         """
         self.tokenizer = tokenizer_
         self.symbol_table = symbolTable.SymbolTable()
         self.vm_writer = VMWriter.VMWriter(path_)
+        self.code_generator = CodeGenerator.CodeGenerator()
+        self.pass_manager = pass_manager
+        if self.pass_manager is None:
+            self.pass_manager = PassManager.PassManager()
+        self.code_generator.elide_void_returns = whole_program and \
+            self.pass_manager.is_enabled('elide-void-returns')
+        self.code_generator.layout_branches = self.pass_manager.is_enabled('layout-branches')
+        self.code_generator.direct_array_stores = self.pass_manager.is_enabled('direct-array-stores')
         self.class_name = ""
+        self.class_node = None
+
+        # by-products of the compilation: the interface of the compiled class, and the names of the classes whose
+        # subroutines it calls
+        self.class_interface = ClassInterface.ClassInterface()
+        self.used_classes = set()
+        self.call_sites = [] if whole_program else None  # see ProgramIndex.call_sites()
+
+        self.subroutine_cache = subroutine_cache
+        self.class_state_fingerprint = None
+
+        # the dispatch tables, with the methods bound to this engine
+        self.statement_compilers = {token: getattr(self, method) for token, method in self.statement_methods.items()}
+        self.term_compilers = {token: getattr(self, method) for token, method in self.term_methods.items()}
+        self.subroutine_signature = ()  # (name, kind, arity, return type) of the last compiled subroutine
 
     def compile_class(self):
+        """
+        compiles a complete class. The code of each subroutine is written as soon as the subroutine is compiled
+        :return: the JackAST.Class of the class
+        """
 
         self.advance_tokenizer(Exception('file empty'))
 
@@ -30,6 +109,7 @@ class CompilationEngine:
         self.advance_tokenizer(ValueError('According to the syntax of the Jack language, \'className\' is expected'))
 
         self.class_name = self.tokenizer.identifier()
+        self.class_interface.class_name = self.class_name
 
         # className
         self.compile_identifier()
@@ -38,13 +118,33 @@ class CompilationEngine:
         self.compile_symbol('{')
 
         # classVarDec
-        while self.tokenizer.keyword() == 'static' or self.tokenizer.keyword() == 'field':
+        while self.tokenizer.current_token[:2] in self.class_var_kinds:
             self.compile_class_var_dec()
 
+        self.class_node = JackAST.Class(self.class_name, self.symbol_table.static_counter,
+                                        self.symbol_table.field_counter)
+
+        # string constants are pooled into static variables after the ones that the class declares
+        if self.pass_manager.is_enabled('pool-strings') or self.pass_manager.is_enabled('string-routines'):
+            self.code_generator.string_pool = StringPool.StringPool(self.class_name, self.symbol_table.static_counter,
+                                                                    self.pass_manager.is_enabled('string-routines'))
+
         # 'subroutineDec'
-        while self.tokenizer.keyword() == 'constructor' or self.tokenizer.keyword() == 'function' or \
-                self.tokenizer.keyword() == 'method':
-            self.compile_subroutine()
+        while self.tokenizer.current_token[:2] in self.subroutine_kinds:
+            # the static variables of pooled strings are numbered across the class, so the code of a subroutine
+            # depends on the subroutines before it, and can't be cached on its own. Neither can a subroutine whose
+            # calls are checked against the other classes of the program
+            if self.subroutine_cache is None or self.code_generator.string_pool is not None or \
+                    self.call_sites is not None:
+                self.compile_subroutine()
+            else:
+                self.compile_subroutine_with_cache()
+
+        string_pool = self.code_generator.string_pool
+        if string_pool is not None:
+            if string_pool.routines:
+                self.vm_writer.write_instructions(self.code_generator.generate_string_routines())
+            self.class_node.static_count += len(string_pool)
 
         # '}'
         # not calling compile_symbol('}') bc it advances the tokenizer at the end of the method & we don't want it now
@@ -54,6 +154,9 @@ class CompilationEngine:
         if self.tokenizer.has_more_tokens():
             raise Exception('According to the syntax of Jack language, there should be no code after class definition')
 
+        self.class_interface.field_count = self.symbol_table.field_counter
+        return self.class_node
+
     def compile_class_var_dec(self):
         """
         compiles a static declaration or a field declaration
@@ -62,7 +165,7 @@ class CompilationEngine:
         kind = self.tokenizer.keyword()
 
         # ('static'|'field')
-        if not (self.tokenizer.keyword() == 'static' or self.tokenizer.keyword() == 'field'):
+        if self.tokenizer.current_token[:2] not in self.class_var_kinds:
             raise ValueError('According to the syntax of the Jack language, \'static\' or \'field\' is expected ')
         self.advance_tokenizer(ValueError('According to the syntax of the Jack language, \'type\' is expected'))
 
@@ -89,17 +192,17 @@ class CompilationEngine:
 
     def compile_subroutine(self):
         """
-        compiles a complete method, function, or constructor
-        :return:
+        compiles a complete method, function, or constructor, and writes its code
+        :return: the JackAST.Subroutine of the subroutine
         """
 
         function_type = self.tokenizer.keyword()
         # 'constructor'|'function'|'method'
-        if self.tokenizer.keyword() != 'constructor' and self.tokenizer.keyword() != 'function' and \
-                self.tokenizer.keyword() != 'method':
+        if self.tokenizer.current_token[:2] not in self.subroutine_kinds:
             raise ValueError('\'constructor\', \'function\', or \'method\' is expected ')
         self.advance_tokenizer(ValueError('\'void\' or \'type\' is expected'))
 
+        return_type = self.tokenizer.keyword()
         # 'void'|type
         if self.tokenizer.keyword() == 'void':
             self.advance_tokenizer(ValueError('\'subroutineName\' is expected'))
@@ -126,10 +229,70 @@ class CompilationEngine:
         # ')'
         self.compile_symbol(')')
 
+        arity = self.symbol_table.arg_counter
+        if function_type == 'method':
+            arity -= 1  # 'this' isn't a declared parameter
+        self.class_interface.add_subroutine(name, function_type, arity, return_type)
+        self.subroutine_signature = (name, function_type, arity, return_type)
+
         # subroutineBody
-        self.compile_subroutine_body(subroutine_name, function_type)
+        statements = self.compile_subroutine_body()
+
+        subroutine = JackAST.Subroutine(subroutine_name, function_type, return_type, arity,
+                                        self.symbol_table.var_counter, self.symbol_table.field_counter, statements)
+        if self.call_sites is not None:
+            self.call_sites += ProgramIndex.call_sites(subroutine)
+        self.vm_writer.write_instructions(self.pass_manager.optimize(subroutine, self.code_generator))
+        return subroutine
+
+    def compile_subroutine_with_cache(self):
+        """
+        compiles a complete method, function, or constructor, reusing its code from the subroutine cache if neither it
+        nor the class level state that it depends on changed since it was cached
+        :return:
+        """
+        start = self.tokenizer.number_current_token - 1  # the current token
+        end = self.tokenizer.find_block_end(start)
+        if end is None or end == self.tokenizer.number_of_tokens:
+            # not a well formed subroutine, which compile_subroutine() will report
+            self.compile_subroutine()
+            return
+
+        # the code of a subroutine depends on the class name and the layout of the class variables as well, which are
+        # all known by the time the first subroutine is compiled
+        if self.class_state_fingerprint is None:
+            class_state = (self.class_name, sorted(self.symbol_table.class_table.items()),
+                           self.symbol_table.static_counter, self.symbol_table.field_counter)
+            self.class_state_fingerprint = hashlib.sha256(repr(class_state).encode()).hexdigest()
+        fingerprint = self.class_state_fingerprint + self.tokenizer.tokens.fingerprint(start, end)
+
+        entry = self.subroutine_cache.lookup(fingerprint)
+        if entry is not None:
+            self.vm_writer.output_file.write(entry['vm'])
+            self.class_interface.add_subroutine(*entry['signature'])
+            self.used_classes.update(entry['used_classes'])
+            self.tokenizer.skip_to(end)
+            return
+
+        # compile the subroutine into a buffer, so that its code can be cached
+        output_file = self.vm_writer.output_file
+        used_classes = self.used_classes
+        self.vm_writer.output_file = OutputBuffer.OutputBuffer()
+        self.used_classes = set()
+
+        self.compile_subroutine()
+
+        vm_code = self.vm_writer.output_file.getvalue()
+        self.subroutine_cache.record(fingerprint, vm_code, self.subroutine_signature, self.used_classes)
+        self.vm_writer.output_file = output_file
+        self.used_classes = used_classes | self.used_classes
+        output_file.write(vm_code)
 
-    def compile_subroutine_body(self, subroutine_name, function_type):
+    def compile_subroutine_body(self):
+        """
+        compiles the body of a subroutine
+        :return: list of the statements of the subroutine
+        """
 
         # '{'
         self.compile_symbol('{')
@@ -138,22 +301,14 @@ class CompilationEngine:
         while self.tokenizer.keyword() == 'var':
             self.compile_var_dec()
 
-        self.vm_writer.write_function(subroutine_name, self.symbol_table.var_counter)
-        if function_type == 'method':
-            # push self and pop it to pointer 0 - this.
-            self.vm_writer.write_push('argument', 0)
-            self.vm_writer.write_pop('pointer', 0)
-        elif function_type == 'constructor':
-            self.vm_writer.write_push('constant', self.symbol_table.field_counter)
-            self.vm_writer.write_call('Memory.alloc', 1)
-            self.vm_writer.write_pop('pointer', 0)
-
         # statements
-        self.compile_statements(subroutine_name)
+        statements = self.compile_statements()
 
         # '}'
         self.compile_symbol('}')
 
+        return statements
+
     def compile_parameter_list(self):
         """
         compiles a (possibly empty) parameter list, not including the enclosing "()"
@@ -214,7 +369,7 @@ class CompilationEngine:
     def compile_identifier(self):
         if self.tokenizer.token_type() != 'identifier':
             raise ValueError('According to the syntax of the Jack language, \'identifier\' is expected')
-        self.advance_tokenizer(ValueError('\'another tokens\' is expected'))
+        self.next_token()
 
     def compile_symbol(self, symbol):
         """
@@ -222,47 +377,37 @@ class CompilationEngine:
         :param symbol:
         :return:
         """
-        if self.tokenizer.symbol() != symbol:
+        if self.tokenizer.current_token[1] != symbol:
             raise ValueError(f'According to the syntax of the Jack language, \'{symbol}\' is expected')
-        self.advance_tokenizer(ValueError('\'another tokens\' is expected'))
+        self.next_token()
 
     def compile_type(self):
         """
         type: 'int'|'char'|'boolean'|className
         :return:
         """
-        if not (self.tokenizer.token_type() == 'identifier' or self.tokenizer.keyword() == 'int' or \
-                self.tokenizer.keyword() == 'char' or self.tokenizer.keyword() == 'boolean'):
+        token = self.tokenizer.current_token
+        if token[0] != 'identifier' and token[:2] not in self.primitive_types:
             raise ValueError('\'int\', \'char\', \'boolean\' or \'className\' is expected ')
-        self.advance_tokenizer(ValueError('\'another tokens\' is expected'))
+        self.next_token()
 
-    def compile_statements(self, subroutine_name):
+    def compile_statements(self):
         """
         compiles a sequence of statements, not including the "{}"
-        :return:
+        :return: list of statements
         """
-        if self.tokenizer.keyword() != 'let' and self.tokenizer.keyword() != 'do' and \
-                self.tokenizer.keyword() != 'while' and self.tokenizer.keyword() != 'if' and \
-                self.tokenizer.keyword() != 'return':
-            return
-        while self.tokenizer.keyword() == 'let' or self.tokenizer.keyword() == 'do' or \
-                self.tokenizer.keyword() == 'while' or self.tokenizer.keyword() == 'if' or \
-                self.tokenizer.keyword() == 'return':
-            if self.tokenizer.keyword() == 'let':
-                self.compile_let()
-            elif self.tokenizer.keyword() == 'if':
-                self.compile_if(subroutine_name)
-            elif self.tokenizer.keyword() == 'while':
-                self.compile_while(subroutine_name)
-            elif self.tokenizer.keyword() == 'do':
-                self.compile_do()
-            elif self.tokenizer.keyword() == 'return':
-                self.compile_return()
+        statements = []
+        statement_compilers = self.statement_compilers
+        while True:
+            compiler = statement_compilers.get(self.tokenizer.current_token[:2])
+            if compiler is None:
+                return statements
+            statements.append(compiler())
 
     def compile_do(self):
         """
         compiles a do statement
-        :return:
+        :return: JackAST.Do
         """
         # do
         if self.tokenizer.keyword() != 'do':
@@ -270,18 +415,17 @@ class CompilationEngine:
         self.advance_tokenizer(ValueError('\'subroutineCall\' is expected'))
 
         # subroutineCall
-        self.compile_subroutine_call()
-
-        # pop off the return value bc we don't need it
-        self.vm_writer.write_pop('temp', 0)
+        call = self.compile_subroutine_call()
 
         # ;
         self.compile_symbol(';')
 
+        return JackAST.Do(call)
+
     def compile_let(self):
         """
         compiles a let statement
-        :return:
+        :return: JackAST.Let
         """
         # let
         if self.tokenizer.keyword() != 'let':
@@ -293,66 +437,35 @@ class CompilationEngine:
         self.compile_identifier()
 
         # ('[' expression ']' ) ?
+        index = None
         if self.tokenizer.symbol() == '[':
 
             # '['
             self.compile_symbol('[')
 
             # expression
-            self.compile_expression()
+            index = self.compile_expression()
 
             # ']'
             self.compile_symbol(']')
 
-            # push address of array onto the stack
-            if self.symbol_table.kind_of(name) == 'var':
-                self.vm_writer.write_push('local', self.symbol_table.index_of(name))
-            elif self.symbol_table.kind_of(name) == 'arg':
-                self.vm_writer.write_push('argument', self.symbol_table.index_of(name))
-            elif self.symbol_table.kind_of(name) == 'static':
-                self.vm_writer.write_push('static', self.symbol_table.index_of(name))
-            else:  # field
-                self.vm_writer.write_push('this', self.symbol_table.index_of(name))
-
-            #  arr + index
-            self.vm_writer.write_arithmetic('add')
-
-            # '='
-            self.compile_symbol('=')
-
-            # expression
-            self.compile_expression()
-
-            self.vm_writer.write_pop("temp", 0)
-            self.vm_writer.write_pop("pointer", 1)
-            self.vm_writer.write_push("temp", 0)
-            self.vm_writer.write_pop("that", 0)
-        else:
+        variable = self.symbol_table.resolve(name)
 
-            # get value to put into variable
+        # '='
+        self.compile_symbol('=')
 
-            # '='
-            self.compile_symbol('=')
+        # expression
+        value = self.compile_expression()
 
-            # expression
-            self.compile_expression()
-
-            # put value into variable
-            if self.symbol_table.kind_of(name) == 'var':
-                self.vm_writer.write_pop('local', self.symbol_table.index_of(name))
-            elif self.symbol_table.kind_of(name) == 'arg':
-                self.vm_writer.write_pop('argument', self.symbol_table.index_of(name))
-            elif self.symbol_table.kind_of(name) == 'static':
-                self.vm_writer.write_pop('static', self.symbol_table.index_of(name))
-            else:  # field
-                self.vm_writer.write_pop('this', self.symbol_table.index_of(name))
         # ';'
         self.compile_symbol(';')
 
-    def compile_while(self, subroutine_name):
+        return JackAST.Let(variable, index, value)
+
+    def compile_while(self):
         """
         compiles a while statement
-        :return:
+        :return: JackAST.While
         """
         # while
         if self.tokenizer.keyword() != 'while':
@@ -362,16 +475,8 @@ class CompilationEngine:
         # '('
         self.compile_symbol('(')
 
-        self.vm_writer.write_label(f'WHILE_LOOP{self.symbol_table.while_counter}')
-        temp = self.symbol_table.while_counter
-        self.symbol_table.while_counter += 1
-
         # expression
-        self.compile_expression()
-
-        # negate the expression
-        self.vm_writer.write_arithmetic("not")
-        self.vm_writer.write_if(f'FINISH_WHILE{temp}')
+        condition = self.compile_expression()
 
         # ')'
         self.compile_symbol(')')
@@ -380,19 +485,17 @@ class CompilationEngine:
         self.compile_symbol('{')
 
         # statements
-        self.compile_statements(subroutine_name)
-
-        self.vm_writer.write_goto(f'WHILE_LOOP{temp}')
+        statements = self.compile_statements()
 
         # '}'
         self.compile_symbol('}')
 
-        self.vm_writer.write_label(f'FINISH_WHILE{temp}')
+        return JackAST.While(condition, statements)
 
     def compile_return(self):
         """
         compiles a return statement
-        :return:
+        :return: JackAST.Return
         """
 
         # return
@@ -401,56 +504,45 @@ class CompilationEngine:
         self.advance_tokenizer(ValueError('\';\' is expected'))
 
         # expression?
+        value = None
         if self.tokenizer.symbol() != ';':
-            self.compile_expression()
-        else:
-            self.vm_writer.write_push('constant', 0)
-
-        self.vm_writer.write_return()
+            value = self.compile_expression()
 
         # ;
         self.compile_symbol(';')
 
-    def compile_if(self, subroutine_name):
+        return JackAST.Return(value)
+
+    def compile_if(self):
         """
         compiles an if statement, possibly with a trailing else clause
-        :return:
+        :return: JackAST.If
         """
-        temp = self.symbol_table.if_counter
         # if
         if self.tokenizer.keyword() != 'if':
             raise ValueError('\'if\' keyword is expected ')
         self.advance_tokenizer(ValueError('\'(\' is expected'))
 
-        self.symbol_table.if_counter += 1
-
         # '('
         self.compile_symbol('(')
 
         # expression
-        self.compile_expression()
+        condition = self.compile_expression()
 
         # ')'
         self.compile_symbol(')')
 
-        self.vm_writer.write_arithmetic("not")
-
-        self.vm_writer.write_if(f'ELSE{temp}')
-
         # '{'
         self.compile_symbol('{')
 
         # statements
-        self.compile_statements(subroutine_name)
+        statements = self.compile_statements()
 
         # '}'
         self.compile_symbol('}')
 
-        # GOTO END
-        self.vm_writer.write_goto(f'END{temp}')
-        self.vm_writer.write_label(f'ELSE{temp}')
-
         # ('else' '{' statements '}')?
+        else_statements = None
         if self.tokenizer.token_type() == 'keyword' and self.tokenizer.keyword() == 'else':
 
             # else
@@ -460,144 +552,169 @@ class CompilationEngine:
             self.compile_symbol('{')
 
             # statements
-            self.compile_statements(subroutine_name)
+            else_statements = self.compile_statements()
 
             # '}'
             self.compile_symbol('}')
 
-        self.vm_writer.write_label(f'END{temp}')
+        return JackAST.If(condition, statements, else_statements)
 
     def compile_expression(self):
         """
-        compiles an expression
-        :return:
-        """
-        # term
-        self.compile_term()
-
-        while self.tokenizer.token_type() == 'symbol' \
-                and self.tokenizer.symbol() in ['+', '-', '*', '/', '&', '|', '<', '>', '=']:
-
-            op = self.tokenizer.symbol()
+        compiles an expression. The expression is parsed with an explicit stack instead of recursion, so that deeply
+        nested expressions (parentheses, unary operators, array indices and call arguments) don't reach Python's
+        recursion limit. Each entry of the stack is a list whose first item is the kind of construct that waits for
+        a term or an expression:
+        ['expression', left operand or None, operator]: waits for the next term of an expression
+        ['unary', operator]: waits for the term of a unary operation
+        ['parentheses']: waits for the expression inside parentheses
+        ['index', variable]: waits for the index expression of an array entry
+        ['arguments', name, receiver, arguments]: waits for the next argument of a call
+        Jack has no precedence, so each term is combined with the expression before it as soon as it's parsed, which
+        makes 'a + b * c' BinaryOperation('*', BinaryOperation('+', a, b), c)
+        :return: the node of the expression
+        """
+        term_compilers = self.term_compilers
+        binary_operators = self.binary_operators
+        stack = [['expression', None, None]]
+        while True:
+            # parse a term, up to the first construct that contains an expression or a term of its own. The term is
+            # compiled by the method in 'term_compilers' of its first token
+            token = self.tokenizer.current_token
+            compiler = term_compilers.get(token[:2]) or term_compilers.get((token[0], None))
+            if compiler is None:
+                raise ValueError('integerConstant, stringConstant, keywordConstant, varName, subroutineCall, \'(\' or '
+                                 'unaryOp is expected')
+            term = compiler(stack)
+            if term is None:
+                continue
+
+            # give the complete term (and the expressions and terms that it completes) to the constructs that wait
+            while True:
+                frame = stack[-1]
+                if frame[0] == 'unary':
+                    stack.pop()
+                    term = JackAST.UnaryOperation(frame[1], term)
+                    continue
+
+                # frame[0] == 'expression'
+                if frame[1] is None:
+                    frame[1] = term
+                else:
+                    frame[1] = JackAST.BinaryOperation(frame[2], frame[1], term)
+
+                # (op term)*
+                token = self.tokenizer.current_token
+                if token[:2] in binary_operators:
+                    frame[2] = token[1]
+                    self.next_token()
+                    break
+
+                # the expression is complete
+                stack.pop()
+                expression = frame[1]
+                if not stack:
+                    return expression
+
+                frame = stack[-1]
+                if frame[0] == 'parentheses':
+                    stack.pop()
+                    self.compile_symbol(')')
+                    term = expression
+                elif frame[0] == 'index':
+                    stack.pop()
+                    self.compile_symbol(']')
+                    term = JackAST.ArrayReference(frame[1], expression)
+                else:  # arguments
+                    frame[3].append(expression)
+                    if self.tokenizer.current_token[1] != ')':
+                        # ','
+                        self.compile_symbol(',')
+                        stack.append(['expression', None, None])
+                        break
+                    stack.pop()
+                    self.compile_symbol(')')
+                    term = JackAST.Call(frame[1], frame[2], frame[3])
+
+    # the methods that compile the start of each kind of term of compile_expression(). A term that contains an
+    # expression or a term of its own is only compiled up to it, and its construct is pushed on the stack of
+    # compile_expression() to be completed when it is parsed. Each returns the node of the term, or None if the term
+    # isn't complete yet
+
+    def compile_unary_operation(self, stack):
+        # unaryOp term
+        stack.append(['unary', self.tokenizer.current_token[1]])
+        self.next_token()
 
-            self.compile_symbol(self.tokenizer.symbol())
+    def compile_parenthesized_expression(self, stack):
+        # '('expression')'
+        self.next_token()
+        stack.append(['parentheses'])
+        stack.append(['expression', None, None])
 
-            self.compile_term()
+    def compile_integer_constant(self, stack):
+        num = self.tokenizer.int_val()
+        self.next_token()
+        return JackAST.IntegerConstant(num)
 
-            self.vm_writer.write_arithmetic(op)
+    def compile_string_constant(self, stack):
+        str_ = self.tokenizer.current_token[1]
+        self.next_token()
+        return JackAST.StringConstant(str_)
 
-            # (op term)*
+    def compile_keyword_constant(self, stack):
+        keyword = self.tokenizer.current_token[1]
+        self.next_token()
+        return JackAST.KeywordConstant(keyword)
 
-    def compile_term(self):
+    def compile_identifier_term(self, stack):
         """
-        compiles a term. A single look-ahead token is used to distinguish between a variable, an array entry,
-        and a subroutine call.
-        :return:
+        compiles a variable, an array entry or a subroutine call, which a single look-ahead token tells apart
         """
+        next_symbol = None
+        if self.tokenizer.next_token_type() == 'symbol':
+            next_symbol = self.tokenizer.next_symbol()
 
-        # integerConstant | stringConstant | keywordConstant | varName |
-        # varName'['expression']' | subroutineCall |'('expression')' | unaryOp term
-
-        # unaryOp term
-        if self.tokenizer.token_type() == 'symbol' and (
-                self.tokenizer.symbol() == '-' or self.tokenizer.symbol() == '~'):
-            dict_ = {'-': 'neg', '~': 'not'}
-            op = self.tokenizer.symbol()
-            self.compile_symbol(self.tokenizer.symbol())
-            self.compile_term()
-            self.vm_writer.write_arithmetic(dict_[op])
-        # '('expression')'
-        elif self.tokenizer.token_type() == 'symbol' and self.tokenizer.symbol() == '(':
-            self.compile_symbol('(')
-            self.compile_expression()
-            self.compile_symbol(')')
-        # integerConstant
-        elif self.tokenizer.token_type() == 'integerConstant':
-            num = self.tokenizer.int_val()
-            self.advance_tokenizer(ValueError('\'another tokens\' is expected'))
-            self.vm_writer.write_push('constant', num)
-        # stringConstant
-        elif self.tokenizer.token_type() == 'stringConstant':
-            str_ = self.tokenizer.string_val()
-            self.advance_tokenizer(ValueError('\'another tokens\' is expected'))
-            self.vm_writer.write_push('constant', len(str_))
-            self.vm_writer.write_call("String.new", 1)
-            for letter in str_:
-                self.vm_writer.write_push('constant', ord(letter))
-                self.vm_writer.write_call("String.appendChar", 2)
-        # keywordConstant
-        elif self.tokenizer.token_type() == 'keyword':
-            keyword = self.tokenizer.keyword()
-            self.advance_tokenizer(ValueError('\'another tokens\' is expected'))
-            if keyword == "this":
-                self.vm_writer.write_push('pointer', 0)
-            elif keyword == "true":
-                self.vm_writer.write_push('constant', 1)
-                self.vm_writer.write_arithmetic('neg')
-            else:  # false/null
-                self.vm_writer.write_push('constant', 0)
         # subroutineCall
-        elif self.tokenizer.token_type() == 'identifier' and self.tokenizer.next_token_type() == 'symbol' \
-                and (self.tokenizer.next_symbol() == '(' or self.tokenizer.next_symbol() == '.'):
-            self.compile_subroutine_call()
-        # varName
-        elif self.tokenizer.token_type() == 'identifier':
-            name = self.tokenizer.identifier()
-
-            # varName'['expression']'
-            if self.tokenizer.next_token_type() == 'symbol' and self.tokenizer.next_symbol() == '[':
-                self.tokenizer.advance()
-                # '['
-                self.compile_symbol('[')
-
-                # expression
-                self.compile_expression()
-
-                # ']'
-                self.compile_symbol(']')
-
-                if self.symbol_table.kind_of(name) == 'var':
-                    self.vm_writer.write_push('local', self.symbol_table.index_of(name))
-                elif self.symbol_table.kind_of(name) == 'arg':
-                    self.vm_writer.write_push('argument', self.symbol_table.index_of(name))
-                elif self.symbol_table.kind_of(name) == 'static':
-                    self.vm_writer.write_push('static', self.symbol_table.index_of(name))
-                else:
-                    self.vm_writer.write_push('this', self.symbol_table.index_of(name))
-
-                # arr + index
-                self.vm_writer.write_arithmetic('add')
-
-                self.vm_writer.write_pop('pointer', 1)
-                self.vm_writer.write_push('that', 0)
+        if next_symbol == '(' or next_symbol == '.':
+            name, receiver = self.compile_subroutine_call_start()
+
+            # (expression(','expression)*)?
+            if self.tokenizer.current_token[1] == ')':
+                self.compile_symbol(')')
+                return JackAST.Call(name, receiver, [])
+            stack.append(['arguments', name, receiver, []])
+            stack.append(['expression', None, None])
+            return None
+
+        name = self.tokenizer.current_token[1]
+        self.next_token()
+
+        # varName'['expression']'
+        if next_symbol == '[':
+            # '['
+            self.compile_symbol('[')
+            stack.append(['index', self.symbol_table.resolve(name)])
+            stack.append(['expression', None, None])
+            return None
 
-            else:
-                self.advance_tokenizer(ValueError('\'another tokens\' is expected'))
-                if self.symbol_table.kind_of(name) == 'var':
-                    self.vm_writer.write_push('local', self.symbol_table.index_of(name))
-                elif self.symbol_table.kind_of(name) == 'arg':
-                    self.vm_writer.write_push('argument', self.symbol_table.index_of(name))
-                elif self.symbol_table.kind_of(name) == 'static':
-                    self.vm_writer.write_push('static', self.symbol_table.index_of(name))
-                else:
-                    self.vm_writer.write_push('this', self.symbol_table.index_of(name))
+        # varName
+        return JackAST.VariableReference(self.symbol_table.resolve(name))
 
-    def compile_expression_list(self) -> int:
+    def compile_expression_list(self):
         """
         compiles a (possibly empty) comma-separated list of expressions
-        :return:
+        :return: list of the expressions
         """
-        counter = 0
+        expressions = []
         # (expression(','expression)*)?
         if self.tokenizer.symbol() == ')':
-            return 0
+            return expressions
 
         # expression(','expression)*
         while True:
             # expression
-            self.compile_expression()
-
-            counter += 1  # maybe take this out?
+            expressions.append(self.compile_expression())
 
             if self.tokenizer.symbol() == ')':
                 break
@@ -605,13 +722,31 @@ class CompilationEngine:
             # ','
             self.compile_symbol(',')
 
-        return counter
+        return expressions
 
     def compile_subroutine_call(self):
+        """
+        compiles a subroutine call
+        :return: JackAST.Call
+        """
+        name, receiver = self.compile_subroutine_call_start()
+
+        # expressionList
+        arguments = self.compile_expression_list()
+
+        # ')'
+        self.compile_symbol(')')
+
+        return JackAST.Call(name, receiver, arguments)
+
+    def compile_subroutine_call_start(self):
+        """
+        compiles a subroutine call up to and including its '('
+        :return: (the full VM name of the called subroutine, the receiver of the call as in JackAST.Call)
+        """
 
         # subroutineName'('expressionList')' | (className|varName)'.'subroutineName'('expressionList')'
         if self.tokenizer.next_token_type() == 'symbol' and self.tokenizer.next_symbol() == '.':
-            num_arguments = 0
 
             name = self.tokenizer.identifier()
             # (className|varName)
@@ -626,48 +761,26 @@ class CompilationEngine:
             self.compile_symbol('(')
 
             # if the method is being called on an object and not a class,the object will be a var in the symbol table
-            if self.symbol_table.defined(name):
-                num_arguments += 1  # need to pass the object that is calling the method (this)
-                # push the object calling the method to the stack
-                if self.symbol_table.kind_of(name) == 'var':
-                    self.vm_writer.write_push('local', self.symbol_table.index_of(name))
-                elif self.symbol_table.kind_of(name) == 'arg':
-                    self.vm_writer.write_push('argument', self.symbol_table.index_of(name))
-                elif self.symbol_table.kind_of(name) == 'static':
-                    self.vm_writer.write_push('static', self.symbol_table.index_of(name))
-                else:  # field
-                    self.vm_writer.write_push('this', self.symbol_table.index_of(name))
-
-            # expressionList
-            num_arguments += self.compile_expression_list()
-
-            # ')'
-            self.compile_symbol(')')
-
-            # if the method is being called on an object and not a class,the object will be a var in the symbol table
-            if self.symbol_table.defined(name):
-                name = self.symbol_table.type_of(name)
+            # and it is passed as the first argument (this)
+            receiver = None
+            variable = self.symbol_table.lookup(name)
+            if variable is not None:
+                receiver = JackAST.VariableReference(variable)
+                name = variable.type_
 
-            self.vm_writer.write_call(f'{name}.{function_name}', num_arguments)
+            self.used_classes.add(name)
+            return f'{name}.{function_name}', receiver
 
         else:
             function_name = self.tokenizer.identifier()
             # subroutineName
             self.compile_identifier()
 
-            # push this
-            self.vm_writer.write_push('pointer', 0)
-
             # '('
             self.compile_symbol('(')
 
-            # expressionList
-            num_arguments = self.compile_expression_list() + 1
-
-            # ')'
-            self.compile_symbol(')')
-
-            self.vm_writer.write_call(f'{self.class_name}.{function_name}', num_arguments)
+            # a method of the current object, which is passed as the first argument (this)
+            return f'{self.class_name}.{function_name}', JackAST.KeywordConstant('this')
 
     def advance_tokenizer(self, exception):
         """
@@ -679,3 +792,15 @@ class CompilationEngine:
         if not self.tokenizer.has_more_tokens():
             raise exception
         self.tokenizer.advance()
+
+    def next_token(self):
+        """
+        advances the tokenizer to the next token, which syntactically there needs to be. The same as
+        advance_tokenizer() with the most common error, but it only asks the tokenizer to advance, which raises
+        IndexError when there are no more tokens, instead of asking it if it has more tokens first
+        :return: nothing
+        """
+        try:
+            self.tokenizer.advance()
+        except IndexError:
+            raise ValueError('\'another tokens\' is expected') from None
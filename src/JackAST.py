@@ -0,0 +1,212 @@
+# the abstract syntax tree that the compilation engine builds for each class and subroutine, and that the code
+# generator lowers to VM instructions. Every variable in the tree is already resolved against the symbol table
+
+
+class Class:
+    __slots__ = ('name', 'static_count', 'field_count')
+
+    def __init__(self, name, static_count, field_count):
+        self.name = name
+        self.static_count = static_count
+        self.field_count = field_count
+
+
+class Subroutine:
+    """
+    a constructor, function or method. 'name' is the full VM name (className.subroutineName)
+    """
+    __slots__ = ('name', 'kind', 'return_type', 'arity', 'local_count', 'field_count', 'statements')
+
+    def __init__(self, name, kind, return_type, arity, local_count, field_count, statements):
+        self.name = name
+        self.kind = kind
+        self.return_type = return_type
+        self.arity = arity
+        self.local_count = local_count
+        self.field_count = field_count
+        self.statements = statements
+
+
+class Variable:
+    """
+    a resolved variable, as the symbol table defines it: its kind ('static', 'field', 'arg' or 'var'), the VM segment
+    of the kind, and its running index. The symbol table hands out the same record for every reference to the
+    variable, so it can't be changed
+    """
+    __slots__ = ('name', 'type_', 'kind', 'segment', 'index')
+
+    def __init__(self, name, type_, kind, segment, index):
+        set_ = object.__setattr__
+        set_(self, 'name', name)
+        set_(self, 'type_', type_)
+        set_(self, 'kind', kind)
+        set_(self, 'segment', segment)
+        set_(self, 'index', index)
+
+    def __setattr__(self, name, value):
+        raise AttributeError(f'{name} of a variable can\'t be changed')
+
+    def __reduce__(self):
+        return Variable, (self.name, self.type_, self.kind, self.segment, self.index)
+
+    def __repr__(self):
+        return f'Variable({self.name!r}, {self.type_!r}, {self.kind!r}, {self.segment!r}, {self.index})'
+
+
+# statements
+
+class Let:
+    """
+    let variable = value, or let variable[index] = value when 'index' isn't None
+    """
+    __slots__ = ('variable', 'index', 'value')
+
+    def __init__(self, variable, index, value):
+        self.variable = variable
+        self.index = index
+        self.value = value
+
+
+class If:
+    """
+    'else_statements' is None when there is no else clause
+    """
+    __slots__ = ('condition', 'statements', 'else_statements')
+
+    def __init__(self, condition, statements, else_statements):
+        self.condition = condition
+        self.statements = statements
+        self.else_statements = else_statements
+
+
+class While:
+    __slots__ = ('condition', 'statements')
+
+    def __init__(self, condition, statements):
+        self.condition = condition
+        self.statements = statements
+
+
+class Do:
+    """
+    'call' is the JackAST.Call of a do statement, or any other expression that is evaluated only for its side effects
+    """
+    __slots__ = ('call',)
+
+    def __init__(self, call):
+        self.call = call
+
+
+class Return:
+    """
+    'value' is None for a plain return;
+    """
+    __slots__ = ('value',)
+
+    def __init__(self, value):
+        self.value = value
+
+
+# expressions
+
+class IntegerConstant:
+    __slots__ = ('value',)
+
+    def __init__(self, value):
+        self.value = value
+
+
+class StringConstant:
+    __slots__ = ('value',)
+
+    def __init__(self, value):
+        self.value = value
+
+
+class KeywordConstant:
+    """
+    'true', 'false', 'null' or 'this'
+    """
+    __slots__ = ('keyword',)
+
+    def __init__(self, keyword):
+        self.keyword = keyword
+
+
+class VariableReference:
+    __slots__ = ('variable',)
+
+    def __init__(self, variable):
+        self.variable = variable
+
+
+class ArrayReference:
+    """
+    variable[index]
+    """
+    __slots__ = ('variable', 'index')
+
+    def __init__(self, variable, index):
+        self.variable = variable
+        self.index = index
+
+
+class Call:
+    """
+    a subroutine call. 'name' is the full VM name of the called subroutine (className.subroutineName), and 'receiver'
+    is the object that a method is called on: a VariableReference, KeywordConstant('this') for a method of the
+    current object, or None for a function or constructor
+    """
+    __slots__ = ('name', 'receiver', 'arguments')
+
+    def __init__(self, name, receiver, arguments):
+        self.name = name
+        self.receiver = receiver
+        self.arguments = arguments
+
+
+class UnaryOperation:
+    """
+    '-' or '~' applied to an operand
+    """
+    __slots__ = ('operator', 'operand')
+
+    def __init__(self, operator, operand):
+        self.operator = operator
+        self.operand = operand
+
+
+class BinaryOperation:
+    """
+    one of '+', '-', '*', '/', '&', '|', '<', '>', '=' applied to two operands. Jack has no precedence, so
+    'a + b * c' is BinaryOperation('*', BinaryOperation('+', a, b), c)
+    """
+    __slots__ = ('operator', 'left', 'right')
+
+    def __init__(self, operator, left, right):
+        self.operator = operator
+        self.left = left
+        self.right = right
+
+
+# expressions that the optimization passes introduce
+
+class SavedValue:
+    """
+    an expression whose value is also kept in temp 'slot', for the SavedValueReferences to the slot after it
+    """
+    __slots__ = ('expression', 'slot')
+
+    def __init__(self, expression, slot):
+        self.expression = expression
+        self.slot = slot
+
+
+class SavedValueReference:
+    """
+    the value that a SavedValue kept in temp 'slot'
+    """
+    __slots__ = ('slot',)
+
+    def __init__(self, slot):
+        self.slot = slot
@@ -1,41 +1,295 @@
 import JackTokenizer
 import CompilationEngine
+import BuildCache
+import ClassInterface
+import OutputBuffer
+import PassManager
+import ProgramIndex
+import os
 import sys
 import pathlib
+import argparse
+import concurrent.futures
 
 
-def compile_file(input_path):
+def output_path_of(input_path):
+    """
+    returns the path of the .vm file that 'input_path' is compiled into
+    :param input_path: pathlib.Path of a .jack file
+    :return: pathlib.Path
+    """
+    output_string = str(input_path.absolute()).replace(".jack", ".vm")
+    return pathlib.Path(output_string)
+
+
+def compile_file(input_path, streaming=False, build_cache=None, pass_manager=None, program_index=None):
     if str(input_path).endswith('.jack'):
 
-        jack_tokenizer = JackTokenizer.JackTokenizer(input_path)
+        if streaming:
+            jack_tokenizer = JackTokenizer.StreamingJackTokenizer(input_path)
+        else:
+            jack_tokenizer = JackTokenizer.JackTokenizer(input_path)
 
-        # create output file and prepare it for writing
-        output_string = str(input_path.absolute()).replace(".jack", ".vm")
-        path = pathlib.Path(output_string)
-        output_file_path = path.open('w')
+        # prepare the output file for writing. The code is collected in a buffer and written all at once on close()
+        path = output_path_of(input_path)
+        output_file_path = OutputBuffer.OutputBuffer(path)
+
+        # subroutines that didn't change since they were last compiled reuse their cached code
+        subroutine_cache = None
+        if build_cache is not None and not streaming:
+            subroutine_cache = build_cache.subroutine_cache(input_path)
 
         # use the CompilationEngine to compile the input jackTokenizer into the output file
-        compile_engine = CompilationEngine.CompilationEngine(jack_tokenizer, output_file_path)
+        compile_engine = CompilationEngine.CompilationEngine(jack_tokenizer, output_file_path, subroutine_cache,
+                                                             pass_manager, program_index is not None)
         compile_engine.compile_class()
 
         output_file_path.close()
+        if streaming:
+            jack_tokenizer.close()
+
+        if subroutine_cache is not None:
+            subroutine_cache.save()
+        if build_cache is not None:
+            build_cache.record(input_path, path, compile_engine.class_interface, compile_engine.used_classes)
+        if program_index is not None:
+            program_index.add_class(input_path, compile_engine.class_interface, compile_engine.call_sites)
+
+
+def compile_jack_source(source, pass_manager=None):
+    """
+    compiles the source code of one class, fully in memory
+    :param source: string with the jack code of a class
+    :param pass_manager: PassManager.PassManager with the optimization passes to run, or None for none
+    :return: string with the vm code of the class
+    """
+    jack_tokenizer = JackTokenizer.JackTokenizer(None, source)
+    output_buffer = OutputBuffer.OutputBuffer()
+    CompilationEngine.CompilationEngine(jack_tokenizer, output_buffer, None, pass_manager).compile_class()
+    return output_buffer.getvalue()
+
+
+def compile_job(input_path, streaming, version, pass_manager, whole_program):
+    """
+    compiles one file in a worker process of compile_files()
+    :param input_path: pathlib.Path of a .jack file
+    :param streaming: whether to tokenize lazily from a memory mapped file
+    :param version: the compiler version of the build cache, or None to compile without it
+    :param pass_manager: PassManager.PassManager with the optimization passes to run, or None
+    :param whole_program: whether to collect the interface and the call sites of the class for the ProgramIndex
+    :return: (the build cache entry of the file, None, pass statistics, class) or (None, the error that compiling it
+    raised, pass statistics, None). The statistics are those of this file only, and the class is (interface, call
+    sites) of the class in the whole-program mode, or None
+    """
+    statistics = {}
+    if pass_manager is not None:
+        pass_manager.statistics = statistics
+    program_index = None
+    if whole_program:
+        program_index = ProgramIndex.ProgramIndex()
+    try:
+        build_cache = None
+        if version is not None:
+            build_cache = BuildCache.BuildCache(input_path.parent, version)
+        compile_file(input_path, streaming, build_cache, pass_manager, program_index)
+    except Exception as error:
+        return None, f'{type(error).__name__}: {error}', statistics, None
+    class_ = None
+    if program_index is not None:
+        interface, = program_index.interfaces.values()
+        class_ = (interface, program_index.call_sites[input_path])
+    if build_cache is None:
+        return None, None, statistics, class_
+    return build_cache.entries[input_path.name], None, statistics, class_
+
+
+def compile_files(paths, streaming=False, build_cache=None, jobs=1, pass_manager=None, program_index=None):
+    """
+    compiles each of the .jack files in 'paths'. With more than one job, the files are compiled in a pool of 'jobs'
+    processes. Either way, the errors of all of the files are collected instead of stopping at the first one
+    :param paths: the paths of the .jack files
+    :param streaming: whether to tokenize lazily from memory mapped files
+    :param build_cache: BuildCache to record the compiled files in, or None
+    :param jobs: the number of processes to compile in
+    :param pass_manager: PassManager.PassManager with the optimization passes to run, or None for none. The statistics
+    of the passes that run in worker processes are added to its own
+    :param program_index: ProgramIndex.ProgramIndex to add the interface and call sites of each compiled class to,
+    in the whole-program mode, or None
+    :return: list of (path, error) of the files that failed to compile, in order of their names
+    """
+    paths = sorted(paths, key=lambda path_: path_.name)
+    if jobs == 1 or len(paths) < 2:
+        errors = []
+        for path in paths:
+            try:
+                compile_file(path, streaming, build_cache, pass_manager, program_index)
+            except Exception as error:
+                errors.append((path, f'{type(error).__name__}: {error}'))
+        return errors
+
+    version = None
+    if build_cache is not None:
+        version = build_cache.version
+    with concurrent.futures.ProcessPoolExecutor(jobs) as pool:
+        # the files are handed out a few at a time, which saves most of the overhead of sending each one separately
+        results = list(pool.map(compile_job, paths, [streaming] * len(paths), [version] * len(paths),
+                                [pass_manager] * len(paths), [program_index is not None] * len(paths),
+                                chunksize=max(1, len(paths) // (jobs * 4))))
+
+    errors = []
+    for path, (entry, error, statistics, class_) in zip(paths, results):
+        if pass_manager is not None:
+            pass_manager.merge(statistics)
+        if class_ is not None:
+            program_index.add_class(path, *class_)
+        if error is not None:
+            errors.append((path, error))
+        elif entry is not None:
+            build_cache.entries[path.name] = entry
+            build_cache.changed = True
+    return errors
+
+
+def check_program(program_index, build_cache=None):
+    """
+    checks the calls of the classes that were compiled against the whole program, once every class is in the index.
+    A class with a wrong call loses its .vm file and its build cache entry, so that it's compiled (and checked) again
+    by the next build
+    :param program_index: ProgramIndex.ProgramIndex
+    :param build_cache: BuildCache that the classes were recorded in, or None
+    :return: list of (path, error) of the classes that have a wrong call
+    """
+    errors = program_index.check()
+    for path, error in errors:
+        output_path = output_path_of(path)
+        if output_path.is_file():
+            output_path.unlink()
+        if build_cache is not None:
+            build_cache.forget(path)
+    return errors
+
+
+def report_errors(errors):
+    """
+    raises one exception that lists the errors of all of the files that failed to compile
+    :param errors: list of (path, error)
+    :return: void
+    """
+    if errors:
+        raise Exception('\n'.join(f'{path.name}: {error}' for path, error in errors))
+
+
+def build(directory, paths, build_cache, streaming=False, jobs=1, pass_manager=None, program_index=None):
+    """
+    compiles the .jack files in 'paths' that aren't up to date in 'build_cache'
+    :param directory: the directory of the .jack files
+    :param paths: the paths of the .jack files to build
+    :param build_cache: BuildCache of 'directory'
+    :param streaming: whether to tokenize lazily from memory mapped files
+    :param jobs: the number of processes to compile in
+    :param pass_manager: PassManager.PassManager with the optimization passes to run, or None for none. Its
+    fingerprint must be a part of the version of 'build_cache'
+    :param program_index: ProgramIndex.ProgramIndex to check the calls of the compiled classes against, in the
+    whole-program mode, or None. The classes that aren't compiled are added to it with their interface files
+    :return: (the paths that were compiled, list of (path, error) of the files that failed to compile). The files
+    that failed aren't among the compiled paths
+    """
+    # first compile the files that changed since they were last compiled. This brings every interface up to date
+    changed_paths = []
+    unchanged_paths = []
+    for path in paths:
+        if build_cache.is_fresh(path, output_path_of(path)):
+            unchanged_paths.append(path)
+        else:
+            changed_paths.append(path)
+    interfaces = None
+    try:
+        errors = compile_files(changed_paths, streaming, build_cache, jobs, pass_manager, program_index)
+
+        # then compile the unchanged files that use a class whose interface changed
+        interfaces = ClassInterface.load_interfaces(directory)
+        dependent_paths = [path for path in unchanged_paths if build_cache.dependencies_changed(path, interfaces)]
+        errors += compile_files(dependent_paths, streaming, build_cache, jobs, pass_manager, program_index)
+
+        if program_index is not None:
+            for interface in interfaces.values():
+                program_index.add_interface(interface)
+            errors += check_program(program_index, build_cache)
+    finally:
+        # the files that did compile are recorded even if others failed, or an error stopped the build
+        if interfaces is None:
+            interfaces = ClassInterface.load_interfaces(directory)
+        build_cache.save(interfaces)
+    failed_paths = {path for path, error in errors}
+    return [path for path in changed_paths + dependent_paths if path not in failed_paths], errors
+
 
 def main():
-    directory_or_file = sys.argv[1]
-    directory_or_file_path = pathlib.Path(directory_or_file)
+    argument_parser = argparse.ArgumentParser(description='compiles a .jack file, or a directory of .jack files, '
+                                                          'into .vm files')
+    argument_parser.add_argument('directory_or_file')
+    argument_parser.add_argument('--stream', action='store_true',
+                                 help='tokenize lazily from a memory mapped file, for very large input files')
+    argument_parser.add_argument('--cache', action='store_true',
+                                 help='only compile the files that changed since the last build with --cache (or '
+                                      'that use a class whose interface changed). Keeps a build cache, class '
+                                      'interface files and subroutine caches in the directory')
+    argument_parser.add_argument('--clean', action='store_true',
+                                 help='delete the build cache and the files recorded in it, and exit')
+    argument_parser.add_argument('--jobs', '-j', type=int, default=1,
+                                 help='compile in a pool of this many processes (0 for one per cpu)')
+    argument_parser.add_argument('--whole-program', action='store_true',
+                                 help='check each call against the subroutines of every class of the directory, once '
+                                      'they are all compiled, and let void subroutines return without a value (at '
+                                      '-O2). Only for a directory')
+    PassManager.add_arguments(argument_parser)
+    arguments = argument_parser.parse_args(sys.argv[1:])
+
+    directory_or_file_path = pathlib.Path(arguments.directory_or_file)
 
     if directory_or_file_path.is_file():
-        compile_file(directory_or_file_path)
+        # the calls of one class can only be checked against every class of the program, and the other classes
+        # would keep calling its void subroutines as if they returned a value
+        if arguments.whole_program:
+            argument_parser.error('--whole-program compiles a directory, not a single file')
+        directory = directory_or_file_path.parent
+        paths = [directory_or_file_path]
     elif directory_or_file_path.is_dir():
-        # for each .jack file in the directory, translate the jack code to vm code and write it to an output file
-        for path in directory_or_file_path.iterdir():
-            compile_file(path)
+        directory = directory_or_file_path
+        paths = [path for path in directory_or_file_path.iterdir() if str(path).endswith('.jack')]
     else:
         raise Exception
 
+    pass_manager = PassManager.from_arguments(arguments)
+    # code compiled with other passes is out of date
+    version = BuildCache.compiler_version() + pass_manager.fingerprint()
 
-if __name__ == '__main__':
-    main()
+    program_index = None
+    if arguments.whole_program:
+        program_index = ProgramIndex.ProgramIndex()
+        version += ' whole-program'
+
+    if arguments.clean:
+        BuildCache.BuildCache(directory, version).clean()
+        return
 
+    jobs = arguments.jobs
+    if jobs == 0:
+        jobs = os.cpu_count()
+
+    if arguments.cache:
+        build_cache = BuildCache.BuildCache(directory, version)
+        report_errors(build(directory, paths, build_cache, arguments.stream, jobs, pass_manager, program_index)[1])
+    else:
+        # for each .jack file, translate the jack code to vm code and write it to an output file
+        errors = compile_files(paths, arguments.stream, None, jobs, pass_manager, program_index)
+        if program_index is not None:
+            errors += check_program(program_index)
+        report_errors(errors)
 
+    if arguments.pass_statistics:
+        print(pass_manager.report(), file=sys.stderr)
 
+
+if __name__ == '__main__':
+    main()
@@ -1,4 +1,7 @@
 import re
+import mmap
+import collections
+import TokenBuffer
 import sys
 import pathlib
 
@@ -8,24 +11,47 @@ class JackTokenizer:
     removes comment and white space from input stream and breaks it into Jack tokens, as specified by the Jack grammar
     """
 
-    keyword_ = r'(class|constructor|function|method|field|static|var|int|char|boolean|void|true|false|null|this|' \
-               r'let|do|if|else|while|return)'
-    symbol_ = r'(\{|\}|\[|\]|\(|\)|\.|,|;|\+|-|\*|/|&|\||<|>|=|~)'
-    integer_constant = r'\d+'
-    string_constant = '"[^"]*"'
-    identifier_ = r'[A-Za-z_][A-Za-z0-9_]*'
+    keywords = frozenset(['class', 'constructor', 'function', 'method', 'field', 'static', 'var', 'int', 'char',
+                          'boolean', 'void', 'true', 'false', 'null', 'this', 'let', 'do', 'if', 'else', 'while',
+                          'return'])
 
-    # Combine all patterns into a single regular expression.
-    pattern = f'({string_constant})|({integer_constant})|({symbol_})|({identifier_})|({keyword_})'
+    # A single scanner for the whole file. Each alternative is a named group, so the type of a token is simply the
+    # name of the group that matched it. Comments and white space are matched (and skipped) in the same scan, which
+    # means that '//' and '/*' inside of a string constant are never mistaken for the start of a comment.
+    # keywords are matched as identifiers and told apart from them with a lookup in 'keywords'.
+    # White space and digits are spelled out instead of '\s' and '\d', which match only ascii characters in the byte
+    # pattern but any unicode white space or digit in the str pattern, so that both patterns match the same tokens
+    pattern_ = r'''
+        (?P<comment>//[^\n]*|/\*.*?\*/)
+        |(?P<whitespace>[ \t\r\n\f\v]+)
+        |"(?P<stringConstant>[^"]*)"
+        |(?P<integerConstant>[0-9]+)
+        |(?P<symbol>[{}()\[\].,;+\-*/&|<>=~])
+        |(?P<identifier>[A-Za-z_][A-Za-z0-9_]*)
+        |(?P<illegal>.)
+    '''
+    pattern = re.compile(pattern_, re.DOTALL | re.VERBOSE)
 
-    # opens the input file/stream and gets it ready to tokenize it
-    def __init__(self, input_path):
+    token_types = TokenBuffer.TokenBuffer.token_types
+
+    # the same scanner, for scanning a (memory mapped) file of bytes
+    byte_pattern = re.compile(pattern_.encode(), re.DOTALL | re.VERBOSE)
 
-        # remove any comments
-        input_file_contents = self.remove_comments(input_path)
+    # opens the input file/stream and gets it ready to tokenize it. 'source' is the contents of the input, for
+    # tokenizing a string that isn't in a file (in which case 'input_path' isn't used)
+    def __init__(self, input_path, source=None):
+
+        if source is None:
+            source = input_path.read_text()
 
         # create list of tokens (and what type it is)
-        self.tokens = self.tokenize(input_file_contents)
+        self.tokens = self.tokenize(source)
+
+        # the arrays of the token buffer, for quick access to the current and next tokens
+        self.number_of_tokens = len(self.tokens)
+        self.kinds = self.tokens.kinds
+        self.lexeme_ids = self.tokens.lexeme_ids
+        self.lexemes = self.tokens.lexemes
 
         self.current_token = ()  # (type, token)
         self.number_current_token = 0
@@ -33,61 +59,234 @@ class JackTokenizer:
     def tokenize(self, input_file_contents):
         """
         helper method for the constructor
-        divides 'input_file_contents' into tokens and writes all of those tokens into a list. The list is a list of
-        tuples. each tuple is (token type, token)
+        divides 'input_file_contents' into tokens, skipping comments and white space, and writes all of those tokens
+        into a TokenBuffer, along with the type and offset of each of them
         :param input_file_contents: a string that needs to be divided into tokens
-        :return:
+        :return: TokenBuffer
         """
-        # Find all matches using the pattern
-        matches = re.findall(self.pattern, input_file_contents)
-
-        # Flatten the matches and remove empty strings
-        elements = [match[0] or match[1] or match[2] or match[3] or match[4] for match in matches if any(match)]
-
-        tokens = []
-        for element in elements:
-            if re.match('^(' + self.keyword_ + ')$', element):
-                tokens.append(('keyword', element))
-            elif re.match('^(' + self.symbol_ + ')$', element):
-                # (<,>, and &) are also used for XML markup, and thus they can't appear as data in XML files
-                tokens.append(('symbol', element))
-            elif re.match('^(' + self.integer_constant + ')$', element):
-                tokens.append(('integerConstant', element))
-            elif re.match('^(' + self.string_constant + ')$', element):
-                tokens.append(('stringConstant', element[1:-1]))  # need the '[1:-1]' to get rid of quotes
-            elif re.match('^(' + self.identifier_ + ')$', element):
-                tokens.append(('identifier', element))
-            else:
-                raise Exception(f'{element} is not a legal token in the Jack Grammar')
-
+        tokens = TokenBuffer.TokenBuffer()
+        append = tokens.append
+        for type_, token, offset in self.scan(input_file_contents):
+            append(type_, token, offset)
         return tokens
 
+    @classmethod
+    def scan(cls, input_file_contents):
+        """
+        lazily divides 'input_file_contents' into tokens, skipping comments and white space.
+        yields (token type, token, offset) tuples, one at a time
+        :param input_file_contents: a string, or a buffer of bytes (e.g. a mmap) that holds utf-8 text
+        :return: generator
+        """
+        keywords = cls.keywords
+        if isinstance(input_file_contents, str):
+            matches = cls.pattern.finditer(input_file_contents)
+            decode = None
+        else:
+            matches = cls.byte_pattern.finditer(input_file_contents)
+            decode = bytes.decode
+
+        for match in matches:
+            type_ = match.lastgroup
+            if type_ == 'comment' or type_ == 'whitespace':
+                continue
+            if type_ == 'illegal':
+                cls.raise_illegal(input_file_contents, match.start())
+            token = match.group(type_)
+            if decode is not None:
+                token = decode(token)
+            if type_ == 'identifier':
+                yield 'keyword' if token in keywords else 'identifier', token, match.start()
+            else:
+                # for a string constant the group doesn't include the quotes
+                yield type_, token, match.start(type_)
+
     @staticmethod
-    def remove_comments(path):
+    def raise_illegal(input_file_contents, offset):
         """
-        helper method for the constructor
-        stores all the contents, without the comments, of 'path' in a string
-        :param path:
+        raises the error of a character that no token starts with, or of a '"' that starts a string constant and never
+        ends it. Both are reported with their line instead of being skipped
+        :param input_file_contents: a string, or a buffer of bytes (e.g. a mmap) that holds utf-8 text
+        :param offset: the offset of the character
+        :return: void
+        """
+        if isinstance(input_file_contents, str):
+            line = input_file_contents[:offset].count('\n') + 1
+            character = input_file_contents[offset]
+        else:
+            # the character may take up to 4 bytes of utf-8
+            line = input_file_contents[:offset].count(b'\n') + 1
+            character = bytes(input_file_contents[offset:offset + 4]).decode(errors='replace')[0]
+        if character == '"':
+            raise Exception(f'line {line}: the string constant is not terminated')
+        raise Exception(f'line {line}: {character!r} is not a legal token in the Jack Grammar')
+
+    def has_more_tokens(self):
+        if self.number_current_token == self.number_of_tokens:
+            return False
+        else:
+            return True
+
+    def advance(self):
+        """
+        gets the next token from the input and makes it the current token. This method should only be called if the
+        method has_more_tokens() is true. Initially there is no current token
+        :return:
+        """
+        number = self.number_current_token
+        self.current_token = (self.token_types[self.kinds[number]], self.lexemes[self.lexeme_ids[number]])
+        self.number_current_token = number + 1
+
+    def find_block_end(self, number):
+        """
+        returns the number of the token right after the '}' that closes the first block ('{' ... '}') that starts at or
+        after token number 'number', or None if the block isn't closed
+        :param number: int
+        :return: int
+        """
+        depth = 0
+        symbol = TokenBuffer.TokenBuffer.token_type_numbers['symbol']
+        kinds = self.kinds
+        lexemes = self.lexemes
+        lexeme_ids = self.lexeme_ids
+        for number in range(number, self.number_of_tokens):
+            if kinds[number] == symbol:
+                lexeme = lexemes[lexeme_ids[number]]
+                if lexeme == '{':
+                    depth += 1
+                elif lexeme == '}':
+                    depth -= 1
+                    if depth == 0:
+                        return number + 1
+        return None
+
+    def skip_to(self, number):
+        """
+        makes token number 'number' the current token, skipping over any tokens before it
+        :param number: int
+        :return:
+        """
+        self.number_current_token = number
+        self.advance()
+
+    def token_type(self):
+        """
+        returns the type of the current token
+        :return:
+        """
+        return self.current_token[0]
+
+    def keyword(self):
+        """
+        returns the keyword which is the current token. Should be called only when token_type() is 'keyword''
+        :return:
+        """
+        return self.current_token[1]
+
+    def symbol(self):
+        """
+        returns the character which is the current token. Should be called only when token_type() is 'symbol'
+        :return:
+        """
+        return self.current_token[1]
+
+    def identifier(self):
+        """
+        returns the identifier which is the current token. Should be called only when token_type() is 'identifier'
         :return:
         """
-        file_contents = path.read_text()
+        return self.current_token[1]
+
+    def int_val(self):
+        """
+        returns the integer value which is the current token.
+        Should be called only when token_type() is 'integerConstant'
+        :return:
+        """
+        return int(self.current_token[1])
+
+    def string_val(self):
+        """
+        returns the string value which is the current token, without the double quotes.
+        this method Should be called only when token_type() is 'string_constant'
+        :return:
+        """
+        return self.current_token[1]
+
+    def next_token_type(self):
+        """
+        this method should only be called when syntactically, there needs to be more tokens, and so
+        if there are no more tokens than an exception is raised
+        :return:
+        """
+        if self.number_current_token == self.number_of_tokens:
+            raise Exception('there is no \'next token\'')
+        return self.token_types[self.kinds[self.number_current_token]]
+
+    def next_keyword(self):
+        """
+        this method should only be called when syntactically, there needs to be more tokens, and so
+        if there are no more tokens than an exception is raised
+        :return:
+        """
+        if self.number_current_token == self.number_of_tokens:
+            raise Exception('there is no \'next keyword\'')
+        return self.lexemes[self.lexeme_ids[self.number_current_token]]
+
+    def next_symbol(self):
+        """
+        this method should only be called when syntactically, there needs to be more tokens, and so
+        if there are no more tokens than an exception is raised
+        :return:
+        """
+        if self.number_current_token == self.number_of_tokens:
+            raise Exception('there is no \'next symbol\'')
+        return self.lexemes[self.lexeme_ids[self.number_current_token]]
+
+
+class StreamingJackTokenizer:
+    """
+    the same tokenizer as JackTokenizer, for very large input files. Instead of reading the whole file and building a
+    list of all of its tokens, the file is memory mapped and tokens are scanned lazily, as the compilation engine
+    advances. Only the current token and a small buffer of upcoming tokens (enough for next_token_type() and
+    next_symbol()) are held in memory at a time, so memory use doesn't grow with the size of the input
+    """
 
-        # Remove /* ... */ comments
-        file_contents = re.sub(r"/\*.*?\*/", "", file_contents, flags=re.DOTALL)
+    # opens the input file/stream and gets it ready to tokenize it
+    def __init__(self, input_path, lookahead=1):
+
+        self.input_file = input_path.open('rb')
+        try:
+            self.buffer = mmap.mmap(self.input_file.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:  # an empty file can't be memory mapped
+            self.buffer = b''
 
-        # Remove /** ... */ API comments
-        file_contents = re.sub(r"/\*\*.*?\*/", "", file_contents, flags=re.DOTALL)
+        self.token_stream = JackTokenizer.scan(self.buffer)
 
-        # Remove // comments
-        file_contents = re.sub(r"//.*", "", file_contents)
+        # the upcoming tokens, in order. Never holds more than 'lookahead' tokens
+        self.upcoming_tokens = collections.deque()
+        self.lookahead = lookahead
+        self.fill_upcoming_tokens()
+
+        self.current_token = ()  # (type, token, offset)
+        self.number_current_token = 0
 
-        return file_contents
+    def fill_upcoming_tokens(self):
+        """
+        scans tokens from the input until there are 'lookahead' upcoming tokens, or until the input is exhausted
+        :return:
+        """
+        while len(self.upcoming_tokens) < self.lookahead:
+            token = next(self.token_stream, None)
+            if token is None:
+                return
+            self.upcoming_tokens.append(token)
 
     def has_more_tokens(self):
-        if self.number_current_token == len(self.tokens):
-            return False
-        else:
+        if self.upcoming_tokens:
             return True
+        else:
+            return False
 
     def advance(self):
         """
@@ -95,8 +294,9 @@ class JackTokenizer:
         method has_more_tokens() is true. Initially there is no current token
         :return:
         """
-        self.current_token = self.tokens[self.number_current_token]
+        self.current_token = self.upcoming_tokens.popleft()
         self.number_current_token = self.number_current_token + 1
+        self.fill_upcoming_tokens()
 
     def token_type(self):
         """
@@ -148,9 +348,9 @@ class JackTokenizer:
         if there are no more tokens than an exception is raised
         :return:
         """
-        if self.number_current_token == len(self.tokens):
+        if not self.upcoming_tokens:
             raise Exception('there is no \'next token\'')
-        return self.tokens[self.number_current_token][0]
+        return self.upcoming_tokens[0][0]
 
     def next_keyword(self):
         """
@@ -158,9 +358,9 @@ class JackTokenizer:
         if there are no more tokens than an exception is raised
         :return:
         """
-        if self.number_current_token == len(self.tokens):
+        if not self.upcoming_tokens:
             raise Exception('there is no \'next keyword\'')
-        return self.tokens[self.number_current_token][1]
+        return self.upcoming_tokens[0][1]
 
     def next_symbol(self):
         """
@@ -168,6 +368,17 @@ class JackTokenizer:
         if there are no more tokens than an exception is raised
         :return:
         """
-        if self.number_current_token == len(self.tokens):
+        if not self.upcoming_tokens:
             raise Exception('there is no \'next symbol\'')
-        return self.tokens[self.number_current_token][1]
+        return self.upcoming_tokens[0][1]
+
+    def close(self):
+        """
+        releases the memory map and closes the input file
+        :return:
+        """
+        # the scanner holds on to the buffer, so it has to be released before the map can be closed
+        self.token_stream = None
+        if isinstance(self.buffer, mmap.mmap):
+            self.buffer.close()
+        self.input_file.close()
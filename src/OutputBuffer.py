@@ -0,0 +1,32 @@
+class OutputBuffer:
+    """
+    in-memory output sink that the VM writer and the code writer write to instead of writing to a file a line at a
+    time. Writes are collected in a list and joined once; if the buffer has a path, all of it is written to the path,
+    in one write, when the buffer is closed
+    """
+
+    def __init__(self, path=None):
+        """
+        creates a new empty buffer
+        :param path: pathlib.Path to write the contents to when the buffer is closed, or None to only keep them in memory
+        """
+        self.path = path
+        self.parts = []
+        self.write = self.parts.append
+
+    def getvalue(self):
+        """
+        returns everything that was written to the buffer
+        :return: string
+        """
+        contents = ''.join(self.parts)
+        self.parts[:] = [contents]
+        return contents
+
+    def close(self):
+        """
+        writes the contents of the buffer to its path, if it has one
+        :return: void
+        """
+        if self.path is not None:
+            self.path.write_text(self.getvalue())
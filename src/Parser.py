@@ -5,7 +5,11 @@
 class Parser:
 
     # constructor - opens file at a given path and gives values to the class attributes
-    def __init__(self, path):
+    # 'source' is the contents of the file, for parsing vm code that isn't in a file (in which case 'path' only names it)
+    def __init__(self, path, source=None):
+
+        if source is None:
+            source = path.read_text()
 
         self.input_file_name = path.stem
         self.current_command = ""
@@ -13,7 +17,7 @@ class Parser:
         self.number_current_command = 0
 
         # fill self.commands with all the commands in the current file
-        for line in path.read_text().splitlines():
+        for line in source.splitlines():
 
             # get rid of comments and then strip the line of white spaces
             temp_line = line.partition("//")[0].strip()
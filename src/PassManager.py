@@ -0,0 +1,220 @@
+# the optimization passes of both compilers, and the pass manager that runs the passes of an optimization level
+import time
+import CodeGenerator
+import ASTPasses
+import VMPasses
+
+
+class Pass:
+    """
+    one optimization pass. 'stage' is 'ast' for a pass that transforms the JackAST.Subroutine of a subroutine before it
+    is lowered, 'vm' for a pass that transforms its list of VM instructions after, and 'codegen' for a pass that
+    changes how the compilation engine lowers a class, which has no function of its own. 'level' is the lowest
+    optimization level that the pass runs at, or None for a pass that only runs when it's enabled by name
+    """
+    __slots__ = ('name', 'stage', 'level', 'function', 'description')
+
+    def __init__(self, name, stage, level, function, description):
+        self.name = name
+        self.stage = stage
+        self.level = level
+        self.function = function
+        self.description = description
+
+
+class PassManager:
+    """
+    runs the passes of an optimization level, in the order of 'passes'. At level 0 no pass runs, and the output is
+    exactly that of the plain code generator, so the output of any other level can be checked by diffing it with
+    the output of level 0. Single passes can be enabled or disabled on top of the level, to find the pass that broke
+    a program
+    """
+
+    levels = (0, 1, 2)
+
+    # every pass, in the order that they run in
+    passes = (
+        Pass('fold-constants', 'ast', 1, ASTPasses.fold_constants,
+             'replace operations on constants with their values'),
+        Pass('propagate-constants', 'ast', 1, ASTPasses.propagate_constants,
+             'propagate constants assigned to locals and arguments, and remove the branches and loops that '
+             'constant conditions never take'),
+        Pass('reduce-strength', 'ast', 1, ASTPasses.reduce_strength,
+             'remove multiplications and divisions by 1, multiplications by 0 and -1, and move constant factors to '
+             'the right'),
+        Pass('remove-dead-stores', 'ast', 1, ASTPasses.remove_dead_stores,
+             'remove the lets to locals and arguments whose values are never read, and the locals that are never '
+             'used'),
+        Pass('hoist-invariants', 'ast', 2, ASTPasses.hoist_invariants,
+             'compute the expressions of while loops that only depend on constants and on locals and arguments that '
+             'the loops don\'t assign to once, before the loops, into fresh locals'),
+        Pass('number-values', 'ast', 2, ASTPasses.number_subroutine_values,
+             'evaluate the repeated array reads and other pure expressions of a statement once, and reuse their '
+             'values from temp slots'),
+        Pass('peephole', 'vm', 1, VMPasses.peephole,
+             'remove push/pop pairs of the same location, double not/neg, jumps to the next instruction and branches '
+             'on constants'),
+        Pass('unreachable', 'vm', 2, VMPasses.remove_unreachable,
+             'remove the instructions after a goto or return that no label leads to'),
+        Pass('multiply-by-shifts', 'vm', 2, VMPasses.multiply_by_shifts,
+             'replace multiplications by constants with additions, and remove divisions by 1'),
+        Pass('layout-branches', 'codegen', 1, None,
+             'test the conditions of while loops at the bottom, branch to the then clause of an if with an else '
+             'instead of negating its condition, and leave out the empty else path of an if without one'),
+        Pass('direct-array-stores', 'codegen', 1, None,
+             'store the value of an array entry right through that 0 when computing it can\'t change pointer 1, '
+             'instead of through temp 0'),
+        Pass('elide-void-returns', 'codegen', 2, None,
+             'return from void subroutines without a value, which no call site uses. Only runs in the whole-program '
+             'mode of the compiler, which checks that'),
+        Pass('pool-strings', 'codegen', None, None,
+             'build the string of each distinct string constant of a class once, into a static variable. Changes the '
+             'meaning of programs that change or dispose of the strings of constants'),
+        Pass('string-routines', 'codegen', None, None,
+             'like pool-strings, and build each string in a function of its own instead of at every use'),
+    )
+
+    def __init__(self, level=0, enable=(), disable=(), collect_statistics=False):
+        """
+        :param level: the optimization level, one of 'levels'
+        :param enable: names of passes to run even if their level is higher than 'level'
+        :param disable: names of passes not to run
+        :param collect_statistics: whether to time each pass and count the instructions that it removes
+        """
+        if level not in self.levels:
+            raise ValueError(f'{level} is not an optimization level, expected one of {self.levels}')
+        names = {pass_.name for pass_ in self.passes}
+        for name in list(enable) + list(disable):
+            if name not in names:
+                raise ValueError(f'{name} is not an optimization pass')
+
+        self.level = level
+        self.enabled_passes = [pass_ for pass_ in self.passes
+                               if (pass_.level is not None and pass_.level <= level or pass_.name in enable) and
+                               pass_.name not in disable]
+        self.ast_passes = [pass_ for pass_ in self.enabled_passes if pass_.stage == 'ast']
+        self.vm_passes = [pass_ for pass_ in self.enabled_passes if pass_.stage == 'vm']
+
+        self.collect_statistics = collect_statistics
+        # name of pass -> [runs, seconds, instructions before, instructions after]
+        self.statistics = {}
+        self.code_generator = CodeGenerator.CodeGenerator()
+
+    def is_enabled(self, name):
+        """
+        :param name: the name of a pass
+        :return: whether the pass runs
+        """
+        return any(pass_.name == name for pass_ in self.enabled_passes)
+
+    def fingerprint(self):
+        """
+        returns a string that identifies the passes that run, to add to the version of the build cache. It is empty
+        when no pass runs, so that unoptimized code is cached under the plain compiler version
+        :return: string
+        """
+        if not self.enabled_passes:
+            return ''
+        return ' passes:' + ','.join(pass_.name for pass_ in self.enabled_passes)
+
+    def optimize(self, subroutine, code_generator):
+        """
+        runs the ast passes on a subroutine, lowers it, and runs the vm passes on its instructions
+        :param subroutine: JackAST.Subroutine
+        :param code_generator: CodeGenerator.CodeGenerator to lower the subroutine with
+        :return: list of VMInstruction
+        """
+        subroutine = self.run_ast_passes(subroutine)
+        return self.run_vm_passes(code_generator.generate_subroutine(subroutine))
+
+    def run_ast_passes(self, subroutine):
+        """
+        :param subroutine: JackAST.Subroutine
+        :return: the optimized JackAST.Subroutine
+        """
+        for pass_ in self.ast_passes:
+            if not self.collect_statistics:
+                subroutine = pass_.function(subroutine)
+                continue
+            # the size of the subroutine is measured by lowering it before and after the pass
+            before = len(self.code_generator.generate_subroutine(subroutine))
+            start = time.perf_counter()
+            subroutine = pass_.function(subroutine)
+            seconds = time.perf_counter() - start
+            self.record(pass_.name, seconds, before, len(self.code_generator.generate_subroutine(subroutine)))
+        return subroutine
+
+    def run_vm_passes(self, instructions):
+        """
+        :param instructions: list of VMInstruction
+        :return: the optimized list of VMInstruction
+        """
+        for pass_ in self.vm_passes:
+            if not self.collect_statistics:
+                instructions = pass_.function(instructions)
+                continue
+            before = len(instructions)
+            start = time.perf_counter()
+            instructions = pass_.function(instructions)
+            self.record(pass_.name, time.perf_counter() - start, before, len(instructions))
+        return instructions
+
+    def record(self, name, seconds, before, after):
+        statistics = self.statistics.setdefault(name, [0, 0.0, 0, 0])
+        statistics[0] += 1
+        statistics[1] += seconds
+        statistics[2] += before
+        statistics[3] += after
+
+    def merge(self, statistics):
+        """
+        adds the statistics of another pass manager (of a worker process) to these
+        :param statistics: the 'statistics' of the other pass manager
+        :return: void
+        """
+        for name, (runs, seconds, before, after) in statistics.items():
+            own = self.statistics.setdefault(name, [0, 0.0, 0, 0])
+            own[0] += runs
+            own[1] += seconds
+            own[2] += before
+            own[3] += after
+
+    def report(self):
+        """
+        returns a table of the time that each pass took and the instructions that it removed
+        :return: string
+        """
+        lines = [f'{"pass":<24}{"runs":>8}{"ms":>10}{"before":>10}{"after":>10}{"removed":>10}']
+        for pass_ in self.enabled_passes:
+            if pass_.name not in self.statistics:
+                continue
+            runs, seconds, before, after = self.statistics[pass_.name]
+            lines.append(f'{pass_.name:<24}{runs:>8}{seconds * 1000:>10.2f}{before:>10}{after:>10}'
+                         f'{before - after:>10}')
+        return '\n'.join(lines)
+
+
+def add_arguments(argument_parser):
+    """
+    adds the optimization options of both compilers to an argparse.ArgumentParser
+    :param argument_parser: argparse.ArgumentParser
+    :return: void
+    """
+    names = ', '.join(pass_.name for pass_ in PassManager.passes)
+    argument_parser.add_argument('-O', dest='optimization_level', type=int, choices=PassManager.levels, default=0,
+                                 help='the optimization level (default 0, no optimizations)')
+    argument_parser.add_argument('--enable-pass', action='append', default=[], metavar='PASS',
+                                 help=f'run this pass regardless of the optimization level (one of {names})')
+    argument_parser.add_argument('--disable-pass', action='append', default=[], metavar='PASS',
+                                 help='do not run this pass')
+    argument_parser.add_argument('--pass-statistics', action='store_true',
+                                 help='print the time that each pass took and the instructions that it removed')
+
+
+def from_arguments(arguments):
+    """
+    :param arguments: the arguments parsed by a parser that add_arguments() was called on
+    :return: PassManager
+    """
+    return PassManager(arguments.optimization_level, arguments.enable_pass, arguments.disable_pass,
+                       arguments.pass_statistics)
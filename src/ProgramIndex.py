@@ -0,0 +1,171 @@
+# the index of the subroutines of every class of a program, for the whole-program mode of the compiler: calls are
+# checked against the signatures of the subroutines that they call, and void subroutines can return without a value.
+# The index is built from the interfaces of the classes as they're compiled (and from the interfaces of the classes
+# that are up to date in the build cache), and the calls are checked once every class is known
+import JackAST
+import ASTPasses
+import ClassInterface
+
+
+# the subroutines of the classes of the Jack OS: name -> (kind, arity, return type)
+os_subroutines = {
+    'Math': {'init': ('function', 0, 'void'), 'abs': ('function', 1, 'int'), 'multiply': ('function', 2, 'int'),
+             'divide': ('function', 2, 'int'), 'min': ('function', 2, 'int'), 'max': ('function', 2, 'int'),
+             'sqrt': ('function', 1, 'int')},
+    'String': {'new': ('constructor', 1, 'String'), 'dispose': ('method', 0, 'void'),
+               'length': ('method', 0, 'int'), 'charAt': ('method', 1, 'char'), 'setCharAt': ('method', 2, 'void'),
+               'appendChar': ('method', 1, 'String'), 'eraseLastChar': ('method', 0, 'void'),
+               'intValue': ('method', 0, 'int'), 'setInt': ('method', 1, 'void'),
+               'backSpace': ('function', 0, 'char'), 'doubleQuote': ('function', 0, 'char'),
+               'newLine': ('function', 0, 'char')},
+    'Array': {'new': ('function', 1, 'Array'), 'dispose': ('method', 0, 'void')},
+    'Output': {'init': ('function', 0, 'void'), 'moveCursor': ('function', 2, 'void'),
+               'printChar': ('function', 1, 'void'), 'printString': ('function', 1, 'void'),
+               'printInt': ('function', 1, 'void'), 'println': ('function', 0, 'void'),
+               'backSpace': ('function', 0, 'void')},
+    'Screen': {'init': ('function', 0, 'void'), 'clearScreen': ('function', 0, 'void'),
+               'setColor': ('function', 1, 'void'), 'drawPixel': ('function', 2, 'void'),
+               'drawLine': ('function', 4, 'void'), 'drawRectangle': ('function', 4, 'void'),
+               'drawCircle': ('function', 3, 'void')},
+    'Keyboard': {'init': ('function', 0, 'void'), 'keyPressed': ('function', 0, 'char'),
+                 'readChar': ('function', 0, 'char'), 'readLine': ('function', 1, 'String'),
+                 'readInt': ('function', 1, 'int')},
+    'Memory': {'init': ('function', 0, 'void'), 'peek': ('function', 1, 'int'), 'poke': ('function', 2, 'void'),
+               'alloc': ('function', 1, 'Array'), 'deAlloc': ('function', 1, 'void')},
+    'Sys': {'init': ('function', 0, 'void'), 'halt': ('function', 0, 'void'), 'error': ('function', 1, 'void'),
+            'wait': ('function', 1, 'void')},
+}
+
+
+def do_calls(statements):
+    """
+    :param statements: list of statements
+    :return: set of the ids of the calls of the do statements among the statements (at any depth), whose values are
+    thrown away
+    """
+    calls = set()
+    for statement in statements:
+        if isinstance(statement, JackAST.Do):
+            calls.add(id(statement.call))
+        elif isinstance(statement, JackAST.If):
+            calls |= do_calls(statement.statements)
+            if statement.else_statements is not None:
+                calls |= do_calls(statement.else_statements)
+        elif isinstance(statement, JackAST.While):
+            calls |= do_calls(statement.statements)
+    return calls
+
+
+def call_sites(subroutine):
+    """
+    :param subroutine: JackAST.Subroutine, before any optimization pass ran on it
+    :return: list of the call sites of the subroutine, (subroutine name, subroutine kind, called subroutine name,
+    receiver, number of arguments, whether the value of the call is used), where the receiver is None for a call
+    without an object, 'this' for a call on the object of the subroutine, and 'object' for a call on another object
+    """
+    ignored_calls = do_calls(subroutine.statements)
+    sites = []
+
+    def add_call(expression):
+        if isinstance(expression, JackAST.Call):
+            receiver = None
+            if isinstance(expression.receiver, JackAST.KeywordConstant):
+                receiver = 'this'
+            elif expression.receiver is not None:
+                receiver = 'object'
+            sites.append((subroutine.name, subroutine.kind, expression.name, receiver, len(expression.arguments),
+                          id(expression) not in ignored_calls))
+        return expression
+
+    ASTPasses.transform_statements(subroutine.statements, add_call)
+    return sites
+
+
+class ProgramIndex:
+    """
+    the interfaces of every class of a program, and of the classes of the Jack OS that the program doesn't define
+    itself, and the call sites of the classes that were compiled. Every call of a program that checks against the
+    index calls a subroutine that exists, with as many arguments as it takes, on an object exactly when it's a method,
+    and uses the value of a void subroutine nowhere
+    """
+
+    def __init__(self):
+        self.os_interfaces = {}
+        for class_name, subroutines in os_subroutines.items():
+            interface = ClassInterface.ClassInterface(class_name)
+            for name, (kind, arity, return_type) in subroutines.items():
+                interface.add_subroutine(name, kind, arity, return_type)
+            self.os_interfaces[class_name] = interface
+
+        self.interfaces = {}  # class name -> ClassInterface.ClassInterface of the classes of the program
+        self.call_sites = {}  # path of a compiled .jack file -> the call sites of its class
+
+    def add_class(self, path, interface, sites):
+        """
+        adds a class that was just compiled
+        :param path: pathlib.Path of the .jack file of the class
+        :param interface: ClassInterface.ClassInterface of the class
+        :param sites: list of the call sites of the class (see call_sites())
+        :return: void
+        """
+        self.interfaces[interface.class_name] = interface
+        self.call_sites[path] = sites
+
+    def add_interface(self, interface):
+        """
+        adds the interface of a class that wasn't compiled, since it's up to date. Its calls were checked when it was
+        :param interface: ClassInterface.ClassInterface
+        :return: void
+        """
+        self.interfaces.setdefault(interface.class_name, interface)
+
+    def signature(self, subroutine_name):
+        """
+        :param subroutine_name: the full VM name of a subroutine (className.subroutineName)
+        :return: (kind, arity, return type) of the subroutine, or None if the program has no such subroutine
+        """
+        class_name, _, name = subroutine_name.partition('.')
+        interface = self.interfaces.get(class_name, self.os_interfaces.get(class_name))
+        if interface is None:
+            return None
+        return interface.subroutines.get(name)
+
+    def check(self):
+        """
+        checks the call sites of every compiled class against the index
+        :return: list of (path, error) of the classes that have a wrong call, with the error of their first one
+        """
+        errors = []
+        for path, sites in self.call_sites.items():
+            try:
+                for site in sites:
+                    self.check_call(*site)
+            except Exception as error:
+                errors.append((path, str(error)))
+        return errors
+
+    def check_call(self, subroutine_name, subroutine_kind, name, receiver, argument_count, value_used):
+        """
+        checks one call site, and raises an Exception if the call is wrong
+        :return: void
+        """
+        class_name = name.partition('.')[0]
+        if class_name not in self.interfaces and class_name not in self.os_interfaces:
+            raise Exception(f'{subroutine_name} calls {name}, but {class_name} is not a class of the program')
+        signature = self.signature(name)
+        if signature is None:
+            raise Exception(f'{subroutine_name} calls {name}, which is not defined')
+        kind, arity, return_type = signature
+
+        if kind == 'method':
+            if receiver is None:
+                raise Exception(f'{subroutine_name} calls the method {name} without an object')
+            if receiver == 'this' and subroutine_kind == 'function':
+                raise Exception(f'{subroutine_name} is a function, and has no object to call the method {name} on')
+        elif receiver is not None:
+            raise Exception(f'{subroutine_name} calls the {kind} {name} on an object')
+
+        if argument_count != arity:
+            raise Exception(f'{subroutine_name} calls {name} with {argument_count} arguments, but it takes {arity}')
+        if value_used and return_type == 'void':
+            raise Exception(f'{subroutine_name} uses the value of {name}, which is void')
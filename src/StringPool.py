@@ -0,0 +1,46 @@
+# the string constants of a class, pooled into static variables
+
+
+class StringPool:
+    """
+    gives each distinct string constant of a class a static variable of its own, after the static variables that the
+    class declares. The code of a pooled constant builds the string the first time that it runs and stores it in the
+    variable, which is 0 until then (the Hack RAM starts out cleared), and after that only pushes the variable.
+    With 'routines', the code that builds each string is a function of its own, so that the characters of a constant
+    are in the ROM only once however many times the constant is used.
+    The strings are shared by every use of the same constant, so a program that changes or disposes of the string of a
+    constant sees the change at the other uses as well
+    """
+
+    def __init__(self, class_name, first_static, routines=False):
+        """
+        :param class_name: the name of the class
+        :param first_static: the index of the first static variable that the pool may use
+        :param routines: whether to build each string in a function of its own
+        """
+        self.class_name = class_name
+        self.first_static = first_static
+        self.routines = routines
+        self.statics = {}  # string constant -> the index of its static variable
+
+    def static_of(self, value):
+        """
+        :param value: a string constant
+        :return: the index of the static variable of the string constant
+        """
+        index = self.statics.get(value)
+        if index is None:
+            index = self.first_static + len(self.statics)
+            self.statics[value] = index
+        return index
+
+    def routine_of(self, value):
+        """
+        :param value: a string constant
+        :return: the name of the function that returns the string of the constant. '$' isn't legal in Jack
+        identifiers, so the name can't clash with a subroutine of the class
+        """
+        return f'{self.class_name}.string${self.static_of(value) - self.first_static}'
+
+    def __len__(self):
+        return len(self.statics)
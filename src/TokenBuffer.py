@@ -0,0 +1,92 @@
+import hashlib
+from array import array
+
+
+class TokenBuffer:
+    """
+    compact storage for a whole stream of tokens. Instead of a (type, token) tuple per token, the type of each token
+    is stored as a small int, and each token is stored as an index into a table of lexemes, in which every distinct
+    lexeme appears only once. The offset of each token in the source is kept in a parallel array
+    """
+
+    # token type <-> the small int that is stored for it
+    token_types = ('keyword', 'symbol', 'integerConstant', 'stringConstant', 'identifier')
+    token_type_numbers = {type_: number for number, type_ in enumerate(token_types)}
+
+    def __init__(self):
+        """
+        creates a new empty token buffer
+        """
+        self.kinds = array('B')
+        self.lexeme_ids = array('I')
+        self.offsets = array('I')
+
+        # the table of interned lexemes, and the index of each lexeme in it
+        self.lexemes = []
+        self.lexeme_table = {}
+
+    def append(self, type_, lexeme, offset):
+        """
+        adds a token to the end of the buffer
+        :param type_: the type of the token ('keyword', 'symbol', ...)
+        :param lexeme: string
+        :param offset: the offset of the token in the source
+        :return: void
+        """
+        lexeme_id = self.lexeme_table.get(lexeme)
+        if lexeme_id is None:
+            lexeme_id = len(self.lexemes)
+            self.lexemes.append(lexeme)
+            self.lexeme_table[lexeme] = lexeme_id
+
+        self.kinds.append(self.token_type_numbers[type_])
+        self.lexeme_ids.append(lexeme_id)
+        self.offsets.append(offset)
+
+    def type_of(self, number):
+        """
+        returns the type of token number 'number'
+        :param number: int
+        :return: string
+        """
+        return self.token_types[self.kinds[number]]
+
+    def lexeme_of(self, number):
+        """
+        returns the lexeme of token number 'number'
+        :param number: int
+        :return: string
+        """
+        return self.lexemes[self.lexeme_ids[number]]
+
+    def offset_of(self, number):
+        """
+        returns the offset in the source of token number 'number'
+        :param number: int
+        :return: int
+        """
+        return self.offsets[number]
+
+    def fingerprint(self, start, end):
+        """
+        returns a hash of the types and lexemes of tokens number 'start' up to (not including) number 'end'. Unlike the
+        lexeme ids, it doesn't depend on anything outside of the span
+        :param start: int
+        :param end: int
+        :return: string
+        """
+        hash_ = hashlib.sha256(self.kinds[start:end].tobytes())
+        lexemes = self.lexemes
+        hash_.update('\0'.join([lexemes[lexeme_id] for lexeme_id in self.lexeme_ids[start:end]]).encode())
+        return hash_.hexdigest()
+
+    def __len__(self):
+        return len(self.kinds)
+
+    def __getitem__(self, number):
+        """
+        returns token number 'number' as a (token type, token) tuple
+        :param number: int
+        :return: tuple
+        """
+        return self.token_types[self.kinds[number]], self.lexemes[self.lexeme_ids[number]]
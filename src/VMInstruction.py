@@ -0,0 +1,63 @@
+# the typed VM instructions that the code generator lowers the syntax tree to, and that the VMWriter serializes
+
+
+class VMInstruction:
+    """
+    one VM command.
+    'command' is one of 'push', 'pop', 'arithmetic', 'label', 'goto', 'if-goto', 'call', 'function' and 'return'.
+    for push and pop, 'arg1' is the segment and 'arg2' the index; for arithmetic 'arg1' is the command (add, neg, ...);
+    for label, goto and if-goto 'arg1' is the label; for call and function 'arg1' is the name and 'arg2' the number of
+    arguments or locals
+    """
+    __slots__ = ('command', 'arg1', 'arg2')
+
+    def __init__(self, command, arg1=None, arg2=None):
+        self.command = command
+        self.arg1 = arg1
+        self.arg2 = arg2
+
+    def __eq__(self, other):
+        return isinstance(other, VMInstruction) and \
+            (self.command, self.arg1, self.arg2) == (other.command, other.arg1, other.arg2)
+
+    def __hash__(self):
+        return hash((self.command, self.arg1, self.arg2))
+
+    def __repr__(self):
+        return f'VMInstruction({self.command!r}, {self.arg1!r}, {self.arg2!r})'
+
+
+def push(segment, index):
+    return VMInstruction('push', segment, index)
+
+
+def pop(segment, index):
+    return VMInstruction('pop', segment, index)
+
+
+def arithmetic(command):
+    return VMInstruction('arithmetic', command)
+
+
+def label(label_):
+    return VMInstruction('label', label_)
+
+
+def goto(label_):
+    return VMInstruction('goto', label_)
+
+
+def if_goto(label_):
+    return VMInstruction('if-goto', label_)
+
+
+def call(name, n_args):
+    return VMInstruction('call', name, n_args)
+
+
+def function(name, n_locals):
+    return VMInstruction('function', name, n_locals)
+
+
+def return_():
+    return VMInstruction('return')
@@ -0,0 +1,174 @@
+# optimization passes over lists of VM instructions. Each pass takes a list of VMInstruction and returns a list that
+# computes the same thing
+import VMInstruction
+
+
+def peephole(instructions):
+    """
+    removes short sequences that do nothing, and simplifies branches on constants:
+    push x, pop x -> (nothing)
+    not, not / neg, neg -> (nothing)
+    goto L, label L -> label L
+    push constant 0, if-goto L -> (nothing)
+    push constant c, if-goto L -> goto L (c isn't 0)
+    :param instructions: list of VMInstruction
+    :return: list of VMInstruction
+    """
+    changed = True
+    while changed:
+        changed = False
+        result = []
+        for instruction in instructions:
+            if result:
+                previous = result[-1]
+                command = instruction.command
+                if command == 'pop' and previous.command == 'push' and previous.arg1 == instruction.arg1 and \
+                        previous.arg2 == instruction.arg2:
+                    result.pop()
+                    changed = True
+                    continue
+                if command == 'arithmetic' and previous.command == 'arithmetic' and \
+                        instruction.arg1 == previous.arg1 and instruction.arg1 in ('not', 'neg'):
+                    result.pop()
+                    changed = True
+                    continue
+                if command == 'label' and previous.command == 'goto' and previous.arg1 == instruction.arg1:
+                    result[-1] = instruction
+                    changed = True
+                    continue
+                if command == 'if-goto' and previous.command == 'push' and previous.arg1 == 'constant':
+                    result.pop()
+                    if previous.arg2 != 0:
+                        result.append(VMInstruction.goto(instruction.arg1))
+                    changed = True
+                    continue
+            result.append(instruction)
+        instructions = result
+    return instructions
+
+
+def remove_unreachable(instructions):
+    """
+    removes the instructions after a goto or a return that can't be reached: everything up to the next label or
+    function
+    :param instructions: list of VMInstruction
+    :return: list of VMInstruction
+    """
+    result = []
+    reachable = True
+    for instruction in instructions:
+        if instruction.command == 'label' or instruction.command == 'function':
+            reachable = True
+        if reachable:
+            result.append(instruction)
+        if instruction.command == 'goto' or instruction.command == 'return':
+            reachable = False
+    return result
+
+
+# the number of Hack instructions that CodeWriter translates each of the VM instructions that the multiplication
+# sequences use into
+hack_costs = {'pop temp': 13, 'push temp': 10, 'push constant': 7, 'add': 7, 'neg': 3}
+
+# a multiplication by a constant is replaced by a sequence of additions when the sequence has at most this many Hack
+# instructions. A call to Math.multiply takes many times more to run (its call and return alone take about 100, and
+# then it loops over the 16 bits of its operand), but the sequences are straight line code that takes space in the
+# ROM for every multiplication
+shift_add_budget = 160
+
+
+def constant_pushed(instructions, end):
+    """
+    returns the constant that the instructions just before 'end' push, and the index that they start at, or
+    (None, end) if they don't push a constant. Negative constants are pushed as 'push constant n, neg' or
+    'push constant 32767, not' (for -32768)
+    :param instructions: list of VMInstruction
+    :param end: index after the instructions
+    :return: (int or None, int)
+    """
+    last = instructions[end - 1] if end > 0 else None
+    if last is None:
+        return None, end
+    if last.command == 'push' and last.arg1 == 'constant':
+        return last.arg2, end - 1
+    if last.command == 'arithmetic' and last.arg1 in ('neg', 'not') and end > 1:
+        previous = instructions[end - 2]
+        if previous.command == 'push' and previous.arg1 == 'constant':
+            if last.arg1 == 'neg':
+                return -previous.arg2, end - 2
+            return ~previous.arg2, end - 2
+    return None, end
+
+
+def multiplication_sequence(constant):
+    """
+    returns the VM instructions that multiply the value at the top of the stack by a constant using additions, by
+    Horner's rule over the bits of the constant. temp 1 holds the multiplied value and temp 2 the value being doubled
+    :param constant: int
+    :return: list of VMInstruction
+    """
+    negative = constant < 0
+    constant = abs(constant)
+    sequence = []
+    if constant == 0:
+        # the multiplied value is still computed, for its side effects
+        sequence += [VMInstruction.pop('temp', 1), VMInstruction.push('constant', 0)]
+        return sequence
+
+    bits = bin(constant)[3:]  # the bits after the highest one
+    if '1' in bits:
+        # a power of two only doubles the value at the top of the stack, and doesn't need to keep it
+        sequence += [VMInstruction.pop('temp', 1), VMInstruction.push('temp', 1)]
+    for bit in bits:
+        sequence += [VMInstruction.pop('temp', 2), VMInstruction.push('temp', 2), VMInstruction.push('temp', 2),
+                     VMInstruction.arithmetic('add')]
+        if bit == '1':
+            sequence += [VMInstruction.push('temp', 1), VMInstruction.arithmetic('add')]
+    if negative:
+        sequence.append(VMInstruction.arithmetic('neg'))
+    return sequence
+
+
+def hack_cost(sequence):
+    """
+    :param sequence: list of VMInstruction that multiplication_sequence() returns
+    :return: the number of Hack instructions that the sequence is translated into
+    """
+    cost = 0
+    for instruction in sequence:
+        if instruction.command == 'arithmetic':
+            cost += hack_costs[instruction.arg1]
+        else:
+            cost += hack_costs[f'{instruction.command} {instruction.arg1}']
+    return cost
+
+
+def multiply_by_shifts(instructions):
+    """
+    replaces calls to Math.multiply by a constant with additions and doublings when they are cheap enough by the Hack
+    cost of their sequence, and removes divisions by 1. The sequences use temp 1 and temp 2, so code that uses these
+    itself is left as is
+    :param instructions: list of VMInstruction
+    :return: list of VMInstruction
+    """
+    for instruction in instructions:
+        if instruction.arg1 == 'temp' and instruction.arg2 in (1, 2):
+            return instructions
+
+    result = []
+    for instruction in instructions:
+        if instruction.command == 'call' and instruction.arg1 in ('Math.multiply', 'Math.divide'):
+            constant, start = constant_pushed(result, len(result))
+            if constant is not None:
+                if instruction.arg1 == 'Math.divide':
+                    if constant == 1:
+                        del result[start:]
+                        continue
+                else:
+                    sequence = multiplication_sequence(constant)
+                    if hack_cost(sequence) <= shift_add_budget:
+                        del result[start:]
+                        result += sequence
+                        continue
+        result.append(instruction)
+    return result
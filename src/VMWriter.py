@@ -103,6 +103,33 @@ class VMWriter:
         """
         self.output_file.write('return\n')
 
+    def write_instructions(self, instructions):
+        """
+        writes a list of typed VM instructions
+        :param instructions: list of VMInstruction
+        :return: void
+        """
+        for instruction in instructions:
+            command = instruction.command
+            if command == 'push':
+                self.write_push(instruction.arg1, instruction.arg2)
+            elif command == 'pop':
+                self.write_pop(instruction.arg1, instruction.arg2)
+            elif command == 'arithmetic':
+                self.write_arithmetic(instruction.arg1)
+            elif command == 'call':
+                self.write_call(instruction.arg1, instruction.arg2)
+            elif command == 'label':
+                self.write_label(instruction.arg1)
+            elif command == 'goto':
+                self.write_goto(instruction.arg1)
+            elif command == 'if-goto':
+                self.write_if(instruction.arg1)
+            elif command == 'function':
+                self.write_function(instruction.arg1, instruction.arg2)
+            else:
+                self.write_return()
+
     def close(self):
         """
         closes the output file
@@ -1,7 +1,11 @@
 import sys
 import pathlib
+import argparse
 import CodeWriter
+import OutputBuffer
 import Parser
+import PassManager
+import VMInstruction
 
 
 # TODO: go through all the functions and look for and handle edge cases!!!
@@ -10,56 +14,159 @@ import Parser
 # translate the vm file to asm code and write it to the output file
 
 
-def translate_file(path, code_writer):
+def translate_file(path, code_writer, pass_manager=None):
 
     if str(path).endswith('.vm'):
-        parser = Parser.Parser(path)
-        while parser.has_more_commands():
-            # need to have this at beginning of loop so that the first time we run through the loop, there is a command
-            parser.advance()
-
-            code_writer.set_file_name(parser.input_file_name)
-
-            if parser.command_type() == 'C_ARITHMETIC':
-                code_writer.write_arithmetic(parser.current_command)
-            elif parser.command_type() == 'C_PUSH':
-                code_writer.write_push_pop('push', parser.arg1(), parser.arg2())
-            elif parser.command_type() == 'C_POP':
-                code_writer.write_push_pop('pop', parser.arg1(), parser.arg2())
-            elif parser.command_type() == 'C_LABEL':
-                code_writer.write_label(parser.arg1())
-            elif parser.command_type() == 'C_GOTO':
-                code_writer.write_goto(parser.arg1())
-            elif parser.command_type() == 'C_IF':
-                code_writer.write_if(parser.arg1())
-            elif parser.command_type() == 'C_FUNCTION':
-                code_writer.write_function(parser.arg1(), parser.arg2())
-            elif parser.command_type() == 'C_RETURN':
-                code_writer.write_return()
-            elif parser.command_type() == 'C_CALL':
-                code_writer.write_call(parser.arg1(), parser.arg2())
-
-
-def main():
+        translate_parser(Parser.Parser(path), code_writer, pass_manager)
+
+
+# translate the commands of a parser, running the vm passes of the pass manager on them first if there are any
+def translate_parser(parser, code_writer, pass_manager=None):
+    if pass_manager is None or not pass_manager.vm_passes:
+        translate_commands(parser, code_writer)
+    else:
+        instructions = pass_manager.run_vm_passes(read_instructions(parser))
+        translate_instructions(instructions, parser.input_file_name, code_writer)
+
+
+# translate all of the commands of a parser to asm code and write it to the code writer
+def translate_commands(parser, code_writer):
+    while parser.has_more_commands():
+        # need to have this at beginning of loop so that the first time we run through the loop, there is a command
+        parser.advance()
+
+        code_writer.set_file_name(parser.input_file_name)
+
+        if parser.command_type() == 'C_ARITHMETIC':
+            code_writer.write_arithmetic(parser.current_command)
+        elif parser.command_type() == 'C_PUSH':
+            code_writer.write_push_pop('push', parser.arg1(), parser.arg2())
+        elif parser.command_type() == 'C_POP':
+            code_writer.write_push_pop('pop', parser.arg1(), parser.arg2())
+        elif parser.command_type() == 'C_LABEL':
+            code_writer.write_label(parser.arg1())
+        elif parser.command_type() == 'C_GOTO':
+            code_writer.write_goto(parser.arg1())
+        elif parser.command_type() == 'C_IF':
+            code_writer.write_if(parser.arg1())
+        elif parser.command_type() == 'C_FUNCTION':
+            code_writer.write_function(parser.arg1(), parser.arg2())
+        elif parser.command_type() == 'C_RETURN':
+            code_writer.write_return()
+        elif parser.command_type() == 'C_CALL':
+            code_writer.write_call(parser.arg1(), parser.arg2())
+
+
+def read_instructions(parser):
+    """
+    reads all of the commands of a parser into VM instructions
+    :param parser: Parser
+    :return: list of VMInstruction
+    """
+    instructions = []
+    while parser.has_more_commands():
+        parser.advance()
+        command_type = parser.command_type()
+
+        if command_type == 'C_ARITHMETIC':
+            instructions.append(VMInstruction.arithmetic(parser.current_command))
+        elif command_type == 'C_PUSH':
+            instructions.append(VMInstruction.push(parser.arg1(), int(parser.arg2())))
+        elif command_type == 'C_POP':
+            instructions.append(VMInstruction.pop(parser.arg1(), int(parser.arg2())))
+        elif command_type == 'C_LABEL':
+            instructions.append(VMInstruction.label(parser.arg1()))
+        elif command_type == 'C_GOTO':
+            instructions.append(VMInstruction.goto(parser.arg1()))
+        elif command_type == 'C_IF':
+            instructions.append(VMInstruction.if_goto(parser.arg1()))
+        elif command_type == 'C_FUNCTION':
+            instructions.append(VMInstruction.function(parser.arg1(), int(parser.arg2())))
+        elif command_type == 'C_RETURN':
+            instructions.append(VMInstruction.return_())
+        elif command_type == 'C_CALL':
+            instructions.append(VMInstruction.call(parser.arg1(), int(parser.arg2())))
+    return instructions
+
+
+# translate VM instructions of the file 'file_name' to asm code and write it to the code writer
+def translate_instructions(instructions, file_name, code_writer):
+    code_writer.set_file_name(file_name)
+
+    for instruction in instructions:
+        command = instruction.command
+        if command == 'arithmetic':
+            code_writer.write_arithmetic(instruction.arg1)
+        elif command == 'push' or command == 'pop':
+            code_writer.write_push_pop(command, instruction.arg1, instruction.arg2)
+        elif command == 'label':
+            code_writer.write_label(instruction.arg1)
+        elif command == 'goto':
+            code_writer.write_goto(instruction.arg1)
+        elif command == 'if-goto':
+            code_writer.write_if(instruction.arg1)
+        elif command == 'function':
+            code_writer.write_function(instruction.arg1, instruction.arg2)
+        elif command == 'return':
+            code_writer.write_return()
+        else:
+            code_writer.write_call(instruction.arg1, instruction.arg2)
+
+
+def translate_vm_sources(sources, bootstrap=True, pass_manager=None):
+    """
+    translates vm code to asm code fully in memory
+    :param sources: dictionary of file name -> the vm code of that file
+    :param bootstrap: whether to start with the bootstrap code (that calls Sys.init)
+    :param pass_manager: PassManager.PassManager whose vm passes to run on the code, or None
+    :return: string with the asm code
+    """
+    output_buffer = OutputBuffer.OutputBuffer()
+    code_writer = CodeWriter.CodeWriter(None, output_buffer)
+
+    if bootstrap:
+        code_writer.write_init()
+    for name, source in sources.items():
+        translate_parser(Parser.Parser(pathlib.PurePath(name), source), code_writer, pass_manager)
 
-    directory_or_file = sys.argv[1]
-    output_file = sys.argv[2]
+    return output_buffer.getvalue()
 
-    code_writer = CodeWriter.CodeWriter(pathlib.Path(output_file))
 
-    directory_or_file_path = pathlib.Path(directory_or_file)
+def translate(directory_or_file_path, output_path, pass_manager=None):
+    """
+    translates a .vm file, or all of the .vm files in a directory, into one .asm file
+    :param directory_or_file_path: pathlib.Path
+    :param output_path: pathlib.Path of the .asm file to write
+    :param pass_manager: PassManager.PassManager whose vm passes to run on the code, or None
+    :return: void
+    """
+    code_writer = CodeWriter.CodeWriter(output_path)
 
     if directory_or_file_path.is_file():
         code_writer.write_init()
-        translate_file(directory_or_file_path, code_writer)
+        translate_file(directory_or_file_path, code_writer, pass_manager)
     elif directory_or_file_path.is_dir():
         code_writer.write_init()
         # for each .vm file in the directory, translate the vm code to asm code and write it to the output file
         for path in directory_or_file_path.iterdir():
-            translate_file(path, code_writer)
+            translate_file(path, code_writer, pass_manager)
 
     code_writer.close()
 
 
+def main():
+    argument_parser = argparse.ArgumentParser(description='translates a .vm file, or a directory of .vm files, into '
+                                                          'one .asm file')
+    argument_parser.add_argument('directory_or_file')
+    argument_parser.add_argument('output_file')
+    PassManager.add_arguments(argument_parser)
+    arguments = argument_parser.parse_args(sys.argv[1:])
+
+    pass_manager = PassManager.from_arguments(arguments)
+    translate(pathlib.Path(arguments.directory_or_file), pathlib.Path(arguments.output_file), pass_manager)
+    if arguments.pass_statistics:
+        print(pass_manager.report(), file=sys.stderr)
+
+
 if __name__ == '__main__':
     main()
@@ -1,56 +1,127 @@
+import JackAST
 
 
 class SymbolTable:
+    """
+    a chain of nested scopes: the class scope, the scope of the current subroutine, and any scope opened inside it.
+    Every name that is visible is also kept in 'symbols', with the JackAST.Variable of the innermost scope that defines
+    it, so that resolving a name is a single dictionary lookup however deep the chain is
+    """
+
+    # the VM segment of each kind of identifier
+    segments = {'static': 'static', 'field': 'this', 'arg': 'argument', 'var': 'local'}
 
     def __init__(self):
         """
         creates a new empty symbol table
         """
         self.class_table = {}
-        self.subroutine_table = {}
+        self.scopes = [self.class_table]  # the scope chain, from the outermost
+        # for each scope after the class scope, the variables of the outer scopes that its names hide
+        self.hidden = [None]
+        self.symbols = {}  # name -> JackAST.Variable of every visible name
+        self.subroutine_table = self.open_scope()
         self.arg_counter = 0
         self.var_counter = 0
         self.static_counter = 0
         self.field_counter = 0
-        self.if_counter = 0
-        self.while_counter = 0
+
+    def open_scope(self):
+        """
+        opens a scope nested in the current one
+        :return: the dictionary of the names that the new scope defines
+        """
+        scope = {}
+        self.scopes.append(scope)
+        self.hidden.append({})
+        return scope
+
+    def close_scope(self):
+        """
+        closes the innermost scope, and makes the names that it hid visible again
+        :return: void
+        """
+        if len(self.scopes) == 1:
+            raise Exception('the class scope can\'t be closed')
+        scope = self.scopes.pop()
+        hidden = self.hidden.pop()
+        for name in scope:
+            if name in hidden:
+                self.symbols[name] = hidden[name]
+            else:
+                del self.symbols[name]
 
     def start_subroutine(self):
         """
-        starts a new subroutine scope (i.e., resets/clears the subroutine's symbol table)
+        starts a new subroutine scope (i.e., closes every scope but the class scope and opens a new one)
         :return: void
         """
-        self.subroutine_table.clear()
+        while len(self.scopes) > 1:
+            self.close_scope()
+        self.subroutine_table = self.open_scope()
 
         self.var_counter = 0
         self.arg_counter = 0
-        self.if_counter = 0
-        self.while_counter = 0
 
     def define(self, name, type_, kind):
         """
         defines a new identifier of a given name, type, and kind and assigns it a running index.
-        STATIC and FIELD identifiers have a class scope, while ARG and VAR identifiers have a subroutine scope
+        STATIC and FIELD identifiers have a class scope, while ARG and VAR identifiers have the innermost scope
         :param name: string
         :param type_: string
         :param kind: STATIC, FIELD, ARG, or VAR
         :return: void
         """
         if kind == 'static':  # class scope
-            self.class_table[name] = (type_, 'static', self.static_counter)
+            index = self.static_counter
             self.static_counter += 1
         elif kind == 'field':  # class scope
-            self.class_table[name] = (type_, 'field', self.field_counter)
+            index = self.field_counter
             self.field_counter += 1
         elif kind == 'arg':  # subroutine scope
-            self.subroutine_table[name] = (type_, 'arg', self.arg_counter)
+            index = self.arg_counter
             self.arg_counter += 1
         elif kind == 'var':  # subroutine scope
-            self.subroutine_table[name] = (type_, 'var', self.var_counter)
+            index = self.var_counter
             self.var_counter += 1
         else:
             raise Exception(f'{kind} is not a legal kind in the Jack Grammar')
 
+        variable = JackAST.Variable(name, type_, kind, self.segments[kind], index)
+        if kind == 'static' or kind == 'field':
+            self.class_table[name] = variable
+            # the name is visible unless an inner scope hides it
+            for depth in range(1, len(self.scopes)):
+                if name in self.scopes[depth]:
+                    self.hidden[depth][name] = variable
+                    return
+            self.symbols[name] = variable
+        else:
+            scope = self.scopes[-1]
+            if name in self.symbols and name not in scope:
+                self.hidden[-1][name] = self.symbols[name]
+            scope[name] = variable
+            self.symbols[name] = variable
+
+    def lookup(self, name):
+        """
+        returns the variable that the name refers to in the current scope
+        :param name: string
+        :return: JackAST.Variable, or None if the name isn't defined
+        """
+        return self.symbols.get(name)
+
+    def resolve(self, name):
+        """
+        returns the variable that the name refers to in the current scope, which must define it
+        :param name: string
+        :return: JackAST.Variable
+        """
+        variable = self.symbols.get(name)
+        if variable is None:
+            raise Exception(f'{name} is not defined')
+        return variable
+
     def kind_of(self, name):
         """
         returns the 'kind' of the named identifier in the current scope. If the identifier is unknown in the current
@@ -58,12 +129,10 @@ class SymbolTable:
         :param name: string
         :return: STATIC, FIELD, ARG, VAR, NONE
         """
-        if name in self.subroutine_table:
-            return self.subroutine_table[name][1]
-        elif name in self.class_table:
-            return self.class_table[name][1]
-        else:
+        variable = self.symbols.get(name)
+        if variable is None:
             return None
+        return variable.kind
 
     def type_of(self, name):
         """
@@ -71,12 +140,7 @@ class SymbolTable:
         :param name: string
         :return: string
         """
-        if name in self.subroutine_table:
-            return self.subroutine_table[name][0]
-        elif name in self.class_table:
-            return self.class_table[name][0]
-        else:
-            raise Exception(f'{name} is not a legal kind in the Jack Grammar')
+        return self.resolve(name).type_
 
     def index_of(self, name):
         """
@@ -84,15 +148,7 @@ class SymbolTable:
         :param name: string
         :return: int
         """
-        if name in self.subroutine_table:
-            return self.subroutine_table[name][2]
-        elif name in self.class_table:
-            return self.class_table[name][2]
-        else:
-            raise Exception(f'{name} is not a legal kind in the Jack Grammar')
+        return self.resolve(name).index
 
     def defined(self, name):
-        if name in self.subroutine_table or name in self.class_table:
-            return True
-        else:
-            return False
+        return name in self.symbols